@@ -4,73 +4,407 @@ Tag Compliance Report — Stella Maris Governance
 Generate tag compliance metrics from Azure Resource Graph data.
 """
 
+import os
 import json
 import sys
+import sqlite3
 import argparse
 from datetime import datetime
 from collections import defaultdict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from inventory import iter_resources  # noqa: E402
+from hierarchy import with_effective_tags  # noqa: E402
+from tagkeys import canonical_key, normalize_resource  # noqa: E402
+
 
 REQUIRED_TAGS = ["Owner", "Environment", "CostCenter", "Project"]
 RECOMMENDED_TAGS = ["Criticality", "DataClassification", "CreatedDate", "ReviewDate", "ExpiryDate", "ManagedBy"]
 
 
-def analyze_compliance(resources: list) -> dict:
-    """Analyze tag compliance across resource inventory."""
-    total = len(resources)
-    if total == 0:
-        return {"error": "No resources found"}
+# Group-by dimensions available for breakdowns. Resource Graph exports carry
+# subscriptionId/resourceGroup directly; older exports only have the id.
+GROUP_BY_FIELDS = ["subscription", "resource_group", "type"]
 
-    required_compliance = {}
-    recommended_compliance = {}
 
-    for tag in REQUIRED_TAGS:
-        tagged = sum(1 for r in resources if r.get("tags", {}).get(tag))
-        required_compliance[tag] = {
-            "tagged": tagged,
-            "total": total,
-            "percent": round(tagged / total * 100, 1)
-        }
+def _id_segment(resource_id: str, segment: str) -> str:
+    """Return the path element following `segment` in an Azure resource ID."""
+    parts = resource_id.split("/")
+    for i, part in enumerate(parts[:-1]):
+        if part.lower() == segment:
+            return parts[i + 1]
+    return ""
 
-    for tag in RECOMMENDED_TAGS:
-        tagged = sum(1 for r in resources if r.get("tags", {}).get(tag))
-        recommended_compliance[tag] = {
-            "tagged": tagged,
-            "total": total,
-            "percent": round(tagged / total * 100, 1)
-        }
 
-    req_total_slots = total * len(REQUIRED_TAGS)
-    req_filled = sum(v["tagged"] for v in required_compliance.values())
-    rec_total_slots = total * len(RECOMMENDED_TAGS)
-    rec_filled = sum(v["tagged"] for v in recommended_compliance.values())
+def group_key(resource: dict, field: str) -> str:
+    """Resolve a group-by dimension for a resource."""
+    if field == "subscription":
+        key = resource.get("subscriptionId") or _id_segment(resource.get("id", ""), "subscriptions")
+    elif field == "resource_group":
+        key = resource.get("resourceGroup") or _id_segment(resource.get("id", ""), "resourcegroups")
+    else:
+        key = resource.get(field, "")
+    return key or "unknown"
+
+
+class TagBitmapIndex:
+    """Tag presence bitmaps built in a single pass over the inventory.
+
+    Bit i of a tag's bitmap is set when resource i carries a non-empty value
+    for that tag, so inventory-wide counts are popcounts over ANDs of bitmaps.
+    Group-by breakdowns are counted in the same pass instead: each group
+    value keeps a count per tag-presence mask (bit j = tag j present), which
+    stays small however many groups or resources there are.
+    """
+
+    def __init__(self, tags: list, group_by: list = None):
+        self.tags = list(dict.fromkeys(tags))
+        self.group_by = list(group_by or [])
+        self.total = 0
+        self._tag_bytes = {tag: bytearray() for tag in self.tags}
+        self._presence_bit = {tag: 1 << j for j, tag in enumerate(self.tags)}
+        self._group_masks = {field: defaultdict(lambda: defaultdict(int)) for field in self.group_by}
+        self._tag_bits = None
+
+    @staticmethod
+    def _set(buf: bytearray, i: int):
+        byte = i >> 3
+        if len(buf) <= byte:
+            buf.extend(bytes(byte + 1 - len(buf)))
+        buf[byte] |= 1 << (i & 7)
+
+    def add(self, resource: dict):
+        """Record one resource. Only its own tags are visited."""
+        i = self.total
+        self.total += 1
+        tag_bytes = self._tag_bytes
+        presence = 0
+        for key, value in (resource.get("tags") or {}).items():
+            if value and key in tag_bytes:
+                self._set(tag_bytes[key], i)
+                presence |= self._presence_bit[key]
+        for field, groups in self._group_masks.items():
+            groups[group_key(resource, field)][presence] += 1
+        self._tag_bits = None
+
+    def _freeze(self):
+        if self._tag_bits is None:
+            self._tag_bits = {t: int.from_bytes(b, "little") for t, b in self._tag_bytes.items()}
+
+    @property
+    def universe(self) -> int:
+        return (1 << self.total) - 1
+
+    def bitmap(self, tag: str) -> int:
+        self._freeze()
+        return self._tag_bits[tag]
+
+    def all_of(self, tags: list, mask: int = None) -> int:
+        """Bitmap of resources carrying every tag in `tags`."""
+        bits = self.universe if mask is None else mask
+        for tag in tags:
+            bits &= self.bitmap(tag)
+        return bits
+
+    def presence_bit(self, tag: str) -> int:
+        return self._presence_bit[tag]
+
+    def groups(self, field: str) -> dict:
+        """Group value → {tag-presence mask: resource count}."""
+        return self._group_masks[field]
 
+
+def _percent(part: int, whole: int) -> float:
+    return round(part / whole * 100, 1) if whole else 0.0
+
+
+def _tier_report(tagged_counts: dict, fully: int, total: int) -> dict:
+    """Shape per-tag and fully-compliant counts into the report structure."""
+    per_tag = {
+        tag: {"tagged": tagged, "total": total, "percent": _percent(tagged, total)}
+        for tag, tagged in tagged_counts.items()
+    }
+    filled = sum(tagged_counts.values())
     return {
+        "aggregate_percent": _percent(filled, total * len(tagged_counts)),
+        "fully_compliant": {"count": fully, "percent": _percent(fully, total)},
+        "per_tag": per_tag
+    }
+
+
+def summarize_tier(index: TagBitmapIndex, tags: list, mask: int = None) -> dict:
+    """Per-tag, aggregate and fully-compliant counts for one tag tier."""
+    mask = index.universe if mask is None else mask
+    tagged_counts = {tag: (index.bitmap(tag) & mask).bit_count() for tag in tags}
+    fully = index.all_of(tags, mask).bit_count()
+    return _tier_report(tagged_counts, fully, mask.bit_count())
+
+
+def summarize_group(index: TagBitmapIndex, tags: list, mask_counts: dict) -> dict:
+    """summarize_tier for one group value, from its tag-presence mask counts."""
+    bits = {tag: index.presence_bit(tag) for tag in tags}
+    tier_mask = 0
+    for bit in bits.values():
+        tier_mask |= bit
+    tagged_counts = {tag: sum(n for m, n in mask_counts.items() if m & bit) for tag, bit in bits.items()}
+    fully = sum(n for m, n in mask_counts.items() if m & tier_mask == tier_mask)
+    return _tier_report(tagged_counts, fully, sum(mask_counts.values()))
+
+
+def analyze_compliance(resources, required_tags: list = None,
+                       recommended_tags: list = None, group_by: list = None) -> dict:
+    """Analyze tag compliance across resource inventory.
+
+    Accepts any iterable of resources; the inventory is walked exactly once.
+    """
+    required_tags = list(required_tags or REQUIRED_TAGS)
+    recommended_tags = list(recommended_tags or RECOMMENDED_TAGS)
+    group_by = list(group_by or [])
+
+    index = TagBitmapIndex(required_tags + recommended_tags, group_by)
+    for r in resources:
+        index.add(r)
+
+    total = index.total
+    if total == 0:
+        return {"error": "No resources found"}
+
+    report = {
         "total_resources": total,
-        "required": {
-            "aggregate_percent": round(req_filled / req_total_slots * 100, 1),
-            "per_tag": required_compliance
-        },
-        "recommended": {
-            "aggregate_percent": round(rec_filled / rec_total_slots * 100, 1),
-            "per_tag": recommended_compliance
-        }
+        "required": summarize_tier(index, required_tags),
+        "recommended": summarize_tier(index, recommended_tags)
     }
 
+    if group_by:
+        report["groups"] = {}
+        for field in group_by:
+            breakdown = {}
+            for key, mask_counts in sorted(index.groups(field).items()):
+                breakdown[key] = {
+                    "total": sum(mask_counts.values()),
+                    "required": summarize_group(index, required_tags, mask_counts),
+                    "recommended": summarize_group(index, recommended_tags, mask_counts)
+                }
+            report["groups"][field] = breakdown
+
+    return report
+
+
+def _resource_key(resource: dict) -> str:
+    """Stable store key. Azure resource IDs are case-insensitive."""
+    return (resource.get("id") or resource.get("name", "")).lower()
+
+
+class ComplianceStore:
+    """Persisted per-resource tag presence plus running compliance counters.
+
+    Each resource is stored as a presence mask (bit i = tag i present). The
+    counters (total, per-tag tagged, fully compliant per tier) are adjusted by
+    mask differences, so a change feed costs O(changes) instead of a full
+    inventory pass. `load_full` reconciles the counters against a complete
+    inventory and reports any drift.
+    """
+
+    def __init__(self, path: str, required_tags: list = None, recommended_tags: list = None):
+        self.required_tags = list(required_tags or REQUIRED_TAGS)
+        self.recommended_tags = list(recommended_tags or RECOMMENDED_TAGS)
+        self.tags = list(dict.fromkeys(self.required_tags + self.recommended_tags))
+        self._bit = {tag: 1 << i for i, tag in enumerate(self.tags)}
+        self._tier_masks = {
+            "required": self._mask_of(self.required_tags),
+            "recommended": self._mask_of(self.recommended_tags)
+        }
+
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS resources (id TEXT PRIMARY KEY, mask INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+        layout = json.dumps({"required": self.required_tags, "recommended": self.recommended_tags})
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'layout'").fetchone()
+        if row is None:
+            self.db.execute("INSERT INTO meta VALUES ('layout', ?)", (layout,))
+            self.db.commit()
+        elif row[0] != layout:
+            self.db.close()
+            raise ValueError(f"Store {path} was built for a different tag layout — "
+                             f"delete it or pass a new --store path, then reload a full inventory")
+
+    def close(self):
+        self.db.close()
+
+    def _mask_of(self, tags: list) -> int:
+        mask = 0
+        for tag in tags:
+            mask |= self._bit[tag]
+        return mask
+
+    def mask(self, resource: dict) -> int:
+        bits = 0
+        for key, value in (resource.get("tags") or {}).items():
+            if value and key in self._bit:
+                bits |= self._bit[key]
+        return bits
+
+    def counters(self) -> dict:
+        return dict(self.db.execute("SELECT name, value FROM counters"))
+
+    def _recount(self) -> dict:
+        """Counters recomputed from the stored masks."""
+        columns = [f"SUM((mask & {bit}) != 0)" for bit in self._bit.values()]
+        columns += [f"SUM((mask & {m}) = {m})" for m in self._tier_masks.values()]
+        row = self.db.execute(f"SELECT COUNT(*), {', '.join(columns)} FROM resources").fetchone()
+        names = ["total"] + [f"tag:{t}" for t in self.tags] + [f"fully:{tier}" for tier in self._tier_masks]
+        return {name: value or 0 for name, value in zip(names, row)}
+
+    def load_full(self, resources) -> dict:
+        """Replace the snapshot with a full inventory.
+
+        Returns counter drift against the previous snapshot ({} if none), or
+        None when the store was empty.
+        """
+        previous = self.counters()
+        with self.db:
+            self.db.execute("DELETE FROM resources")
+            self.db.executemany(
+                "INSERT OR REPLACE INTO resources VALUES (?, ?)",
+                ((_resource_key(r), self.mask(r)) for r in resources)
+            )
+            current = self._recount()
+            self.db.execute("DELETE FROM counters")
+            self.db.executemany("INSERT INTO counters VALUES (?, ?)", current.items())
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('reconciled', ?)",
+                            (datetime.now().strftime("%Y-%m-%d %H:%M UTC"),))
+
+        if not previous:
+            return None
+        return {name: {"incremental": previous.get(name, 0), "actual": value}
+                for name, value in current.items() if previous.get(name, 0) != value}
+
+    def apply_changes(self, changes) -> dict:
+        """Apply a Create/Update/Delete change feed. Returns change counts by type."""
+        delta = defaultdict(int)
+        applied = defaultdict(int)
+
+        def adjust(mask: int, sign: int):
+            delta["total"] += sign
+            for tag, bit in self._bit.items():
+                if mask & bit:
+                    delta[f"tag:{tag}"] += sign
+            for tier, tier_mask in self._tier_masks.items():
+                if mask & tier_mask == tier_mask:
+                    delta[f"fully:{tier}"] += sign
+
+        with self.db:
+            for change in changes:
+                change_type = (change.get("changeType") or change.get("change_type") or "").lower()
+                resource = normalize_resource(change.get("resource") or {})
+                key = (change.get("resourceId") or "").lower() or _resource_key(resource)
+                if not key or change_type not in ("create", "update", "delete"):
+                    applied["skipped"] += 1
+                    continue
+
+                row = self.db.execute("SELECT mask FROM resources WHERE id = ?", (key,)).fetchone()
+                if row is not None:
+                    adjust(row[0], -1)
+
+                if change_type == "delete":
+                    self.db.execute("DELETE FROM resources WHERE id = ?", (key,))
+                else:
+                    new_mask = self.mask(resource)
+                    self.db.execute("INSERT OR REPLACE INTO resources VALUES (?, ?)", (key, new_mask))
+                    adjust(new_mask, +1)
+                applied[change_type] += 1
+
+            self.db.executemany(
+                "INSERT INTO counters VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                delta.items()
+            )
+        return dict(applied)
+
+    def report(self) -> dict:
+        """Compliance report in the same shape as analyze_compliance, from counters only."""
+        c = self.counters()
+        total = c.get("total", 0)
+        if total == 0:
+            return {"error": "No resources found"}
+
+        report = {"total_resources": total}
+        for tier, tags in (("required", self.required_tags), ("recommended", self.recommended_tags)):
+            report[tier] = _tier_report({t: c.get(f"tag:{t}", 0) for t in tags},
+                                        c.get(f"fully:{tier}", 0), total)
+        return report
+
 
 def main():
     parser = argparse.ArgumentParser(description="Stella Maris Tag Compliance Report")
-    parser.add_argument("--resources", required=True, help="Path to resource inventory JSON")
+    parser.add_argument("--resources", default=None, help="Path to resource inventory JSON or NDJSON")
+    parser.add_argument("--store", default=None,
+                        help="Compliance snapshot (SQLite). With --resources: full reconcile; with --changes: incremental")
+    parser.add_argument("--changes", default=None,
+                        help="Change feed JSON/NDJSON of Create/Update/Delete entries (requires --store)")
     parser.add_argument("--output", default=None, help="Output report JSON")
+    parser.add_argument("--config", default=None,
+                        help="Tag config JSON (required_tags, recommended_tags, group_by)")
+    parser.add_argument("--group-by", nargs="+", choices=GROUP_BY_FIELDS, default=None,
+                        help="Break compliance down by subscription, resource group and/or type")
+    parser.add_argument("--effective-tags", nargs="?", const="", default=None, metavar="CONTAINERS",
+                        help="Apply tag inheritance first; parents from a CONTAINERS export or the inventory itself")
     args = parser.parse_args()
 
-    with open(args.resources) as f:
-        resources = json.load(f)
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+
+    if not args.resources and not args.changes:
+        parser.error("one of --resources or --changes is required")
+    if args.changes and not args.store:
+        parser.error("--changes requires --store")
+    if args.store and args.group_by:
+        parser.error("--group-by is not supported with --store (the snapshot keeps no per-group counters)")
+    if args.changes and args.effective_tags is not None:
+        parser.error("--effective-tags is not supported with --changes (change rows carry no parent records)")
+
+    def inventory():
+        if args.effective_tags is None:
+            return iter_resources(args.resources)
+        return with_effective_tags(args.resources, args.effective_tags or None)
 
-    if isinstance(resources, dict):
-        resources = resources.get("resources", [])
+    # Tag keys are case-insensitive; match the casing the inventory reader produces
+    required_tags = [canonical_key(t) for t in config.get("required_tags", REQUIRED_TAGS)]
+    recommended_tags = [canonical_key(t) for t in config.get("recommended_tags", RECOMMENDED_TAGS)]
+    drift, applied, reconciled = None, None, False
 
-    report = analyze_compliance(resources)
+    if args.store:
+        if config.get("group_by"):
+            print(f"  ⚠️  Config group_by is ignored with --store (the snapshot keeps no per-group counters)")
+        try:
+            store = ComplianceStore(args.store, required_tags, recommended_tags)
+        except ValueError as e:
+            print(f"  {e}")
+            sys.exit(1)
+        try:
+            if args.resources:
+                drift = store.load_full(inventory())
+                reconciled = True
+            if args.changes:
+                applied = store.apply_changes(iter_resources(args.changes, key="changes"))
+            report = store.report()
+        finally:
+            store.close()
+    else:
+        report = analyze_compliance(
+            inventory(),
+            required_tags=required_tags,
+            recommended_tags=recommended_tags,
+            group_by=args.group_by or config.get("group_by", [])
+        )
+    if "error" in report:
+        print(f"  {report['error']}")
+        sys.exit(1)
 
     print(f"{'='*60}")
     print(f"  TAG COMPLIANCE REPORT")
@@ -79,6 +413,24 @@ def main():
     print(f"{'='*60}")
     print()
 
+    if applied is not None:
+        print(f"  INCREMENTAL UPDATE — " + ", ".join(f"{k}: {v}" for k, v in sorted(applied.items())))
+        print()
+    if reconciled:
+        if drift is None:
+            print(f"  ✓ Snapshot initialized from full inventory")
+        elif drift:
+            print(f"  ⚠️  RECONCILE DRIFT — incremental counters disagreed with full inventory (reset):")
+            for name, values in drift.items():
+                print(f"      {name}: incremental {values['incremental']} vs actual {values['actual']}")
+        else:
+            print(f"  ✓ Reconcile: snapshot counters match full inventory")
+        print()
+
+    fully = report["required"]["fully_compliant"]
+    print(f"  FULLY COMPLIANT (all required tags): {fully['percent']}% ({fully['count']}/{report['total_resources']})")
+    print()
+
     print(f"  REQUIRED TAGS — Aggregate: {report['required']['aggregate_percent']}%")
     for tag, data in report["required"]["per_tag"].items():
         bar = "█" * int(data["percent"] / 5) + "░" * (20 - int(data["percent"] / 5))
@@ -91,6 +443,14 @@ def main():
         print(f"    {tag:.<25} {data['percent']:>5.1f}%  {bar}  ({data['tagged']}/{data['total']})")
     print()
 
+    for field, breakdown in report.get("groups", {}).items():
+        label = field.replace("_", " ").upper()
+        print(f"  BY {label} — required aggregate / fully compliant")
+        for key, data in breakdown.items():
+            print(f"    {key:.<35} {data['required']['aggregate_percent']:>5.1f}% / "
+                  f"{data['required']['fully_compliant']['percent']:>5.1f}%  ({data['total']} resources)")
+        print()
+
     print(f"{'='*60}")
     print(f"  You cannot govern what you cannot see.")
     print(f"{'='*60}")
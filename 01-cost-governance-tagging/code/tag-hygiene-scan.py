@@ -4,97 +4,385 @@ Tag Hygiene Scanner — Stella Maris Governance
 Detect orphan tags: invalid owners, defunct projects, stale dates.
 """
 
+import os
+import re
+import sys
 import json
+import hashlib
 import argparse
-from datetime import datetime, date
+from datetime import datetime
+from collections import Counter, defaultdict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from inventory import iter_resources, CountingIterator  # noqa: E402
+from hierarchy import with_effective_tags  # noqa: E402
+from tagkeys import canonical_key  # noqa: E402
+from calendar_table import Calendar, add_calendar_args, calendar_from_args  # noqa: E402
 
-def scan_owners(resources: list, directory: list) -> list:
-    """Find resources with Owner tags not in directory."""
-    valid_owners = set(u.get("userPrincipalName", "").split("@")[0] for u in directory)
-    valid_owners.update(u.get("displayName", "").lower().replace(" ", ".") for u in directory)
-    # Also accept team names
-    valid_owners.update(["platform-team", "security-team", "data-team", "dev-team", "unattributed"])
 
+# Team owners accepted alongside individual users
+TEAM_ALIASES = ["platform-team", "security-team", "data-team", "dev-team", "unattributed"]
+
+# Owner index cache format version — bump when the on-disk layout changes
+OWNER_INDEX_VERSION = 1
+
+# Tags whose distinct values are clustered for spelling variants
+CLUSTER_TAGS = ["Owner", "Environment", "CostCenter", "Project"]
+ALLOWED_VALUES_POLICY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tag-policy-allowed-values.json")
+MAX_ABBREVIATION = 4  # prod, prd, dev, stg: longer short forms are more likely distinct names
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]")
+_NON_DIGIT = re.compile(r"[^0-9]")
+_VOWELS = re.compile(r"[aeiou]")
+
+
+def normalize_owner(value: str) -> str:
+    """Canonical form for Owner tag comparison."""
+    return value.strip().lower()
+
+
+def _trigrams(value: str) -> set:
+    padded = f"^{value}$"
+    return {padded[i:i+3] for i in range(len(padded) - 2)}
+
+
+class OwnerIndex:
+    """Normalized set of valid owners plus a trigram index for near-miss lookup.
+
+    Built once from the Entra ID export. Membership checks are a single set
+    lookup; suggestions only score owners that share a trigram with the
+    query instead of comparing against the whole directory.
+    """
+
+    def __init__(self, owners):
+        self.owners = sorted(set(owners))
+        self._owner_set = set(self.owners)
+        self._grams = defaultdict(list)
+        for i, owner in enumerate(self.owners):
+            for gram in _trigrams(owner):
+                self._grams[gram].append(i)
+
+    @classmethod
+    def build(cls, directory: list, aliases: list = None) -> "OwnerIndex":
+        """Index UPN local parts, first.last display names and team aliases."""
+        owners = set()
+        for u in directory:
+            upn = u.get("userPrincipalName", "")
+            if upn:
+                owners.add(normalize_owner(upn.split("@")[0]))
+            name = u.get("displayName", "")
+            if name:
+                owners.add(normalize_owner(name).replace(" ", "."))
+        owners.update(normalize_owner(a) for a in (TEAM_ALIASES if aliases is None else aliases))
+        owners.discard("")
+        return cls(owners)
+
+    @classmethod
+    def load_or_build(cls, directory_path: str, cache_dir: str = None,
+                      aliases: list = None) -> "OwnerIndex":
+        """Reuse a cached index keyed by the directory export's content hash."""
+        aliases = TEAM_ALIASES if aliases is None else aliases
+        digest = hashlib.sha256()
+        with open(directory_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        digest.update(json.dumps([OWNER_INDEX_VERSION, sorted(aliases)]).encode())
+        key = digest.hexdigest()[:16]
+
+        cache_path = os.path.join(cache_dir, f"owner-index-{key}.json") if cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                cached = json.load(f)
+            index = cls.__new__(cls)
+            index.owners = cached["owners"]
+            index._owner_set = set(index.owners)
+            index._grams = defaultdict(list, cached["grams"])
+            return index
+
+        with open(directory_path) as f:
+            directory = json.load(f)
+        directory = directory.get("users", []) if isinstance(directory, dict) else directory
+        index = cls.build(directory, aliases)
+
+        if cache_path:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = cache_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"version": OWNER_INDEX_VERSION, "owners": index.owners,
+                           "grams": index._grams}, f)
+            os.replace(tmp_path, cache_path)
+        return index
+
+    def __len__(self):
+        return len(self.owners)
+
+    def __contains__(self, owner: str) -> bool:
+        return normalize_owner(owner) in self._owner_set
+
+    def suggest(self, owner: str, min_similarity: float = 0.5):
+        """Closest valid owner by trigram Jaccard similarity, or None."""
+        query = _trigrams(normalize_owner(owner))
+        shared = Counter()
+        for gram in query:
+            shared.update(self._grams.get(gram, ()))
+
+        best, best_score = None, min_similarity
+        for i, common in shared.items():
+            candidate = self.owners[i]
+            score = common / (len(query) + len(_trigrams(candidate)) - common)
+            if score > best_score or (score == best_score and best and candidate < best):
+                best, best_score = candidate, score
+        return best
+
+
+def check_owner(r: dict, index: OwnerIndex, suggestions: dict) -> list:
+    """Owner findings for a single resource. `suggestions` memoizes did-you-mean lookups."""
+    owner = r.get("tags", {}).get("Owner", "")
+    if not owner or owner in index:
+        return []
+
+    finding = {
+        "type": "ORPHAN_OWNER",
+        "resource": r.get("name", "Unknown"),
+        "resource_id": r.get("id", ""),
+        "owner_tag": owner,
+        "severity": "HIGH"
+    }
+    if owner not in suggestions:
+        suggestions[owner] = index.suggest(owner)
+    if suggestions[owner]:
+        finding["did_you_mean"] = suggestions[owner]
+    return [finding]
+
+
+def check_dates(r: dict, cal: Calendar) -> list:
+    """ReviewDate / ExpiryDate findings for a single resource, judged as of `cal.as_of`."""
     findings = []
-    for r in resources:
-        owner = r.get("tags", {}).get("Owner", "")
-        if owner and owner.lower() not in {o.lower() for o in valid_owners}:
+    tags = r.get("tags", {})
+
+    review = tags.get("ReviewDate", "")
+    if review:
+        review_day = cal.try_day(review)
+        if review_day and review_day.ordinal < cal.as_of_ordinal:
             findings.append({
-                "type": "ORPHAN_OWNER",
+                "type": "OVERDUE_REVIEW",
                 "resource": r.get("name", "Unknown"),
-                "resource_id": r.get("id", ""),
-                "owner_tag": owner,
+                "review_date": review,
+                "days_overdue": cal.days_ago(review_day),
+                "severity": "MEDIUM"
+            })
+
+    expiry = tags.get("ExpiryDate", "")
+    if expiry:
+        expiry_day = cal.try_day(expiry)
+        if expiry_day and expiry_day.ordinal < cal.as_of_ordinal:
+            findings.append({
+                "type": "PAST_EXPIRY",
+                "resource": r.get("name", "Unknown"),
+                "expiry_date": expiry,
+                "days_past": cal.days_ago(expiry_day),
                 "severity": "HIGH"
             })
+
     return findings
 
 
-def scan_dates(resources: list) -> list:
+def scan_owners(resources, directory) -> list:
+    """Find resources with Owner tags not in directory.
+
+    `directory` is either a prebuilt OwnerIndex or the raw user export.
+    """
+    index = directory if isinstance(directory, OwnerIndex) else OwnerIndex.build(directory)
+    suggestions = {}
+    return [f for r in resources for f in check_owner(r, index, suggestions)]
+
+
+def scan_dates(resources, cal: Calendar = None) -> list:
     """Find resources past ReviewDate or ExpiryDate."""
-    today = date.today()
-    findings = []
+    cal = cal or Calendar()
+    return [f for r in resources for f in check_dates(r, cal)]
 
-    for r in resources:
-        tags = r.get("tags", {})
 
-        review = tags.get("ReviewDate", "")
-        if review:
-            try:
-                review_date = date.fromisoformat(review)
-                if review_date < today:
-                    findings.append({
-                        "type": "OVERDUE_REVIEW",
-                        "resource": r.get("name", "Unknown"),
-                        "review_date": review,
-                        "days_overdue": (today - review_date).days,
-                        "severity": "MEDIUM"
-                    })
-            except ValueError:
-                pass
-
-        expiry = tags.get("ExpiryDate", "")
-        if expiry:
-            try:
-                expiry_date = date.fromisoformat(expiry)
-                if expiry_date < today:
-                    findings.append({
-                        "type": "PAST_EXPIRY",
-                        "resource": r.get("name", "Unknown"),
-                        "expiry_date": expiry,
-                        "days_past": (today - expiry_date).days,
-                        "severity": "HIGH"
-                    })
-            except ValueError:
-                pass
+def normalize_tag_value(value: str) -> str:
+    """Blocking key for tag values: lower-case alphanumerics only (CC-1001 == cc1001)."""
+    return _NON_ALNUM.sub("", str(value).lower())
+
+
+def _skeleton(value: str) -> str:
+    """Consonant skeleton of a normalized value: prod, prd, production → prd, prd, prdctn."""
+    return value[:1] + _VOWELS.sub("", value[1:])
+
+
+def allowed_values_from_policy(path: str = ALLOWED_VALUES_POLICY) -> dict:
+    """Tag key → allowed values, read from `notIn` conditions of an allowed-values policy."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        rule = json.load(f).get("properties", {}).get("policyRule", {})
+
+    allowed = {}
+    stack = [rule.get("if", {})]
+    while stack:
+        cond = stack.pop()
+        for combinator in ("allOf", "anyOf"):
+            stack.extend(cond.get(combinator, []))
+        field = re.match(r"^tags\['([^']+)'\]$", cond.get("field", ""))
+        if field and isinstance(cond.get("notIn"), list):
+            allowed[field.group(1)] = list(cond["notIn"])
+    return allowed
+
+
+def _is_abbreviation(short: str, long_: str) -> bool:
+    """Whether `short` abbreviates `long_`: same first letter, its characters in order, same digits."""
+    if not short or len(short) > MAX_ABBREVIATION or len(short) >= len(long_) or short[0] != long_[0]:
+        return False
+    if _NON_DIGIT.sub("", short) != _NON_DIGIT.sub("", long_):
+        return False
+    rest = iter(long_)
+    return all(ch in rest for ch in short)
+
+
+def cluster_tag_values(value_counts: dict, allowed: list = None) -> list:
+    """Group spelling variants of one tag's values.
+
+    The proposed mapping moves cost between values, so only unambiguous
+    variants are merged: values with the same normalized form (CC-1001,
+    cc1001) or, from three characters, the same consonant skeleton (prod,
+    prd). Prefixes and near-spellings are not variants on their own —
+    production/productivity and dev/devops are different names. A short
+    abbreviation (prod, dev) joins a longer value only when that value is
+    policy-allowed. Skeletons keep digits, so CC-1001 and CC-1002 never
+    merge. Grouping is by hash key, linear in the number of distinct values.
+    Returns clusters with more than one variant.
+    """
+    by_norm = defaultdict(list)
+    for value in value_counts:
+        by_norm[normalize_tag_value(value)].append(value)
+    norms = [n for n in by_norm if n]
+
+    parent = {n: n for n in norms}
+
+    def find(n):
+        while parent[n] != n:
+            parent[n] = parent[parent[n]]
+            n = parent[n]
+        return n
+
+    by_skeleton = {}
+    for norm in norms:
+        skeleton = _skeleton(norm)
+        if len(skeleton) < 3:
+            continue
+        first = by_skeleton.setdefault(skeleton, norm)
+        parent[find(norm)] = find(first)
+
+    allowed_norms = {normalize_tag_value(v) for v in allowed or []}
+    allowed_norms.discard("")
+    for norm in norms:
+        targets = [a for a in allowed_norms if _is_abbreviation(norm, a)]
+        if len(targets) == 1:  # An abbreviation of two allowed values is ambiguous
+            parent.setdefault(targets[0], targets[0])
+            parent[find(norm)] = find(targets[0])
 
+    groups = defaultdict(list)
+    for norm in norms:
+        groups[find(norm)].extend(by_norm[norm])
+
+    allowed_set = set(allowed or [])
+    clusters = []
+    for variants in groups.values():
+        if len(variants) < 2:
+            continue
+        # Prefer a policy-allowed spelling, then the most used one
+        canonical = max(variants, key=lambda v: (v in allowed_set, value_counts[v], v))
+        clusters.append({
+            "canonical": canonical,
+            "variants": {v: value_counts[v] for v in sorted(variants, key=lambda v: -value_counts[v])}
+        })
+    return sorted(clusters, key=lambda c: -sum(c["variants"].values()))
+
+
+def scan_value_clusters(tag_value_counts: dict, allowed_values: dict = None) -> list:
+    """Find likely duplicate spellings across each tag's distinct values."""
+    allowed_values = allowed_values or {}
+    findings = []
+    for tag, counts in tag_value_counts.items():
+        for cluster in cluster_tag_values(counts, allowed_values.get(tag)):
+            findings.append({
+                "type": "DUPLICATE_TAG_VALUES",
+                "resource": f"{tag} → {cluster['canonical']}",
+                "tag": tag,
+                "canonical": cluster["canonical"],
+                "variants": cluster["variants"],
+                "severity": "MEDIUM"
+            })
     return findings
 
 
+def canonical_value_map(findings: list) -> dict:
+    """Proposed {tag: {variant: canonical}} mapping from duplicate-value findings."""
+    mapping = defaultdict(dict)
+    for f in findings:
+        if f["type"] == "DUPLICATE_TAG_VALUES":
+            for variant in f["variants"]:
+                if variant != f["canonical"]:
+                    mapping[f["tag"]][variant] = f["canonical"]
+    return dict(mapping)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Stella Maris Tag Hygiene Scanner")
-    parser.add_argument("--resources", required=True, help="Resource inventory JSON")
+    parser.add_argument("--resources", required=True, help="Resource inventory JSON or NDJSON")
     parser.add_argument("--directory", default=None, help="Entra ID user export JSON")
+    parser.add_argument("--cache-dir", default=".finops-cache",
+                        help="Where the owner index is cached between runs")
+    parser.add_argument("--no-cache", action="store_true", help="Rebuild the owner index every run")
+    parser.add_argument("--effective-tags", nargs="?", const="", default=None, metavar="CONTAINERS",
+                        help="Apply tag inheritance first; parents from a CONTAINERS export or the inventory itself")
+    parser.add_argument("--cluster-tags", nargs="*", default=None, metavar="TAG",
+                        help=f"Check these tags for duplicate value spellings (bare flag: {' '.join(CLUSTER_TAGS)})")
+    parser.add_argument("--value-map", default=None,
+                        help="Write the proposed canonical value mapping JSON here")
+    add_calendar_args(parser)
     args = parser.parse_args()
 
-    with open(args.resources) as f:
-        data = json.load(f)
-    resources = data.get("resources", []) if isinstance(data, dict) else data
-
-    findings = []
-
+    owner_index = None
     if args.directory:
-        with open(args.directory) as f:
-            directory = json.load(f)
-        directory = directory.get("users", []) if isinstance(directory, dict) else directory
-        findings.extend(scan_owners(resources, directory))
+        owner_index = OwnerIndex.load_or_build(
+            args.directory, cache_dir=None if args.no_cache else args.cache_dir
+        )
 
-    findings.extend(scan_dates(resources))
+    # Single streaming pass: every check runs on each resource as it is read
+    if args.effective_tags is None:
+        resources = CountingIterator(iter_resources(args.resources))
+    else:
+        resources = CountingIterator(with_effective_tags(args.resources, args.effective_tags or None))
+    cal = calendar_from_args(args)
+    owner_findings, date_findings, suggestions = [], [], {}
+    # Clustering is opt-in: bare --cluster-tags, or --value-map, checks the default tags
+    if args.cluster_tags == [] or (args.cluster_tags is None and args.value_map):
+        cluster_tags = CLUSTER_TAGS
+    else:
+        cluster_tags = args.cluster_tags or []
+    tag_value_counts = {canonical_key(tag): Counter() for tag in cluster_tags}
+    for r in resources:
+        if owner_index is not None:
+            owner_findings.extend(check_owner(r, owner_index, suggestions))
+        date_findings.extend(check_dates(r, cal))
+        tags = r.get("tags", {})
+        for tag, counts in tag_value_counts.items():
+            value = tags.get(tag)
+            if value:
+                counts[value] += 1
+    cluster_findings = scan_value_clusters(tag_value_counts, allowed_values_from_policy())
+    findings = owner_findings + date_findings + cluster_findings
 
     print(f"{'='*60}")
     print(f"  TAG HYGIENE SCAN")
     print(f"  Date: {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}")
-    print(f"  Resources scanned: {len(resources)}")
+    if args.as_of:
+        print(f"  As of: {args.as_of}")
+    print(f"  Resources scanned: {resources.count}")
     print(f"{'='*60}")
     print()
 
@@ -114,6 +402,18 @@ def main():
     print(f"  Findings: {len(findings)}")
     print(f"{'='*60}")
 
+    if args.value_map:
+        with open(args.value_map, "w") as f:
+            json.dump({
+                "_metadata": {
+                    "pack": "cost-governance-tagging",
+                    "generated": datetime.now().strftime("%Y-%m-%d"),
+                    "description": "Proposed canonical tag values. Review before applying."
+                },
+                "mappings": canonical_value_map(cluster_findings)
+            }, f, indent=2)
+        print(f"\n  Canonical value map written to {args.value_map}")
+
 
 if __name__ == "__main__":
     main()
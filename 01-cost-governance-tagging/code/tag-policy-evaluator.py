@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Tag Policy Evaluator — Stella Maris Governance
+Dry-run the pack's Azure Policy definitions against an offline inventory.
+
+Compiles each policyRule if/then tree into Python predicates once, then
+evaluates every policy in a single pass over a Resource Graph export.
+Reports deny / audit / modify outcomes per resource — the effect Azure
+Policy would have, without waiting for its evaluation cycle.
+"""
+
+import os
+import re
+import sys
+import json
+import glob
+import time
+import fnmatch
+import argparse
+from datetime import datetime
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from inventory import iter_resources, CountingIterator  # noqa: E402
+
+
+DEFAULT_POLICIES = "tag-policy-*.json"
+
+# Indexed-mode policies only evaluate resource types that support tags and location
+NON_INDEXED_TYPES = {"microsoft.resources/resourcegroups", "microsoft.resources/subscriptions"}
+
+_TAG_FIELD = re.compile(r"^tags(?:\['(?P<q>[^']+)'\]|\[(?P<b>[^\]]+)\]|\.(?P<d>.+))$", re.IGNORECASE)
+_RG_TAG_VALUE = re.compile(r"^\[resourceGroup\(\)\.tags\['(?P<tag>[^']+)'\]\]$", re.IGNORECASE)
+_PARAMETER_VALUE = re.compile(r"^\[parameters\('(?P<name>[^']+)'\)\]$", re.IGNORECASE)
+_RESOURCE_FIELDS = {"name", "type", "location", "id", "kind"}
+
+
+def _id_segment(resource_id: str, segment: str) -> str:
+    """Return the path element following `segment` in an Azure resource ID."""
+    parts = resource_id.split("/")
+    for i, part in enumerate(parts[:-1]):
+        if part.lower() == segment:
+            return parts[i + 1]
+    return ""
+
+
+def rg_key(resource: dict) -> tuple:
+    """(subscription, resource group) key for a resource or resource group record."""
+    rid = resource.get("id", "")
+    sub = resource.get("subscriptionId") or _id_segment(rid, "subscriptions")
+    if resource.get("type", "").lower() == "microsoft.resources/resourcegroups":
+        rg = resource.get("name", "")
+    else:
+        rg = resource.get("resourceGroup") or _id_segment(rid, "resourcegroups")
+    return sub.lower(), rg.lower()
+
+
+class EvalContext:
+    """Per-resource view shared by every compiled policy.
+
+    Tag keys are lower-cased once here; Azure Policy treats them case-insensitively.
+    """
+
+    __slots__ = ("resource", "tags", "rg_tags", "indexed")
+
+    def __init__(self, resource: dict, rg_tags: dict):
+        self.resource = resource
+        self.tags = {k.lower(): v for k, v in (resource.get("tags") or {}).items()}
+        self.rg_tags = rg_tags
+        self.indexed = resource.get("type", "").lower() not in NON_INDEXED_TYPES
+
+
+# ─── Compilation ────────────────────────────────────────────────
+
+def _resolve_param(value, params: dict):
+    if isinstance(value, str):
+        m = _PARAMETER_VALUE.match(value)
+        if m:
+            name = m.group("name")
+            if name not in params:
+                raise ValueError(f"Policy parameter '{name}' has no value")
+            return params[name]
+    return value
+
+
+def _compile_field(field: str):
+    """Accessor for a `field` operand. Returns None when the field is absent."""
+    m = _TAG_FIELD.match(field)
+    if m:
+        key = (m.group("q") or m.group("b") or m.group("d")).lower()
+        return lambda ctx: ctx.tags.get(key)
+    if field.lower() in _RESOURCE_FIELDS:
+        name = field.lower()
+        return lambda ctx: ctx.resource.get(name)
+    raise ValueError(f"Unsupported policy field: {field}")
+
+
+def _compile_value(value, params: dict):
+    """Accessor for a `value` operand. Missing template values resolve to ""."""
+    value = _resolve_param(value, params)
+    if isinstance(value, str):
+        m = _RG_TAG_VALUE.match(value)
+        if m:
+            key = m.group("tag").lower()
+            return lambda ctx: ctx.rg_tags.get(key, "")
+        if value.startswith("[["):
+            value = value[1:]  # Escaped literal bracket
+        elif value.startswith("["):
+            raise ValueError(f"Unsupported policy expression: {value}")
+    return lambda ctx: value
+
+
+def _fold(value) -> str:
+    return str(value).lower()
+
+
+def _ordered(value, target) -> tuple:
+    """Operands for greater/less: numbers when both parse as numbers, else folded strings."""
+    try:
+        return float(value), float(target)
+    except (TypeError, ValueError):
+        return _fold(value), _fold(target)
+
+
+def _compile_operator(op: str, target, get):
+    """Predicate for one comparison. String comparisons are case-insensitive."""
+    if op == "exists":
+        want = _fold(target) == "true"
+        return lambda ctx: (get(ctx) is not None) == want
+
+    if op in ("equals", "notEquals"):
+        folded = _fold(target)
+        hit = lambda ctx: (v := get(ctx)) is not None and _fold(v) == folded
+    elif op in ("in", "notIn"):
+        targets = target if isinstance(target, list) else [target]
+        allowed = frozenset(_fold(t) for t in targets)
+        hit = lambda ctx: (v := get(ctx)) is not None and _fold(v) in allowed
+    elif op in ("like", "notLike"):
+        pattern = re.compile(fnmatch.translate(str(target)), re.IGNORECASE)
+        hit = lambda ctx: (v := get(ctx)) is not None and pattern.match(str(v)) is not None
+    elif op in ("contains", "notContains"):
+        folded = _fold(target)
+        hit = lambda ctx: (v := get(ctx)) is not None and folded in _fold(v)
+    elif op in ("greater", "greaterOrEquals", "less", "lessOrEquals"):
+        compare = {
+            "greater": lambda a, b: a > b,
+            "greaterOrEquals": lambda a, b: a >= b,
+            "less": lambda a, b: a < b,
+            "lessOrEquals": lambda a, b: a <= b,
+        }[op]
+        return lambda ctx: (v := get(ctx)) is not None and compare(*_ordered(v, target))
+    else:
+        raise ValueError(f"Unsupported policy operator: {op}")
+
+    if op.startswith("not"):
+        return lambda ctx: not hit(ctx)
+    return hit
+
+
+def _tag_existence_group(conds: list, params: dict):
+    """(tag keys, wanted) if every condition is `tags[...] exists <same>`, else None."""
+    keys, wanted = set(), set()
+    for c in conds:
+        if set(c) != {"field", "exists"}:
+            return None
+        m = _TAG_FIELD.match(c["field"])
+        if not m:
+            return None
+        keys.add((m.group("q") or m.group("b") or m.group("d")).lower())
+        wanted.add(_fold(_resolve_param(c["exists"], params)) == "true")
+    if len(wanted) != 1:
+        return None
+    return frozenset(keys), wanted.pop()
+
+
+def compile_condition(cond: dict, params: dict):
+    """Compile a policyRule `if` tree into a predicate over EvalContext.
+
+    Groups of tag existence checks (the shape of the required/recommended
+    tag policies) collapse into a single set comparison against the
+    resource's tag keys.
+    """
+    for combinator in ("allOf", "anyOf"):
+        group = _tag_existence_group(cond.get(combinator) or [], params)
+        if group:
+            keys, want = group
+            if combinator == "allOf" and want:
+                return lambda ctx: keys <= ctx.tags.keys()
+            if combinator == "allOf":
+                return lambda ctx: keys.isdisjoint(ctx.tags)
+            if want:
+                return lambda ctx: not keys.isdisjoint(ctx.tags)
+            return lambda ctx: not keys <= ctx.tags.keys()
+
+    if "allOf" in cond:
+        preds = tuple(compile_condition(c, params) for c in cond["allOf"])
+        return lambda ctx: all(p(ctx) for p in preds)
+    if "anyOf" in cond:
+        preds = tuple(compile_condition(c, params) for c in cond["anyOf"])
+        return lambda ctx: any(p(ctx) for p in preds)
+    if "not" in cond:
+        inner = compile_condition(cond["not"], params)
+        return lambda ctx: not inner(ctx)
+
+    if "field" in cond:
+        get = _compile_field(cond["field"])
+    elif "value" in cond:
+        get = _compile_value(cond["value"], params)
+    else:
+        raise ValueError(f"Condition has no field or value: {cond}")
+
+    ops = [k for k in cond if k not in ("field", "value")]
+    if len(ops) != 1:
+        raise ValueError(f"Condition must have exactly one operator: {cond}")
+    op = ops[0]
+    return _compile_operator(op, _resolve_param(cond[op], params), get)
+
+
+class CompiledPolicy:
+    """One policy definition compiled to a predicate plus its effect."""
+
+    def __init__(self, definition: dict, source: str = ""):
+        props = definition.get("properties", definition)
+        self.name = props.get("displayName") or os.path.basename(source) or "Unnamed policy"
+        self.source = source
+        self.mode = props.get("mode", "All")
+        self.indexed_only = self.mode.lower() == "indexed"
+
+        params = {name: spec.get("defaultValue")
+                  for name, spec in props.get("parameters", {}).items()
+                  if "defaultValue" in spec}
+        rule = props["policyRule"]
+        self.uses_rg_tags = "resourcegroup().tags" in json.dumps(props).lower()
+        self.predicate = compile_condition(rule["if"], params)
+        self.effect = _fold(_resolve_param(rule["then"]["effect"], params))
+        self.disabled = self.effect == "disabled"
+
+        self.operations = []
+        for op in rule["then"].get("details", {}).get("operations", []):
+            tag = _TAG_FIELD.match(op.get("field", ""))
+            self.operations.append({
+                "operation": op.get("operation", "addOrReplace"),
+                "field": op.get("field", ""),
+                "tag": (tag.group("q") or tag.group("b") or tag.group("d")) if tag else None,
+                "value": _compile_value(op.get("value", ""), params)
+            })
+
+    def evaluate(self, ctx: EvalContext):
+        """Outcome dict if the policy's effect fires for this resource, else None."""
+        if self.disabled or (self.indexed_only and not ctx.indexed):
+            return None
+        if not self.predicate(ctx):
+            return None
+
+        outcome = {"policy": self.name, "effect": self.effect}
+        if self.operations:
+            outcome["operations"] = [
+                {"operation": op["operation"], "field": op["field"], "value": op["value"](ctx)}
+                for op in self.operations
+            ]
+        return outcome
+
+
+def load_policies(patterns: list) -> list:
+    """Compile every policy definition matched by the given paths or globs."""
+    policies = []
+    for pattern in patterns:
+        paths = sorted(glob.glob(pattern)) or [pattern]
+        for path in paths:
+            with open(path) as f:
+                policies.append(CompiledPolicy(json.load(f), source=path))
+    return policies
+
+
+def load_resource_group_tags(resources) -> dict:
+    """Map (subscription, resource group) to lower-cased RG tags."""
+    rg_tags = {}
+    for r in resources:
+        if r.get("type", "").lower() == "microsoft.resources/resourcegroups":
+            rg_tags[rg_key(r)] = {k.lower(): v for k, v in (r.get("tags") or {}).items()}
+    return rg_tags
+
+
+# ─── Evaluation ─────────────────────────────────────────────────
+
+def evaluate_resources(resources, policies: list, rg_tags: dict = None):
+    """Yield (resource, outcomes) for every resource, evaluating all policies in one pass."""
+    empty = {}
+    for r in resources:
+        ctx = EvalContext(r, rg_tags.get(rg_key(r), empty) if rg_tags else empty)
+        outcomes = []
+        for policy in policies:
+            outcome = policy.evaluate(ctx)
+            if outcome:
+                outcomes.append(outcome)
+        yield r, outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stella Maris Tag Policy Evaluator")
+    parser.add_argument("--resources", required=True, help="Resource inventory JSON or NDJSON")
+    parser.add_argument("--policies", nargs="+", default=None,
+                        help="Policy definition files or globs (default: this pack's tag-policy-*.json)")
+    parser.add_argument("--resource-groups", default=None,
+                        help="Resource group export for resourceGroup().tags[...] expressions "
+                             "(default: resource group records in the inventory itself)")
+    parser.add_argument("--show", type=int, default=20, help="Resources to list per effect")
+    parser.add_argument("--output", default=None, help="Output per-resource outcomes JSON")
+    args = parser.parse_args()
+
+    policy_paths = args.policies or [os.path.join(os.path.dirname(os.path.abspath(__file__)), DEFAULT_POLICIES)]
+    policies = load_policies(policy_paths)
+    rg_tags = {}
+    if any(p.uses_rg_tags for p in policies):
+        # Resource groups may follow their resources in an export, so read them in a pre-pass
+        rg_tags = load_resource_group_tags(iter_resources(args.resource_groups or args.resources))
+        if not rg_tags:
+            source = args.resource_groups or f"{args.resources} (pass --resource-groups)"
+            print(f"  ⚠️  Policies reference resourceGroup().tags but {source} has no resource group records; "
+                  f"those values resolve to empty")
+
+    resources = CountingIterator(iter_resources(args.resources))
+    by_policy = defaultdict(int)
+    by_effect = defaultdict(int)
+    examples = defaultdict(list)
+    affected = 0
+
+    out = open(args.output, "w") if args.output else None
+    if out:
+        out.write('{"outcomes": [')
+    first = True
+
+    started = time.perf_counter()
+    for r, outcomes in evaluate_resources(resources, policies, rg_tags):
+        if not outcomes:
+            continue
+        affected += 1
+        for o in outcomes:
+            by_policy[(o["policy"], o["effect"])] += 1
+            by_effect[o["effect"]] += 1
+            if len(examples[o["effect"]]) < args.show:
+                examples[o["effect"]].append((r.get("name", "Unknown"), o))
+        if out:
+            out.write(("" if first else ",") + "\n  " + json.dumps({
+                "resource": r.get("name", "Unknown"),
+                "resource_id": r.get("id", ""),
+                "outcomes": outcomes
+            }))
+            first = False
+    elapsed = time.perf_counter() - started
+
+    print(f"{'='*60}")
+    print(f"  TAG POLICY DRY RUN")
+    print(f"  Date: {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}")
+    print(f"  Policies: {len(policies)} | Resources evaluated: {resources.count}")
+    print(f"  Evaluation time: {elapsed:.2f}s")
+    print(f"{'='*60}")
+    print()
+
+    for policy in policies:
+        print(f"  ─── {policy.name} [{policy.effect}] ───")
+        print(f"      Resources affected: {by_policy.get((policy.name, policy.effect), 0)}")
+    print()
+
+    icons = {"deny": "🔴", "audit": "🟡", "modify": "🔧", "append": "🔧"}
+    for effect, items in examples.items():
+        print(f"  {icons.get(effect, '•')} {effect.upper()} — {by_effect[effect]} outcome(s)")
+        for name, o in items:
+            detail = ""
+            if o.get("operations"):
+                detail = " → " + ", ".join(f"{op['field']} = {op['value'] or '(empty)'}" for op in o["operations"])
+            print(f"      {name}: {o['policy']}{detail}")
+        print()
+
+    print(f"{'='*60}")
+    print(f"  Resources with at least one outcome: {affected}")
+    print(f"  Dry-run the policy before the policy runs you.")
+    print(f"{'='*60}")
+
+    if out:
+        summary = {
+            "scan_date": datetime.now().strftime("%Y-%m-%d"),
+            "resources_evaluated": resources.count,
+            "resources_affected": affected,
+            "by_effect": dict(by_effect),
+            "by_policy": [{"policy": p, "effect": e, "count": c} for (p, e), c in by_policy.items()]
+        }
+        out.write("\n],\n" + '"summary": ' + json.dumps(summary, indent=2) + "}\n")
+        out.close()
+        print(f"\n  Outcomes written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Alert Deduplication — Stella Maris Governance
+Collapses the daily findings of anomaly-detection.py and
+resource-spike-scan.py into incidents keyed by (resource, finding type).
+A local SQLite store keeps incidents between runs, so a spike that
+persists for a week alerts once — and again only when it escalates or its
+cool-down lapses — instead of every day.
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import argparse
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from inventory import iter_resources  # noqa: E402
+from calendar_table import add_calendar_args, calendar_from_args  # noqa: E402
+
+
+BUDGET_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "budget-alerts.json")
+COOLDOWN_DAYS = 7
+RESOLVE_AFTER_DAYS = 3
+RETENTION_DAYS = 90
+PRINT_LIMIT = 25
+SPIKE_TYPE = "RESOURCE_SPIKE"
+
+# Detector severities and the budget / alert register spellings, lowest first
+SEVERITY_RANK = {"INFO": 0, "INFORMATIONAL": 0, "WARNING": 1, "HIGH": 2, "CRITICAL": 3}
+ALERT_ICONS = {"NEW": "🆕", "REOPENED": "🔂", "ESCALATED": "🔺", "REMINDER": "⏰", "RESOLVED": "✅", "RETRACTED": "↩️ "}
+
+
+def severity_rank(severity) -> int:
+    return SEVERITY_RANK.get(str(severity).upper(), SEVERITY_RANK["WARNING"])
+
+
+def load_routing(path: str = BUDGET_CONFIG) -> dict:
+    """Map severity → recipients from the budget threshold definitions.
+
+    A severity notifies everyone that any budget threshold of that
+    severity notifies, in the order they are first listed.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    routing = {}
+    for budget in config.get("budgets", []):
+        for rule in budget.get("thresholds", []) + [budget.get("forecast_alert") or {}]:
+            if "severity" not in rule:
+                continue
+            recipients = routing.setdefault(rule["severity"].upper(), [])
+            recipients.extend(r for r in rule.get("recipients", []) if r not in recipients)
+    routing.setdefault("INFO", routing.get("INFORMATIONAL", []))
+    return routing
+
+
+def finding_key(finding: dict) -> tuple:
+    """(resource, finding type). Spike findings carry no type and prefer the resource ID.
+
+    Tag-category findings (tag-alert-evaluator.py) carry neither: they are
+    keyed on the tag value they fired for ("Owner=bob") and the rule name.
+    """
+    if "rule" in finding and "tag" in finding:
+        value = finding.get("value")
+        return (f"{finding['tag']}={value}" if value is not None else finding["tag"]), finding["rule"]
+    resource = finding.get("resource_id") or finding.get("resource") or "Subscription"
+    return resource, finding.get("type", SPIKE_TYPE)
+
+
+def read_findings(paths: list, cal) -> tuple:
+    """(findings, restatement events, finding types held open) from one or more findings reports.
+
+    Findings without a date (resource-spike-scan.py) take the as-of date. A
+    report with neither a findings nor an events list is rejected, since
+    reading it as "nothing seen" would resolve every open incident. A
+    truncated report (resource-spike-scan.py --top) only lists the largest
+    spikes, so the finding types it carries are held open rather than
+    resolved for going unseen.
+    """
+    as_of = str(cal.as_of)
+    findings, events, held = [], [], set()
+    for path in paths:
+        meta = {}
+        try:
+            batch = list(iter_resources(path, key="findings", normalize=False, required=True, meta=meta))
+        except KeyError:
+            batch = None
+        try:
+            events.extend(iter_resources(path, key="events", normalize=False, required=True))
+        except KeyError:
+            if batch is None:
+                raise ValueError(f"{path} is not a findings report (no findings or events list)")
+        for finding in batch or []:
+            finding.setdefault("date", as_of)
+            findings.append(finding)
+        if meta.get("truncated"):
+            held.update(finding_key(f)[1] for f in batch or [])
+            held.add(SPIKE_TYPE)
+    return findings, events, held
+
+
+def incident_alert(kind: str, incident: dict) -> dict:
+    return {
+        "alert": kind,
+        "incident": incident["id"],
+        "resource": incident["resource"],
+        "type": incident["type"],
+        "severity": incident["severity"],
+        "first_seen": incident["first_seen"],
+        "last_seen": incident["last_seen"],
+        "occurrences": incident["occurrences"],
+        "finding": json.loads(incident["finding"])
+    }
+
+
+class AlertStore:
+    """Incidents keyed by (resource, finding type), persisted in SQLite.
+
+    At most one incident per key is open at a time (a partial unique index
+    enforces it). A run's findings are matched to their incidents with one
+    indexed join, so checking a day's findings costs O(findings · log n)
+    however many incidents the store holds.
+    """
+
+    _COLUMNS = ["id", "resource", "type", "status", "severity", "alerted_severity",
+                "first_seen", "last_seen", "last_alerted", "closed", "occurrences", "finding"]
+    _LAYOUT_VERSION = 1
+
+    def __init__(self, path: str, cooldown_days: int = COOLDOWN_DAYS,
+                 resolve_after_days: int = RESOLVE_AFTER_DAYS, retention_days: int = RETENTION_DAYS):
+        self.cooldown_days = cooldown_days
+        self.resolve_after_days = resolve_after_days
+        self.retention_days = retention_days
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS incidents (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                resource TEXT NOT NULL, type TEXT NOT NULL, status TEXT NOT NULL,
+                severity TEXT NOT NULL, alerted_severity TEXT NOT NULL,
+                first_seen TEXT NOT NULL, last_seen TEXT NOT NULL, last_alerted TEXT NOT NULL,
+                closed TEXT, occurrences INTEGER NOT NULL, finding TEXT NOT NULL
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS incidents_open ON incidents (resource, type) WHERE status = 'open';
+            CREATE INDEX IF NOT EXISTS incidents_key ON incidents (resource, type, closed);
+            CREATE INDEX IF NOT EXISTS incidents_status ON incidents (status, last_seen);
+        """)
+        layout = json.dumps({"version": self._LAYOUT_VERSION})
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'layout'").fetchone()
+        if row is None:
+            self.db.execute("INSERT INTO meta VALUES ('layout', ?)", (layout,))
+            self.db.commit()
+        elif row[0] != layout:
+            raise ValueError(f"Alert store {path} was built with a different layout — rebuild it")
+
+    def close(self):
+        self.db.close()
+
+    def open_count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM incidents WHERE status = 'open'").fetchone()[0]
+
+    def _load(self, keys: set, reopen_after: str) -> dict:
+        """Per key: the open incident, else the latest one resolved on or after `reopen_after`."""
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS incoming (resource TEXT NOT NULL, type TEXT NOT NULL)")
+        self.db.execute("DELETE FROM incoming")
+        self.db.executemany("INSERT INTO incoming VALUES (?, ?)", keys)
+        rows = self.db.execute(f"""
+            SELECT {', '.join('i.' + c for c in self._COLUMNS)}
+            FROM incoming n JOIN incidents i ON i.resource = n.resource AND i.type = n.type
+            WHERE i.status = 'open' OR (i.status = 'resolved' AND i.closed >= ?)
+            ORDER BY i.status = 'open', i.closed
+        """, (reopen_after,))
+        return {(row[1], row[2]): dict(zip(self._COLUMNS, row)) for row in rows}
+
+    def ingest(self, findings: list, events: list, cal, held_types: set = ()) -> tuple:
+        """Fold a run's findings and restatement events into incidents. Returns (alerts, stats).
+
+        Alerts are raised for new, reopened, escalated, reminder (cool-down
+        lapsed), resolved and retracted incidents. Every other repeat
+        finding is suppressed. Incidents of `held_types` are not resolved
+        this run.
+        """
+        alerts = []
+        stats = {"findings": len(findings), "suppressed": 0}
+
+        def alert(kind: str, incident: dict):
+            alerts.append(incident_alert(kind, incident))
+            stats[kind] = stats.get(kind, 0) + 1
+
+        keys = {finding_key(f) for f in findings}
+        keys.update((e.get("resource", "Subscription"), e.get("finding_type", "")) for e in events)
+        incidents = self._load(keys, str(date.fromordinal(cal.cutoff(self.cooldown_days))))
+        touched = {}
+
+        for finding in sorted(findings, key=lambda f: f["date"]):
+            key = finding_key(finding)
+            day = finding["date"]
+            severity = str(finding.get("severity", "WARNING")).upper()
+            body = json.dumps(finding)
+            incident = incidents.get(key)
+
+            if incident is None or incident["status"] != "open":
+                if incident is None:
+                    incident = {"id": None, "resource": key[0], "type": key[1], "first_seen": day, "occurrences": 0}
+                    kind = "NEW"
+                else:
+                    kind = "REOPENED"  # Recurred within the cool-down of its resolution
+                incident.update(status="open", severity=severity, alerted_severity=severity, last_seen=day,
+                                last_alerted=day, closed=None, occurrences=incident["occurrences"] + 1, finding=body)
+                if incident["id"] is None:
+                    self._insert(incident)
+                incidents[key] = touched[key] = incident
+                alert(kind, incident)
+                continue
+
+            if day < incident["last_seen"] or (day == incident["last_seen"] and body == incident["finding"]):
+                stats["suppressed"] += 1
+                continue
+            if day > incident["last_seen"]:
+                incident["occurrences"] += 1
+                incident["last_seen"] = day
+            incident["finding"] = body
+            if severity_rank(severity) > severity_rank(incident["severity"]):
+                incident["severity"] = severity
+            touched[key] = incident
+
+            if severity_rank(incident["severity"]) > severity_rank(incident["alerted_severity"]):
+                kind = "ESCALATED"
+            elif cal.day(day).ordinal - cal.day(incident["last_alerted"]).ordinal >= self.cooldown_days:
+                kind = "REMINDER"
+            else:
+                stats["suppressed"] += 1
+                continue
+            incident.update(alerted_severity=incident["severity"], last_alerted=day)
+            alert(kind, incident)
+
+        for event in events:
+            key = (event.get("resource", "Subscription"), event.get("finding_type", ""))
+            incident = incidents.get(key)
+            if incident is None or incident["status"] != "open":
+                continue
+            current = event.get("current")
+            if event.get("type") == "FINDING_UPDATED" and current:
+                incident["finding"] = json.dumps(current)
+                severity = str(current.get("severity", "WARNING")).upper()
+                if severity_rank(severity) > severity_rank(incident["alerted_severity"]):
+                    incident.update(severity=severity, alerted_severity=severity)
+                    alert("ESCALATED", incident)
+            elif event.get("type") == "FINDING_RETRACTED":
+                if incident["occurrences"] > 1:
+                    incident["occurrences"] -= 1
+                else:
+                    incident.update(status="retracted", closed=str(cal.as_of))
+                    alert("RETRACTED", incident)
+            touched[key] = incident
+
+        self._update(touched.values())
+        for incident in self._resolve_stale(cal, held_types):
+            alert("RESOLVED", incident)
+        self._prune(cal)
+        self.db.commit()
+        stats["open"] = self.open_count()
+        return alerts, stats
+
+    def _insert(self, incident: dict):
+        columns = self._COLUMNS[1:]
+        cur = self.db.execute(
+            f"INSERT INTO incidents ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [incident[c] for c in columns])
+        incident["id"] = cur.lastrowid
+
+    def _update(self, incidents):
+        columns = self._COLUMNS[3:]
+        self.db.executemany(
+            f"UPDATE incidents SET {', '.join(c + ' = ?' for c in columns)} WHERE id = ?",
+            [[i[c] for c in columns] + [i["id"]] for i in incidents])
+
+    def _resolve_stale(self, cal, held_types=()) -> list:
+        """Resolve open incidents last seen more than `resolve_after_days` before the as-of date."""
+        cutoff = str(date.fromordinal(cal.cutoff(self.resolve_after_days)))
+        held = sorted(held_types)
+        hold = f" AND type NOT IN ({', '.join('?' * len(held))})" if held else ""
+        stale = [dict(zip(self._COLUMNS, row)) for row in self.db.execute(
+            f"SELECT {', '.join(self._COLUMNS)} FROM incidents WHERE status = 'open' AND last_seen < ?{hold}",
+            [cutoff] + held)]
+        closed = str(cal.as_of)
+        for incident in stale:
+            incident.update(status="resolved", closed=closed)
+        self.db.executemany("UPDATE incidents SET status = 'resolved', closed = ? WHERE id = ?",
+                            [(closed, i["id"]) for i in stale])
+        return stale
+
+    def _prune(self, cal):
+        """Forget closed incidents older than the retention period."""
+        cutoff = str(date.fromordinal(cal.cutoff(self.retention_days)))
+        self.db.execute("DELETE FROM incidents WHERE status != 'open' AND closed < ?", (cutoff,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stella Maris Alert Deduplication")
+    parser.add_argument("--findings", nargs="+", required=True,
+                        help="Findings JSON from anomaly-detection.py, tag-alert-evaluator.py and/or "
+                             "resource-spike-scan.py (full scans; --top reports hold spike resolution)")
+    parser.add_argument("--state", required=True, help="Alert state store (SQLite; created on first run)")
+    parser.add_argument("--cooldown-days", type=int, default=COOLDOWN_DAYS,
+                        help="Re-alert a still-open incident only after this many days (default: 7)")
+    parser.add_argument("--resolve-after", type=int, default=RESOLVE_AFTER_DAYS,
+                        help="Resolve an incident after this many days without a finding (default: 3)")
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS,
+                        help="Keep closed incidents this long for reopen matching (default: 90)")
+    parser.add_argument("--budgets", default=BUDGET_CONFIG, help="Budget config whose thresholds route severities to recipients")
+    parser.add_argument("--output", default=None, help="Output alerts JSON")
+    add_calendar_args(parser)
+    args = parser.parse_args()
+
+    cal = calendar_from_args(args)
+    routing = load_routing(args.budgets)
+    try:
+        findings, events, held = read_findings(args.findings, cal)
+    except ValueError as e:
+        parser.error(str(e))
+    store = AlertStore(args.state, args.cooldown_days, args.resolve_after, args.retention_days)
+    try:
+        alerts, stats = store.ingest(findings, events, cal, held)
+    finally:
+        store.close()
+    for a in alerts:
+        # Tag-category rules name their own recipients; other findings route by severity
+        a["recipients"] = a["finding"].get("recipients") or routing.get(a["severity"].upper(), [])
+
+    print(f"{'='*60}")
+    print(f"  ALERT DEDUPLICATION")
+    print(f"  Date: {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}")
+    if args.as_of:
+        print(f"  As of: {args.as_of}")
+    print(f"  Findings: {stats['findings']} | Restatement events: {len(events)}")
+    print(f"  Cool-down: {args.cooldown_days} days | Resolve after: {args.resolve_after} days quiet")
+    if held:
+        print(f"  ⚠️  Truncated (--top) input — not resolving: {', '.join(sorted(held))}")
+    print(f"{'='*60}")
+    print()
+
+    if alerts:
+        for a in alerts[:PRINT_LIMIT]:
+            print(f"  {ALERT_ICONS[a['alert']]} [{a['alert']}] {a['type']} {a['resource']} ({a['severity']})")
+            print(f"      Seen {a['first_seen']} → {a['last_seen']} ({a['occurrences']} days) | "
+                  f"Notify: {', '.join(a['recipients']) or 'none'}")
+        if len(alerts) > PRINT_LIMIT:
+            print(f"  ... and {len(alerts) - PRINT_LIMIT} more")
+    else:
+        print(f"  ✓ No new or changed alerts")
+    print()
+
+    print(f"{'='*60}")
+    counts = " | ".join(f"{kind.lower()}: {stats[kind]}" for kind in ALERT_ICONS if stats.get(kind))
+    print(f"  Alerts: {len(alerts)}" + (f" ({counts})" if counts else ""))
+    print(f"  Suppressed repeats: {stats['suppressed']} | Open incidents: {stats['open']}")
+    print(f"  One incident, one page. Repeats are noise.")
+    print(f"{'='*60}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"alerts": alerts, "summary": stats, "scan_date": str(cal.as_of)}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
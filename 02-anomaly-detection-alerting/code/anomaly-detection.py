@@ -1,160 +1,1386 @@
 #!/usr/bin/env python3
 """
 Cost Anomaly Detection — Stella Maris Governance
-Statistical anomaly detection: 7-day rolling, day-over-day, weekend, new resource.
+Statistical anomaly detection: rolling average (7/14/28/90-day), rolling
+z-score, EWMA, rolling median/MAD, day-of-week seasonal, day-over-day,
+weekend, new resource. Each detector runs per
+series (resource by default), with series spread across worker processes.
+With --state, per-series state persists between runs and only new days
+are scanned; restated days replay just the affected windows.
+With --backtest, threshold and window grids are scored against labeled
+incidents (precision, recall, alert volume).
 """
 
+import os
 import json
+import math
 import sys
+import sqlite3
 import argparse
-from datetime import datetime, date, timedelta
-from collections import defaultdict
+from array import array
+from statistics import median
+from datetime import datetime
+from bisect import bisect_left, bisect_right, insort
+from itertools import combinations
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from inventory import iter_resources, CountingIterator  # noqa: E402
+from calendar_table import Calendar, add_calendar_args, calendar_from_args  # noqa: E402
+from tagkeys import canonical_key  # noqa: E402
+
+
+WINDOW_CHOICES = (7, 14, 28, 90)
+DEFAULT_WINDOW = 7
+WEEKEND_MULTIPLIER = 2.0
+NEW_RESOURCE_DAILY = 25.0
+NEW_RESOURCE_LOOKBACK_DAYS = 7
+RESTATEMENT_DAYS = 7  # Cost exports restate the previous 48–72 hours; keep margin
+MAD_SCALE = 0.6745  # Modified z-score: 0.6745 × (x − median) / MAD (Iglewicz & Hoaglin)
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+class RollingWindow:
+    """Fixed-length sliding window with O(1) mean and variance per step.
+
+    Keeps a running mean and sum of squared deviations (Welford), updated
+    as each value enters and the oldest leaves, so cost per point does not
+    grow with window length.
+    """
+
+    def __init__(self, size: int):
+        if size < 2:
+            raise ValueError(f"Window must be at least 2 days, got {size}")
+        self.size = size
+        self.values = deque()
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    @classmethod
+    def restore(cls, size: int, values, mean: float, m2: float) -> "RollingWindow":
+        """Rebuild a window from persisted state, continuing the same running sums."""
+        rolling = cls(size)
+        rolling.values = deque(values)
+        rolling.mean = mean
+        rolling._m2 = m2
+        return rolling
+
+    def full(self) -> bool:
+        return len(self.values) == self.size
+
+    def push(self, x: float):
+        """Add a value, evicting the oldest once the window is full."""
+        if len(self.values) == self.size:
+            old = self.values.popleft()
+            delta = x - old
+            new_mean = self.mean + delta / self.size
+            self._m2 += delta * (x - new_mean + old - self.mean)
+            self.mean = new_mean
+        else:
+            n = len(self.values) + 1
+            delta = x - self.mean
+            self.mean += delta / n
+            self._m2 += delta * (x - self.mean)
+        self.values.append(x)
+
+    def stddev(self) -> float:
+        """Sample standard deviation of the current window."""
+        n = len(self.values)
+        if n < 2:
+            return 0.0
+        return math.sqrt(max(self._m2, 0.0) / (n - 1))
+
+
+class SortedWindow:
+    """Fixed-length sliding window kept in sorted order, for order statistics.
+
+    Each push is a binary-search insert and a binary-search removal of the
+    evicted value; median and MAD are read by index, never by re-sorting.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.fifo = deque()
+        self.ordered = []
+
+    @classmethod
+    def from_values(cls, size: int, values) -> "SortedWindow":
+        window = cls(size)
+        window.fifo = deque(values)
+        window.ordered = sorted(window.fifo)
+        return window
+
+    def __len__(self) -> int:
+        return len(self.fifo)
+
+    def full(self) -> bool:
+        return len(self.fifo) == self.size
+
+    def push(self, x: float):
+        """Add a value, evicting the oldest once the window is full."""
+        if len(self.fifo) == self.size:
+            del self.ordered[bisect_left(self.ordered, self.fifo.popleft())]
+        insort(self.ordered, x)
+        self.fifo.append(x)
+
+    def median(self) -> float:
+        s, n = self.ordered, len(self.ordered)
+        mid = n // 2
+        return s[mid] if n % 2 else (s[mid - 1] + s[mid]) / 2
+
+    def _kth_deviation(self, m: float, k: int) -> float:
+        """k-th smallest (0-based) of |x − m| over the window, in O(log w).
+
+        Values below m and values from m up, read outward from m, are two
+        sorted runs of deviations; select across them by binary search.
+        """
+        s = self.ordered
+        p = bisect_left(s, m)
+        lo = k + 1 - (len(s) - p)
+        if lo < 0:
+            lo = 0
+        hi = p if p < k + 1 else k + 1
+        while lo < hi:
+            i = (lo + hi) // 2
+            if m - s[p - 1 - i] < s[p + k - i] - m:
+                lo = i + 1
+            else:
+                hi = i
+        j = k + 1 - lo
+        if not lo:
+            return s[p + j - 1] - m
+        if not j:
+            return m - s[p - lo]
+        below, above = m - s[p - lo], s[p + j - 1] - m
+        return below if below > above else above
+
+    def mad(self) -> float:
+        """Median absolute deviation from the window median."""
+        n = len(self.ordered)
+        m = self.median()
+        if n % 2:
+            return self._kth_deviation(m, n // 2)
+        return (self._kth_deviation(m, n // 2 - 1) + self._kth_deviation(m, n // 2)) / 2
+
+
+def _window_avg_field(window: int) -> str:
+    return "seven_day_avg" if window == DEFAULT_WINDOW else "window_avg"
 
-def detect_rolling_average(daily_costs: list, threshold_pct: float = 30.0) -> list:
-    """Detect days where cost exceeds 7-day rolling average by threshold."""
-    findings = []
-    if len(daily_costs) < 8:
-        return findings
 
-    for i in range(7, len(daily_costs)):
-        window = daily_costs[i-7:i]
-        avg = sum(d["cost"] for d in window) / 7
-        current = daily_costs[i]
+def _window_days(window: int) -> dict:
+    """`window_days` for findings from a non-default --window; default findings keep their original fields."""
+    return {} if window == DEFAULT_WINDOW else {"window_days": window}
 
-        if avg > 0 and current["cost"] > avg * (1 + threshold_pct / 100):
-            deviation = ((current["cost"] - avg) / avg) * 100
-            findings.append({
-                "type": "ROLLING_AVERAGE_DEVIATION",
+
+# Per-point checks, shared by the batch detectors and the online state store
+
+def _rolling_average_finding(current: dict, avg: float, threshold_pct: float, window: int):
+    if avg > 0 and current["cost"] > avg * (1 + threshold_pct / 100):
+        deviation = ((current["cost"] - avg) / avg) * 100
+        return {
+            "type": "ROLLING_AVERAGE_DEVIATION",
+            "date": current["date"],
+            "resource": current.get("resource", "Subscription"),
+            "cost": round(current["cost"], 2),
+            _window_avg_field(window): round(avg, 2),
+            **_window_days(window),
+            "deviation_pct": round(deviation, 1),
+            "threshold_pct": threshold_pct,
+            "severity": "HIGH" if deviation > 100 else "WARNING"
+        }
+    return None
+
+
+def _zscore_finding(current: dict, mean: float, std: float, z_threshold: float, window: int):
+    if std > 0:
+        z = (current["cost"] - mean) / std
+        if z > z_threshold:
+            return {
+                "type": "ROLLING_ZSCORE_DEVIATION",
                 "date": current["date"],
                 "resource": current.get("resource", "Subscription"),
                 "cost": round(current["cost"], 2),
-                "seven_day_avg": round(avg, 2),
-                "deviation_pct": round(deviation, 1),
-                "threshold_pct": threshold_pct,
-                "severity": "HIGH" if deviation > 100 else "WARNING"
-            })
+                "window_avg": round(mean, 2),
+                "window_stddev": round(std, 2),
+                **_window_days(window),
+                "z_score": round(z, 2),
+                "z_threshold": z_threshold,
+                "severity": "HIGH" if z > 2 * z_threshold else "WARNING"
+            }
+    return None
+
+
+def _ewma_finding(current: dict, ewma: float, threshold_pct: float, alpha: float):
+    if ewma > 0 and current["cost"] > ewma * (1 + threshold_pct / 100):
+        deviation = ((current["cost"] - ewma) / ewma) * 100
+        return {
+            "type": "EWMA_DEVIATION",
+            "date": current["date"],
+            "resource": current.get("resource", "Subscription"),
+            "cost": round(current["cost"], 2),
+            "ewma": round(ewma, 2),
+            "alpha": alpha,
+            "deviation_pct": round(deviation, 1),
+            "threshold_pct": threshold_pct,
+            "severity": "HIGH" if deviation > 100 else "WARNING"
+        }
+    return None
+
+
+def _median_finding(current: dict, median: float, mad: float, z_threshold: float, window: int):
+    if mad > 0:
+        z = MAD_SCALE * (current["cost"] - median) / mad
+        if z > z_threshold:
+            return {
+                "type": "ROLLING_MEDIAN_DEVIATION",
+                "date": current["date"],
+                "resource": current.get("resource", "Subscription"),
+                "cost": round(current["cost"], 2),
+                "window_median": round(median, 2),
+                "window_mad": round(mad, 2),
+                **_window_days(window),
+                "robust_z": round(z, 2),
+                "z_threshold": z_threshold,
+                "severity": "HIGH" if z > 2 * z_threshold else "WARNING"
+            }
+    return None
+
+
+def _seasonal_finding(current: dict, weekday: int, baseline: float, threshold_pct: float, weeks: int):
+    if baseline > 0 and current["cost"] > baseline * (1 + threshold_pct / 100):
+        deviation = ((current["cost"] - baseline) / baseline) * 100
+        return {
+            "type": "SEASONAL_DEVIATION",
+            "date": current["date"],
+            "resource": current.get("resource", "Subscription"),
+            "cost": round(current["cost"], 2),
+            "weekday": WEEKDAY_NAMES[weekday],
+            "seasonal_baseline": round(baseline, 2),
+            "weeks": weeks,
+            "deviation_pct": round(deviation, 1),
+            "threshold_pct": threshold_pct,
+            "severity": "HIGH" if deviation > 100 else "WARNING"
+        }
+    return None
+
+
+def _day_over_day_finding(current: dict, prev: float, threshold_pct: float):
+    curr = current["cost"]
+    if prev > 0 and curr > prev * (1 + threshold_pct / 100):
+        spike = ((curr - prev) / prev) * 100
+        return {
+            "type": "DAY_OVER_DAY_SPIKE",
+            "date": current["date"],
+            "resource": current.get("resource", "Subscription"),
+            "cost": round(curr, 2),
+            "previous_day": round(prev, 2),
+            "spike_pct": round(spike, 1),
+            "severity": "HIGH" if spike > 100 else "WARNING"
+        }
+    return None
+
+
+def _weekend_finding(d: dict, weekday_avg: float, weekday_avg_threshold: float, holiday: str = ""):
+    if weekday_avg > 0 and d["cost"] > weekday_avg * weekday_avg_threshold:
+        finding = {
+            "type": "WEEKEND_ANOMALY",
+            "date": d["date"],
+            "resource": d.get("resource", "Subscription"),
+            "weekend_cost": round(d["cost"], 2),
+            "weekday_avg": round(weekday_avg, 2),
+            "multiplier": round(d["cost"] / weekday_avg, 1),
+            "severity": "WARNING"
+        }
+        if holiday:
+            finding["holiday"] = holiday
+        return finding
+    return None
+
+
+def _new_resource_finding(d: dict, cutoff: int, threshold_daily: float, cal: Calendar):
+    created = d.get("created_date", "")
+    if created and d["cost"] > threshold_daily and cal.day(created).ordinal >= cutoff:
+        return {
+            "type": "NEW_RESOURCE_COST",
+            "date": d["date"],
+            "resource": d.get("resource", "Unknown"),
+            "daily_cost": round(d["cost"], 2),
+            "created_date": created,
+            "threshold": threshold_daily,
+            "severity": "WARNING"
+        }
+    return None
+
+
+class WeekdayBaseline:
+    """Running mean of business-day cost: the weekend detector's baseline.
+
+    A weekend or holiday is judged against the business days before it,
+    so a batch scan and the online state judge every day alike.
+    """
+
+    __slots__ = ("total", "count")
+
+    def __init__(self, total: float = 0.0, count: int = 0):
+        self.total = total
+        self.count = count
+
+    def step(self, current: dict, day, threshold: float):
+        """Fold in a business day, or judge a weekend or holiday against the mean so far."""
+        if day.is_business_day:
+            self.total += current["cost"]
+            self.count += 1
+            return None
+        if not self.count:
+            return None
+        return _weekend_finding(current, self.total / self.count, threshold, day.holiday)
+
+
+def detect_rolling_average(daily_costs: list, threshold_pct: float = 30.0, window: int = 7) -> list:
+    """Detect days where cost exceeds the rolling average of the prior `window` days by threshold."""
+    findings = []
+    if len(daily_costs) <= window:
+        return findings
+
+    rolling = RollingWindow(window)
+    for i, current in enumerate(daily_costs):
+        if i >= window:
+            finding = _rolling_average_finding(current, rolling.mean, threshold_pct, window)
+            if finding:
+                findings.append(finding)
+        rolling.push(current["cost"])
     return findings
 
 
-def detect_day_over_day(daily_costs: list, threshold_pct: float = 50.0) -> list:
-    """Detect day-over-day spikes exceeding threshold."""
+def detect_rolling_zscore(daily_costs: list, z_threshold: float = 3.0, window: int = 28) -> list:
+    """Detect days whose cost sits more than `z_threshold` rolling standard deviations above the rolling mean."""
     findings = []
-    for i in range(1, len(daily_costs)):
-        prev = daily_costs[i-1]["cost"]
-        curr = daily_costs[i]["cost"]
-
-        if prev > 0 and curr > prev * (1 + threshold_pct / 100):
-            spike = ((curr - prev) / prev) * 100
-            findings.append({
-                "type": "DAY_OVER_DAY_SPIKE",
-                "date": daily_costs[i]["date"],
-                "resource": daily_costs[i].get("resource", "Subscription"),
-                "cost": round(curr, 2),
-                "previous_day": round(prev, 2),
-                "spike_pct": round(spike, 1),
-                "severity": "HIGH" if spike > 100 else "WARNING"
-            })
+    if len(daily_costs) <= window:
+        return findings
+
+    rolling = RollingWindow(window)
+    for i, current in enumerate(daily_costs):
+        if i >= window:
+            finding = _zscore_finding(current, rolling.mean, rolling.stddev(), z_threshold, window)
+            if finding:
+                findings.append(finding)
+        rolling.push(current["cost"])
     return findings
 
 
-def detect_weekend(daily_costs: list, weekday_avg_threshold: float = 2.0) -> list:
-    """Detect significant weekend cost on non-production resources."""
+def detect_ewma(daily_costs: list, threshold_pct: float = 30.0, alpha: float = 0.3, warmup: int = 7) -> list:
+    """Detect days where cost exceeds the exponentially weighted moving average of prior days by threshold.
+
+    Days are only judged once `warmup` days have built the average.
+    """
     findings = []
-    weekday_costs = [d for d in daily_costs if date.fromisoformat(d["date"]).weekday() < 5]
-    weekend_costs = [d for d in daily_costs if date.fromisoformat(d["date"]).weekday() >= 5]
+    ewma = None
+    for i, current in enumerate(daily_costs):
+        if i >= warmup:
+            finding = _ewma_finding(current, ewma, threshold_pct, alpha)
+            if finding:
+                findings.append(finding)
+        ewma = current["cost"] if ewma is None else alpha * current["cost"] + (1 - alpha) * ewma
+    return findings
 
-    if not weekday_costs or not weekend_costs:
+
+def detect_rolling_median(daily_costs: list, z_threshold: float = 3.5, window: int = 7) -> list:
+    """Detect days whose robust z-score against the prior window's median and MAD exceeds threshold.
+
+    A single spike moves the median and MAD far less than it moves a mean,
+    so the days after a spike are still judged against a clean baseline.
+    """
+    findings = []
+    if len(daily_costs) <= window:
         return findings
 
-    weekday_avg = sum(d["cost"] for d in weekday_costs) / len(weekday_costs)
-
-    for d in weekend_costs:
-        if weekday_avg > 0 and d["cost"] > weekday_avg * weekday_avg_threshold:
-            findings.append({
-                "type": "WEEKEND_ANOMALY",
-                "date": d["date"],
-                "resource": d.get("resource", "Subscription"),
-                "weekend_cost": round(d["cost"], 2),
-                "weekday_avg": round(weekday_avg, 2),
-                "multiplier": round(d["cost"] / weekday_avg, 1),
-                "severity": "WARNING"
-            })
+    ordered = SortedWindow(window)
+    for i, current in enumerate(daily_costs):
+        if i >= window:
+            finding = _median_finding(current, ordered.median(), ordered.mad(), z_threshold, window)
+            if finding:
+                findings.append(finding)
+        ordered.push(current["cost"])
     return findings
 
 
-def detect_new_resource(daily_costs: list, threshold_daily: float = 25.0, lookback_days: int = 7) -> list:
+def detect_seasonal(daily_costs: list, threshold_pct: float = 30.0, weeks: int = 4, cal: Calendar = None) -> list:
+    """Detect days exceeding the median of the same weekday over the prior `weeks` weeks by threshold."""
+    cal = cal or Calendar()
+    findings = []
+    by_weekday = [SortedWindow(weeks) for _ in range(7)]
+    for current in daily_costs:
+        weekday = cal.day(current["date"]).weekday
+        baseline = by_weekday[weekday]
+        if baseline.full():
+            finding = _seasonal_finding(current, weekday, baseline.median(), threshold_pct, weeks)
+            if finding:
+                findings.append(finding)
+        baseline.push(current["cost"])
+    return findings
+
+
+def detect_day_over_day(daily_costs: list, threshold_pct: float = 50.0) -> list:
+    """Detect day-over-day spikes exceeding threshold."""
+    findings = []
+    for i in range(1, len(daily_costs)):
+        finding = _day_over_day_finding(daily_costs[i], daily_costs[i-1]["cost"], threshold_pct)
+        if finding:
+            findings.append(finding)
+    return findings
+
+
+def detect_weekend(daily_costs: list, weekday_avg_threshold: float = WEEKEND_MULTIPLIER, cal: Calendar = None) -> list:
+    """Detect weekend (or holiday) cost well above the mean of the business days before it."""
+    cal = cal or Calendar()
+    findings = []
+    baseline = WeekdayBaseline()
+    for d in daily_costs:
+        finding = baseline.step(d, cal.day(d["date"]), weekday_avg_threshold)
+        if finding:
+            findings.append(finding)
+    return findings
+
+
+def detect_new_resource(daily_costs: list, threshold_daily: float = NEW_RESOURCE_DAILY,
+                        lookback_days: int = NEW_RESOURCE_LOOKBACK_DAYS, cal: Calendar = None) -> list:
     """Detect new resources exceeding daily cost threshold."""
+    cal = cal or Calendar()
     findings = []
-    today = date.today()
-    cutoff = today - timedelta(days=lookback_days)
+    cutoff = cal.cutoff(lookback_days)
 
     for d in daily_costs:
-        created = d.get("created_date", "")
-        if created and date.fromisoformat(created) >= cutoff and d["cost"] > threshold_daily:
-            findings.append({
-                "type": "NEW_RESOURCE_COST",
-                "date": d["date"],
-                "resource": d.get("resource", "Unknown"),
-                "daily_cost": round(d["cost"], 2),
-                "created_date": created,
-                "threshold": threshold_daily,
-                "severity": "WARNING"
-            })
+        finding = _new_resource_finding(d, cutoff, threshold_daily, cal)
+        if finding:
+            findings.append(finding)
     return findings
 
 
+# ─── Multi-series engine ───
+
+DEFAULT_SERIES_BY = ["resource"]
+PRINT_LIMIT = 25
+
+
+def _series_value(row: dict, field: str) -> str:
+    if field.startswith("tag:"):
+        return (row.get("tags") or {}).get(field[4:]) or "Untagged"
+    return row.get(field) or ("Subscription" if field == "resource" else "Unassigned")
+
+
+def series_labeler(series_by: list = None):
+    """Function mapping a cost row to its series label."""
+    fields = series_by or DEFAULT_SERIES_BY
+    if fields == ["resource"]:
+        def label_of(row):
+            return row.get("resource") or "Subscription"
+    else:
+        def label_of(row):
+            return "/".join([_series_value(row, f) for f in fields])
+    return label_of
+
+
+def partition_series(rows, series_by: list = None) -> dict:
+    """Hash-partition cost rows into one daily series per key, in one pass.
+
+    `series_by` lists the row fields that identify a series: "resource",
+    "subscription", or "tag:<Key>" for a tag value. Rows sharing a series
+    and date (several meters on one resource) are summed. Returns
+    label → (earliest created_date, {date: cost}); dates are sorted when
+    the series is scanned.
+    """
+    label_of = series_labeler(series_by)
+    series = {}
+    for row in rows:
+        label = label_of(row)
+        entry = series.get(label)
+        if entry is None:
+            entry = series[label] = ["", {}]
+        days = entry[1]
+        days[row["date"]] = days.get(row["date"], 0.0) + row["cost"]
+        created = row.get("created_date")
+        if created and (not entry[0] or created < entry[0]):
+            entry[0] = created
+    return {label: tuple(entry) for label, entry in series.items()}
+
+
+def series_rows(label: str, created: str, days: dict) -> list:
+    """Date-ordered daily cost rows for one series, in the shape the detectors take."""
+    rows = [{"date": d, "resource": label, "cost": days[d]} for d in sorted(days)]
+    if created:
+        for row in rows:
+            row["created_date"] = created
+    return rows
+
+
+def scan_names(opts: dict) -> list:
+    window = opts["window"]
+    return [
+        f"{window}-Day Rolling Average",
+        f"{window}-Day Rolling Z-Score",
+        "EWMA Deviation",
+        f"{window}-Day Rolling Median/MAD",
+        "Day-of-Week Seasonal",
+        "Day-over-Day Spike",
+        "Weekend Anomaly",
+        "New Resource Cost"
+    ]
+
+
+def run_detectors(daily_costs: list, opts: dict) -> list:
+    """Every detector over one date-ordered series. Returns [(scan name, findings)]."""
+    window = opts["window"]
+    cal = opts["calendar"]
+    return list(zip(scan_names(opts), [
+        detect_rolling_average(daily_costs, opts["rolling_threshold"], window),
+        detect_rolling_zscore(daily_costs, opts["zscore_threshold"], window),
+        detect_ewma(daily_costs, opts["rolling_threshold"], opts["ewma_alpha"], window),
+        detect_rolling_median(daily_costs, opts["mad_threshold"], window),
+        detect_seasonal(daily_costs, opts["rolling_threshold"], opts["seasonal_weeks"], cal),
+        detect_day_over_day(daily_costs, opts["dod_threshold"]),
+        detect_weekend(daily_costs, cal=cal),
+        detect_new_resource(daily_costs, cal=cal)
+    ]))
+
+
+def _scan_chunk(chunk: list, opts: dict) -> list:
+    """Worker entry point: run the detectors over a batch of (label, created, days) series."""
+    merged = None
+    for label, created, days in chunk:
+        results = run_detectors(series_rows(label, created, days), opts)
+        if merged is None:
+            merged = results
+        else:
+            for (_, acc), (_, findings) in zip(merged, results):
+                acc.extend(findings)
+    return merged or []
+
+
+def run_engine(series: dict, opts: dict, workers: int = 1) -> list:
+    """Scan every series, spreading batches of series across a process pool.
+
+    Returns [(scan name, findings)] with findings in series order, so the
+    result does not depend on the worker count.
+    """
+    items = [(label, created, days) for label, (created, days) in series.items()]
+    scans = [(name, []) for name in scan_names(opts)]
+    if not items:
+        return scans
+
+    workers = max(1, min(workers, len(items)))
+    if workers == 1:
+        chunks = map(_scan_chunk, [items], [opts])
+        pool = None
+    else:
+        size = max(1, len(items) // (workers * 8))
+        batches = [items[i:i + size] for i in range(0, len(items), size)]
+        pool = ProcessPoolExecutor(max_workers=workers)
+        chunks = pool.map(_scan_chunk, batches, [opts] * len(batches))
+    try:
+        for results in chunks:
+            for (_, acc), (_, findings) in zip(scans, results):
+                acc.extend(findings)
+    finally:
+        if pool:
+            pool.shutdown()
+    return scans
+
+
+# ─── Drilldown ───
+
+TAG_ALERTS_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tag-category-alerts.json")
+DRILLDOWN_TYPES = {"ROLLING_AVERAGE_DEVIATION", "ROLLING_ZSCORE_DEVIATION", "EWMA_DEVIATION",
+                   "ROLLING_MEDIAN_DEVIATION", "SEASONAL_DEVIATION", "DAY_OVER_DAY_SPIKE"}
+DRILLDOWN_DEPTH = 2
+DRILLDOWN_TOP = 3
+DRILLDOWN_MIN_SHARE = 0.10  # Prune contributors below 10% of their parent's delta
+
+
+def drilldown_dimensions(path: str = TAG_ALERTS_CONFIG) -> list:
+    """Tag dimensions to attribute anomalies across: the tags the tag-category alert rules watch."""
+    with open(path) as f:
+        rules = json.load(f).get("tag_alerts", [])
+    dimensions = []
+    for rule in rules:
+        tag = canonical_key(rule["tag"])
+        if tag not in dimensions:
+            dimensions.append(tag)
+    return dimensions
+
+
+class DrilldownCube:
+    """Day × tag-dimension cost cube per series, built once per run.
+
+    Rows are first summed per (series, day, full tag tuple) as they stream
+    past, then rolled up into every dimension combination up to `depth`.
+    Attributing an anomaly then reads only the cube: the anomalous day's
+    cells against the same cells on the finding's baseline days.
+    """
+
+    def __init__(self, dimensions: list, series_by: list = None, depth: int = DRILLDOWN_DEPTH,
+                 top: int = DRILLDOWN_TOP, min_share: float = DRILLDOWN_MIN_SHARE):
+        self.dimensions = dimensions
+        self.depth = min(depth, len(dimensions))
+        self.top = top
+        self.min_share = min_share
+        self.combos = [c for k in range(1, self.depth + 1) for c in combinations(range(len(dimensions)), k)]
+        self._label_of = series_labeler(series_by)
+        self._cells = {}
+        self.cube = {}
+        self.days = {}
+
+    def observe(self, rows):
+        """Pass rows through, summing each into its finest-grain cell."""
+        dims = self.dimensions
+        for row in rows:
+            tags = row.get("tags") or {}
+            key = (self._label_of(row), row["date"])
+            cells = self._cells.get(key)
+            if cells is None:
+                cells = self._cells[key] = {}
+            values = tuple([tags.get(d) or "Untagged" for d in dims])
+            cells[values] = cells.get(values, 0.0) + row["cost"]
+            yield row
+
+    def build(self):
+        """Roll the observed cells up into every dimension combination."""
+        for (label, day), cells in self._cells.items():
+            rollup = {}
+            for combo in self.combos:
+                agg = rollup[combo] = {}
+                for values, cost in cells.items():
+                    key = tuple([values[i] for i in combo])
+                    agg[key] = agg.get(key, 0.0) + cost
+            self.cube.setdefault(label, {})[day] = rollup
+        self._cells = {}
+        self.days = {label: sorted(days) for label, days in self.cube.items()}
+
+    def attribute(self, finding: dict, window: int, cal: Calendar = None) -> list:
+        """Contributor tree for one finding: tag values ranked by delta against baseline.
+
+        Each cell's baseline uses the finding's statistic: the previous day
+        for a day-over-day spike, the EWMA of all earlier days (at the
+        finding's alpha) for an EWMA deviation, the median of the same
+        weekday over the last `weeks` weeks for a seasonal deviation, the
+        median of the days within the preceding `window` calendar days for
+        a median/MAD deviation, and their mean otherwise. A series with
+        missing days therefore has fewer baseline days, never older ones.
+        """
+        series = self.cube.get(finding.get("resource"))
+        day = finding.get("date")
+        if not series or day not in series:
+            return []
+        cal = cal or Calendar()
+        days = self.days[finding["resource"]]
+        i = bisect_left(days, day)
+        today = cal.day(day)
+        ftype = finding["type"]
+        if ftype == "DAY_OVER_DAY_SPIKE":
+            prior = days[max(0, i - 1):i]
+        elif ftype == "EWMA_DEVIATION":
+            prior = days[:i]
+        elif ftype == "SEASONAL_DEVIATION":
+            earliest = today.ordinal - 7 * finding["weeks"]
+            prior = [d for d in days[:i] if cal.day(d).weekday == today.weekday and cal.day(d).ordinal >= earliest]
+        else:
+            earliest = today.ordinal - window
+            prior = [d for d in days[max(0, i - window):i] if cal.day(d).ordinal >= earliest]
+        if not prior:
+            return []
+
+        if ftype == "EWMA_DEVIATION":
+            alpha = finding["alpha"]
+
+            def reduce(values):
+                ewma = values[0]
+                for v in values[1:]:
+                    ewma = alpha * v + (1 - alpha) * ewma
+                return ewma
+        elif ftype in ("SEASONAL_DEVIATION", "ROLLING_MEDIAN_DEVIATION"):
+            reduce = median
+        else:
+            def reduce(values):
+                return sum(values) / len(values)
+
+        current = series[day]
+        baselines = {}
+
+        def cells(combo):
+            base = baselines.get(combo)
+            if base is None:
+                history = [series[d][combo] for d in prior]
+                keys = set().union(*history)
+                base = baselines[combo] = {key: reduce([h.get(key, 0.0) for h in history]) for key in keys}
+            return current[combo], base
+
+        now = current[self.combos[0]]
+        baseline = reduce([sum(series[d][self.combos[0]].values()) for d in prior])
+        return self._drill({}, sum(now.values()) - baseline, cells)
+
+    def _drill(self, assignment: dict, parent_delta: float, cells) -> list:
+        """Top contributors to `parent_delta` one dimension below `assignment`, recursively."""
+        if parent_delta <= 0 or len(assignment) >= self.depth:
+            return []
+        candidates = []
+        for dim in range(len(self.dimensions)):
+            if dim in assignment:
+                continue
+            combo = tuple(sorted([*assignment, dim]))
+            fixed = [(combo.index(d), v) for d, v in assignment.items()]
+            pos = combo.index(dim)
+            now, base = cells(combo)
+            for key in now.keys() | base.keys():
+                if any(key[j] != v for j, v in fixed):
+                    continue
+                cost, baseline = now.get(key, 0.0), base.get(key, 0.0)
+                delta = cost - baseline
+                if delta >= parent_delta * self.min_share:
+                    candidates.append((delta, dim, key[pos], cost, baseline))
+        candidates.sort(key=lambda c: c[0], reverse=True)
+
+        nodes = []
+        for delta, dim, value, cost, baseline in candidates[:self.top]:
+            child = dict(assignment)
+            child[dim] = value
+            node = {
+                "dimensions": {self.dimensions[d]: v for d, v in sorted(child.items())},
+                "cost": round(cost, 2),
+                "baseline": round(baseline, 2),
+                "delta": round(delta, 2),
+                "share_pct": round(delta / parent_delta * 100, 1)
+            }
+            children = self._drill(child, delta, cells)
+            if children:
+                node["contributors"] = children
+            nodes.append(node)
+        return nodes
+
+
+def print_drilldown(nodes: list, indent: str = "      "):
+    for node in nodes:
+        label = ", ".join(f"{k}={v}" for k, v in node["dimensions"].items())
+        print(f"{indent}↳ {label}: ${node['cost']:,.2f} vs ${node['baseline']:,.2f} "
+              f"(+${node['delta']:,.2f}, {node['share_pct']}%)")
+        print_drilldown(node.get("contributors", []), indent + "  ")
+
+
+# ─── Backtest ───
+
+BACKTEST_THRESHOLDS = [20, 30, 40, 50, 75, 100]
+BACKTEST_WINDOWS = [7, 14, 28]
+BACKTEST_DOD_THRESHOLDS = [30, 50, 75, 100]
+
+
+def load_incidents(path: str) -> dict:
+    """Series label → [(start, end)] labeled incident spans (ISO dates, inclusive).
+
+    Accepts {"incidents": [...]} or a bare list. Each incident names its
+    series by "series", "resource" or "subscription", and its span by
+    "date" or "start"/"end".
+    """
+    with open(path) as f:
+        data = json.load(f)
+    incidents = {}
+    for item in data.get("incidents", []) if isinstance(data, dict) else data:
+        label = item.get("series") or item.get("resource") or item.get("subscription")
+        start = item.get("start") or item["date"]
+        incidents.setdefault(label, []).append((start, item.get("end") or start))
+    return incidents
+
+
+def _ratio_counts(ratios: list, labels: list, incident_count: int, factors: list) -> list:
+    """Per threshold factor: (alerts, alerts inside an incident, incidents with an alert).
+
+    `ratios[i]` is a day's cost over its baseline and `labels[i]` the index
+    of the incident the day falls in (-1 if none). Ratios are sorted once,
+    so each threshold is a binary search instead of a detector rerun.
+    """
+    flagged = sorted(ratios)
+    inside = sorted(r for r, label in zip(ratios, labels) if label >= 0)
+    peaks = [0.0] * incident_count
+    for r, label in zip(ratios, labels):
+        if label >= 0 and r > peaks[label]:
+            peaks[label] = r
+    peaks.sort()
+    return [(len(flagged) - bisect_right(flagged, f), len(inside) - bisect_right(inside, f),
+             len(peaks) - bisect_right(peaks, f)) for f in factors]
+
+
+def _backtest_chunk(chunk: list, grid: dict) -> dict:
+    """Worker entry point: alert and incident counts per grid configuration for a batch of series.
+
+    Each series' prefix sums are computed once and give every window's
+    rolling mean in O(1); each window's ratios are shared by every threshold.
+    """
+    rolling_factors = [1 + t / 100 for t in grid["thresholds"]]
+    dod_factors = [1 + t / 100 for t in grid["dod_thresholds"]]
+    totals = {}
+
+    def add(config, counts):
+        acc = totals.setdefault(config, [0, 0, 0])
+        for k, v in enumerate(counts):
+            acc[k] += v
+
+    for label, days, spans in chunk:
+        dates = sorted(days)
+        costs = [days[d] for d in dates]
+        labels = [-1] * len(dates)
+        for k, (start, end) in enumerate(spans):
+            for i in range(bisect_left(dates, start), bisect_right(dates, end)):
+                labels[i] = k
+        prefix = [0.0]
+        for c in costs:
+            prefix.append(prefix[-1] + c)
+
+        for window in grid["windows"]:
+            ratios, in_incident = [], []
+            for i in range(window, len(costs)):
+                avg = (prefix[i] - prefix[i - window]) / window
+                if avg > 0:
+                    ratios.append(costs[i] / avg)
+                    in_incident.append(labels[i])
+            for t, counts in zip(grid["thresholds"], _ratio_counts(ratios, in_incident, len(spans), rolling_factors)):
+                add(("ROLLING_AVERAGE_DEVIATION", window, t), counts)
+
+        ratios, in_incident = [], []
+        for i in range(1, len(costs)):
+            if costs[i - 1] > 0:
+                ratios.append(costs[i] / costs[i - 1])
+                in_incident.append(labels[i])
+        for t, counts in zip(grid["dod_thresholds"], _ratio_counts(ratios, in_incident, len(spans), dod_factors)):
+            add(("DAY_OVER_DAY_SPIKE", None, t), counts)
+    return totals
+
+
+def run_backtest(series: dict, incidents: dict, grid: dict, workers: int = 1) -> list:
+    """Replay every series against the labeled incidents for each grid configuration.
+
+    Returns one row per (detector, window, threshold) with alert volume,
+    precision and recall, best F1 first.
+    """
+    items = [(label, days, incidents.get(label, [])) for label, (_, days) in series.items()]
+    total_incidents = sum(len(spans) for label, spans in incidents.items() if label in series)
+    all_days = set()
+    for _, days, _ in items:
+        all_days.update(days)
+
+    workers = max(1, min(workers, len(items)))
+    totals = {}
+    if workers == 1:
+        parts = [_backtest_chunk(items, grid)]
+        pool = None
+    else:
+        size = max(1, len(items) // (workers * 8))
+        batches = [items[i:i + size] for i in range(0, len(items), size)]
+        pool = ProcessPoolExecutor(max_workers=workers)
+        parts = pool.map(_backtest_chunk, batches, [grid] * len(batches))
+    try:
+        for part in parts:
+            for config, counts in part.items():
+                acc = totals.setdefault(config, [0, 0, 0])
+                for k, v in enumerate(counts):
+                    acc[k] += v
+    finally:
+        if pool:
+            pool.shutdown()
+
+    results = []
+    for (detector, window, threshold), (alerts, true_alerts, detected) in totals.items():
+        precision = true_alerts / alerts if alerts else 0.0
+        recall = detected / total_incidents if total_incidents else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        results.append({
+            "detector": detector,
+            "window_days": window,
+            "threshold_pct": threshold,
+            "alerts": alerts,
+            "alerts_per_day": round(alerts / len(all_days), 2) if all_days else 0.0,
+            "true_alerts": true_alerts,
+            "incidents_detected": detected,
+            "incidents": total_incidents,
+            "precision": round(precision, 3),
+            "recall": round(recall, 3),
+            "f1": round(f1, 3)
+        })
+    results.sort(key=lambda r: (-r["f1"], r["alerts"]))
+    return results
+
+
+def _grid(text: str, cast=float) -> list:
+    return sorted({cast(v) for v in text.split(",") if v.strip()})
+
+
+# ─── Online mode ───
+
+class SeriesState:
+    """Everything needed to judge a series' next day without its history.
+
+    An EWMA, a ring buffer of the last `window` days with their running
+    mean and variance, the last few values of each weekday, the running
+    weekday total, and the last-seen date. The sorted copy of the ring
+    buffer used for median/MAD is rebuilt on load rather than stored.
+    """
+
+    __slots__ = ("last_date", "created", "days", "ewma", "rolling", "ordered", "seasonal", "weekdays")
+
+    def __init__(self, window: int, weeks: int):
+        self.last_date = ""
+        self.created = ""
+        self.days = 0
+        self.ewma = 0.0
+        self.rolling = RollingWindow(window)
+        self.ordered = SortedWindow(window)
+        self.seasonal = [SortedWindow(weeks) for _ in range(7)]
+        self.weekdays = WeekdayBaseline()
+
+    @classmethod
+    def from_row(cls, window: int, weeks: int, row: tuple) -> "SeriesState":
+        state = cls(window, weeks)
+        (state.last_date, state.created, state.days, state.ewma, buffer, mean, m2,
+         weekday_sum, weekday_count, seasonal) = row
+        state.weekdays = WeekdayBaseline(weekday_sum, weekday_count)
+        state.rolling = RollingWindow.restore(window, array("d", buffer), mean, m2)
+        state.ordered = SortedWindow.from_values(window, state.rolling.values)
+        state.seasonal = [SortedWindow.from_values(weeks, values) for values in json.loads(seasonal)]
+        return state
+
+    def to_row(self) -> tuple:
+        return (self.last_date, self.created, self.days, self.ewma, array("d", self.rolling.values).tobytes(),
+                self.rolling.mean, self.rolling._m2, self.weekdays.total, self.weekdays.count,
+                json.dumps([list(w.fifo) for w in self.seasonal]))
+
+    def step(self, current: dict, opts: dict, cutoff: int) -> list:
+        """Judge one new day, then fold it into the state.
+
+        Returns [(scan index, finding)], indexed like `scan_names`. Each check
+        mirrors its batch detector, so a day gets the findings a batch scan of
+        the history up to that day would give it.
+        """
+        window = opts["window"]
+        cost = current["cost"]
+        cal = opts["calendar"]
+        day = cal.day(current["date"])
+        weekday = day.weekday
+        checks = []
+        if self.days >= window:
+            rolling, ordered = self.rolling, self.ordered
+            checks.append((0, _rolling_average_finding(current, rolling.mean, opts["rolling_threshold"], window)))
+            checks.append((1, _zscore_finding(current, rolling.mean, rolling.stddev(), opts["zscore_threshold"], window)))
+            checks.append((2, _ewma_finding(current, self.ewma, opts["rolling_threshold"], opts["ewma_alpha"])))
+            checks.append((3, _median_finding(current, ordered.median(), ordered.mad(), opts["mad_threshold"], window)))
+        baseline = self.seasonal[weekday]
+        if baseline.full():
+            checks.append((4, _seasonal_finding(current, weekday, baseline.median(), opts["rolling_threshold"],
+                                                opts["seasonal_weeks"])))
+        if self.days >= 1:
+            checks.append((5, _day_over_day_finding(current, self.rolling.values[-1], opts["dod_threshold"])))
+        checks.append((6, self.weekdays.step(current, day, WEEKEND_MULTIPLIER)))
+        checks.append((7, _new_resource_finding(current, cutoff, NEW_RESOURCE_DAILY, cal)))
+
+        alpha = opts["ewma_alpha"]
+        self.ewma = cost if self.days == 0 else alpha * cost + (1 - alpha) * self.ewma
+        self.rolling.push(cost)
+        self.ordered.push(cost)
+        baseline.push(cost)
+        self.days += 1
+        self.last_date = current["date"]
+        return [(i, finding) for i, finding in checks if finding]
+
+
+class SeriesStateStore:
+    """Per-series detector state persisted in SQLite between runs.
+
+    Each run ingests only the days after a series' last-seen date, so a
+    daily feed costs O(series) with no history re-read. The first run over
+    an empty store ingests whatever history it is given.
+
+    The state before each of a series' last `restatement_days` days is kept
+    as a checkpoint, with the findings those days raised. A revised or
+    late row within that horizon rewinds the series to the checkpoint and
+    replays only the days from there on, emitting retraction and update
+    events for findings that changed.
+    """
+
+    _STATE_COLUMNS = "last_date, created, days, ewma, buffer, mean, m2, weekday_sum, weekday_count, seasonal"
+    _LAYOUT_VERSION = 2
+
+    def __init__(self, path: str, opts: dict, series_by: list, restatement_days: int = RESTATEMENT_DAYS):
+        self.opts = opts
+        self.window = opts["window"]
+        self.weeks = opts["seasonal_weeks"]
+        self.restatement_days = max(1, restatement_days)
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS series (
+                label TEXT PRIMARY KEY, last_date TEXT NOT NULL, created TEXT NOT NULL,
+                days INTEGER NOT NULL, ewma REAL NOT NULL, buffer BLOB NOT NULL,
+                mean REAL NOT NULL, m2 REAL NOT NULL, weekday_sum REAL NOT NULL, weekday_count INTEGER NOT NULL,
+                seasonal TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                label TEXT NOT NULL, date TEXT NOT NULL, cost REAL NOT NULL,
+                last_date TEXT NOT NULL, created TEXT NOT NULL,
+                days INTEGER NOT NULL, ewma REAL NOT NULL, buffer BLOB NOT NULL,
+                mean REAL NOT NULL, m2 REAL NOT NULL, weekday_sum REAL NOT NULL, weekday_count INTEGER NOT NULL,
+                seasonal TEXT NOT NULL,
+                PRIMARY KEY (label, date)
+            );
+            CREATE TABLE IF NOT EXISTS findings (
+                label TEXT NOT NULL, date TEXT NOT NULL, type TEXT NOT NULL, body TEXT NOT NULL,
+                PRIMARY KEY (label, date, type)
+            );
+        """)
+        layout = json.dumps({"version": self._LAYOUT_VERSION, "window": self.window, "ewma_alpha": opts["ewma_alpha"],
+                             "seasonal_weeks": self.weeks, "series_by": series_by})
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'layout'").fetchone()
+        if row is None:
+            self.db.execute("INSERT INTO meta VALUES ('layout', ?)", (layout,))
+            self.db.commit()
+        elif row[0] != layout:
+            self.db.close()
+            raise ValueError(f"State {path} was built with a different layout, window, alpha, seasonal weeks or series key — "
+                             f"rebuild it from the cost history")
+
+    def close(self):
+        self.db.close()
+
+    def series_count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM series").fetchone()[0]
+
+    def load(self, label: str) -> SeriesState:
+        row = self.db.execute(f"SELECT {self._STATE_COLUMNS} FROM series WHERE label = ?", (label,)).fetchone()
+        return SeriesState.from_row(self.window, self.weeks, row) if row else SeriesState(self.window, self.weeks)
+
+    def _checkpoints(self, label: str) -> dict:
+        """date → (cost, state row before that day), oldest first."""
+        rows = self.db.execute(
+            f"SELECT date, cost, {self._STATE_COLUMNS} FROM checkpoints WHERE label = ? ORDER BY date", (label,)
+        )
+        return {row[0]: (row[1], row[2:]) for row in rows}
+
+    def _findings_since(self, label: str, since: str) -> dict:
+        rows = self.db.execute(
+            "SELECT date, type, body FROM findings WHERE label = ? AND date >= ?", (label, since)
+        )
+        return {(d, t): json.loads(body) for d, t, body in rows}
+
+    def ingest(self, series: dict) -> tuple:
+        """Fold days from `partition_series` output into the state.
+
+        New days are scanned as usual. Days already seen are compared with
+        their checkpoint: unchanged ones are skipped, revised or late ones
+        trigger a replay of that series from the earliest affected day.
+        Returns ([(scan name, findings)], [restatement events], stats).
+        """
+        cutoff = self.opts["calendar"].cutoff(NEW_RESOURCE_LOOKBACK_DAYS)
+        scans = [(name, []) for name in scan_names(self.opts)]
+        events = []
+        stats = defaultdict(int)
+        states, checkpoints, findings, rewinds = [], [], [], []
+
+        for label, (created, days) in series.items():
+            state = self.load(label)
+            recent = None
+            restated = set()
+            for day, cost in days.items():
+                if day > state.last_date:
+                    continue
+                if recent is None:
+                    recent = self._checkpoints(label)
+                if day in recent and recent[day][0] == cost:
+                    stats["unchanged"] += 1
+                elif not recent or day < next(iter(recent)):
+                    stats["beyond_horizon"] += 1
+                else:
+                    restated.add(day)
+
+            costs = {day: cost for day, cost in days.items() if day > state.last_date}
+            previous = {}
+            if restated:
+                stats["restated"] += len(restated)
+                anchor = min(d for d in recent if d >= min(restated))
+                state = SeriesState.from_row(self.window, self.weeks, recent[anchor][1])
+                costs.update({d: c for d, (c, _) in recent.items() if d >= anchor})
+                costs.update({d: days[d] for d in restated})
+                previous = self._findings_since(label, anchor)
+                rewinds.append((label, anchor))
+
+            if created and (not state.created or created < state.created):
+                state.created = created
+            replay = sorted(costs)
+            keep_from = len(replay) - self.restatement_days
+            for i, day in enumerate(replay):
+                row = {"date": day, "resource": label, "cost": costs[day]}
+                if state.created:
+                    row["created_date"] = state.created
+                if i >= keep_from:
+                    checkpoints.append((label, day, costs[day], *state.to_row()))
+                for scan, finding in state.step(row, self.opts, cutoff):
+                    old = previous.pop((day, finding["type"]), None)
+                    if old is None:
+                        scans[scan][1].append(finding)
+                    elif old != finding:
+                        events.append(_restatement_event("FINDING_UPDATED", old, finding))
+                    if i >= keep_from:
+                        findings.append((label, day, finding["type"], json.dumps(finding)))
+
+            for (day, ftype), old in previous.items():
+                if ftype == "NEW_RESOURCE_COST" and day not in restated:
+                    # Only the lookback cutoff moved, not the data — keep it
+                    findings.append((label, day, ftype, json.dumps(old)))
+                else:
+                    events.append(_restatement_event("FINDING_RETRACTED", old))
+            states.append((label, state))
+
+        with self.db:
+            self.db.executemany("DELETE FROM checkpoints WHERE label = ? AND date >= ?", rewinds)
+            self.db.executemany("DELETE FROM findings WHERE label = ? AND date >= ?", rewinds)
+            self.db.executemany(
+                "INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((label, *state.to_row()) for label, state in states)
+            )
+            self.db.executemany("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                checkpoints)
+            self.db.executemany("INSERT OR REPLACE INTO findings VALUES (?, ?, ?, ?)", findings)
+            self._prune()
+        return scans, events, dict(stats)
+
+    def _prune(self):
+        """Keep checkpoints (and their findings) for each series' last `restatement_days` days only."""
+        self.db.execute("""
+            DELETE FROM checkpoints WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, ROW_NUMBER() OVER (PARTITION BY label ORDER BY date DESC) AS n FROM checkpoints
+                ) WHERE n > ?
+            )
+        """, (self.restatement_days,))
+        self.db.execute("""
+            DELETE FROM findings
+            WHERE date < (SELECT MIN(date) FROM checkpoints c WHERE c.label = findings.label)
+        """)
+
+
+def _restatement_event(kind: str, previous: dict, current: dict = None) -> dict:
+    event = {
+        "type": kind,
+        "finding_type": previous["type"],
+        "date": previous["date"],
+        "resource": previous.get("resource", "Subscription"),
+        "previous": previous,
+        "severity": current["severity"] if current else "INFO"
+    }
+    if current:
+        event["current"] = current
+    return event
+
+
+def backtest_main(args, series: dict, series_by: list, data_points: int, grid: dict):
+    incidents = load_incidents(args.backtest)
+    results = run_backtest(series, incidents, grid, args.workers)
+    current = {("ROLLING_AVERAGE_DEVIATION", args.window, args.rolling_threshold),
+               ("DAY_OVER_DAY_SPIKE", None, args.dod_threshold)}
+
+    print(f"{'='*60}")
+    print(f"  ANOMALY THRESHOLD BACKTEST")
+    print(f"  Date: {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}")
+    print(f"  Data points: {data_points}")
+    print(f"  Series: {len(series)} (by {', '.join(series_by)}) | Labeled incidents: "
+          f"{results[0]['incidents'] if results else 0}")
+    print(f"  Configurations: {len(results)}")
+    print(f"{'='*60}")
+    print()
+
+    for detector in ("ROLLING_AVERAGE_DEVIATION", "DAY_OVER_DAY_SPIKE"):
+        print(f"  ─── {detector} ───")
+        print(f"  {'Window':>6}  {'Thresh':>6}  {'Alerts':>8}  {'Per day':>7}  {'Precision':>9}  {'Recall':>6}  {'F1':>5}")
+        for r in (r for r in results if r["detector"] == detector):
+            marker = " ◀ current" if (detector, r["window_days"], r["threshold_pct"]) in current else ""
+            window = r["window_days"] if r["window_days"] else "-"
+            print(f"  {window:>6}  {r['threshold_pct']:>5g}%  {r['alerts']:>8}  {r['alerts_per_day']:>7}  "
+                  f"{r['precision']:>9.3f}  {r['recall']:>6.3f}  {r['f1']:>5.3f}{marker}")
+        print()
+
+    print(f"{'='*60}")
+    if results:
+        best = results[0]
+        window = f"{best['window_days']}-day " if best["window_days"] else ""
+        print(f"  Best F1: {best['detector']} {window}{best['threshold_pct']:g}% "
+              f"(precision {best['precision']:.3f}, recall {best['recall']:.3f})")
+    print(f"  Tune on your own history, not on defaults.")
+    print(f"{'='*60}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"backtest": results, "grid": grid, "scan_date": datetime.now().strftime("%Y-%m-%d")}, f, indent=2)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Stella Maris Cost Anomaly Detection")
-    parser.add_argument("--costs", required=True, help="Path to daily cost data JSON")
-    parser.add_argument("--rolling-threshold", type=float, default=30.0, help="7-day rolling deviation %")
+    parser.add_argument("--costs", required=True, help="Path to daily cost data JSON or NDJSON")
+    parser.add_argument("--rolling-threshold", type=float, default=30.0, help="Rolling average deviation %")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW,
+                        help=f"Rolling window in days (typically {'/'.join(map(str, WINDOW_CHOICES))})")
+    parser.add_argument("--zscore-threshold", type=float, default=3.0, help="Rolling z-score threshold (std devs)")
     parser.add_argument("--dod-threshold", type=float, default=50.0, help="Day-over-day spike %")
+    parser.add_argument("--ewma-alpha", type=float, default=0.3, help="EWMA smoothing factor (0-1]")
+    parser.add_argument("--mad-threshold", type=float, default=3.5, help="Rolling median robust z-score threshold")
+    parser.add_argument("--seasonal-weeks", type=int, default=4, help="Same-weekday history for the seasonal baseline")
+    parser.add_argument("--series-by", default=",".join(DEFAULT_SERIES_BY),
+                        help="Comma-separated series key: resource, subscription, tag:<Key> (default: resource)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count)")
+    parser.add_argument("--state", default=None,
+                        help="Online mode: SQLite per-series state; only days after each series' last-seen date are scanned")
+    parser.add_argument("--restatement-days", type=int, default=RESTATEMENT_DAYS,
+                        help=f"Online mode: days per series that can still be revised (default: {RESTATEMENT_DAYS})")
+    parser.add_argument("--drilldown", action="store_true",
+                        help="Attribute each deviation to the tag values that drove it (needs a non-resource --series-by)")
+    parser.add_argument("--drilldown-depth", type=int, default=DRILLDOWN_DEPTH,
+                        help=f"Tag dimensions to combine when drilling down (default: {DRILLDOWN_DEPTH})")
+    parser.add_argument("--tag-alerts", default=TAG_ALERTS_CONFIG, help="Tag-category alert rules naming the drilldown dimensions")
+    parser.add_argument("--backtest", default=None, metavar="INCIDENTS",
+                        help="Backtest mode: sweep threshold/window grids against a labeled incident file")
+    parser.add_argument("--threshold-grid", default=",".join(map(str, BACKTEST_THRESHOLDS)),
+                        help="Backtest: rolling average thresholds %% to sweep")
+    parser.add_argument("--window-grid", default=",".join(map(str, BACKTEST_WINDOWS)),
+                        help="Backtest: rolling windows (days) to sweep")
+    parser.add_argument("--dod-grid", default=",".join(map(str, BACKTEST_DOD_THRESHOLDS)),
+                        help="Backtest: day-over-day thresholds %% to sweep")
     parser.add_argument("--output", default=None, help="Output findings JSON")
+    add_calendar_args(parser, holidays=True)
     args = parser.parse_args()
+    if args.window < 2:
+        parser.error("--window must be at least 2 days")
+    if not 0 < args.ewma_alpha <= 1:
+        parser.error("--ewma-alpha must be in (0, 1]")
+    if args.seasonal_weeks < 1:
+        parser.error("--seasonal-weeks must be at least 1")
+    series_by = [f.strip() for f in args.series_by.split(",") if f.strip()]
+    if args.drilldown and "resource" in series_by:
+        parser.error("--drilldown attributes aggregate series; use e.g. --series-by subscription")
+    if args.drilldown and args.state:
+        parser.error("--drilldown needs the cost history in --costs and cannot be combined with --state")
+    if args.backtest and (args.state or args.drilldown):
+        parser.error("--backtest replays the cost history in --costs and cannot be combined with --state or --drilldown")
+    if args.backtest:
+        try:
+            grid = {"thresholds": _grid(args.threshold_grid), "windows": _grid(args.window_grid, int),
+                    "dod_thresholds": _grid(args.dod_grid)}
+        except ValueError:
+            parser.error("grids are comma-separated numbers, e.g. --threshold-grid 20,30,50")
+        if not grid["windows"] or min(grid["windows"]) < 2:
+            parser.error("--window-grid windows must be at least 2 days")
 
-    with open(args.costs) as f:
-        data = json.load(f)
-    daily_costs = data.get("daily_costs", [])
+    rows = CountingIterator(iter_resources(args.costs, key="daily_costs"))
+    cube = None
+    if args.drilldown:
+        cube = DrilldownCube(drilldown_dimensions(args.tag_alerts), series_by, max(1, args.drilldown_depth))
+        series = partition_series(cube.observe(rows), series_by)
+    else:
+        series = partition_series(rows, series_by)
+    opts = {
+        "window": args.window,
+        "rolling_threshold": args.rolling_threshold,
+        "zscore_threshold": args.zscore_threshold,
+        "dod_threshold": args.dod_threshold,
+        "ewma_alpha": args.ewma_alpha,
+        "mad_threshold": args.mad_threshold,
+        "seasonal_weeks": args.seasonal_weeks,
+        "calendar": calendar_from_args(args)
+    }
+
+    if args.backtest:
+        backtest_main(args, series, series_by, rows.count, grid)
+        return
 
     print(f"{'='*60}")
     print(f"  COST ANOMALY DETECTION")
     print(f"  Date: {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}")
-    print(f"  Data points: {len(daily_costs)}")
-    print(f"  Thresholds: rolling={args.rolling_threshold}%, DoD={args.dod_threshold}%")
+    if args.as_of:
+        print(f"  As of: {args.as_of}")
+    print(f"  Data points: {rows.count}")
+    print(f"  Series: {len(series)} (by {', '.join(series_by)})")
+    print(f"  Thresholds: rolling={args.rolling_threshold}% ({args.window}-day), "
+          f"z={args.zscore_threshold}, DoD={args.dod_threshold}%")
     print(f"{'='*60}")
     print()
 
     all_findings = []
 
-    scans = [
-        ("7-Day Rolling Average", detect_rolling_average(daily_costs, args.rolling_threshold)),
-        ("Day-over-Day Spike", detect_day_over_day(daily_costs, args.dod_threshold)),
-        ("Weekend Anomaly", detect_weekend(daily_costs)),
-        ("New Resource Cost", detect_new_resource(daily_costs))
-    ]
+    events = []
+    if args.state:
+        try:
+            store = SeriesStateStore(args.state, opts, series_by, args.restatement_days)
+        except ValueError as e:
+            print(f"  {e}")
+            sys.exit(1)
+        try:
+            scans, events, stats = store.ingest(series)
+            print(f"  State: {args.state} ({store.series_count()} series tracked)")
+        finally:
+            store.close()
+        if stats.get("unchanged"):
+            print(f"  Skipped {stats['unchanged']} already-ingested series-days")
+        if stats.get("restated"):
+            print(f"  Restated {stats['restated']} series-days — affected windows replayed")
+        if stats.get("beyond_horizon"):
+            print(f"  ⚠️  Ignored {stats['beyond_horizon']} series-days older than the "
+                  f"{args.restatement_days}-day restatement horizon")
+        print()
+    else:
+        scans = run_engine(series, opts, args.workers)
+
+    if cube:
+        cube.build()
+        attributed = 0
+        for _, findings in scans:
+            for f_item in findings:
+                if f_item["type"] in DRILLDOWN_TYPES:
+                    f_item["drilldown"] = cube.attribute(f_item, args.window, opts["calendar"])
+                    attributed += 1
+        print(f"  Drilldown: {attributed} deviations attributed across {', '.join(cube.dimensions)}")
+        print()
 
     for scan_name, findings in scans:
         print(f"  ─── {scan_name} ───")
         if findings:
-            for f_item in findings:
+            for f_item in findings[:PRINT_LIMIT]:
                 icon = "🔴" if f_item["severity"] == "HIGH" else "🟡"
                 print(f"  {icon} [{f_item['type']}] {f_item.get('resource', 'N/A')} — {f_item['date']}")
                 for k, v in f_item.items():
-                    if k not in ("type", "severity", "resource", "date"):
+                    if k not in ("type", "severity", "resource", "date", "drilldown"):
                         print(f"      {k}: {v}")
+                print_drilldown(f_item.get("drilldown", []))
+            if len(findings) > PRINT_LIMIT:
+                print(f"  ... and {len(findings) - PRINT_LIMIT} more")
             all_findings.extend(findings)
         else:
             print(f"  ✓ No anomalies detected")
         print()
 
+    if events:
+        print(f"  ─── Restated Findings ───")
+        for event in events[:PRINT_LIMIT]:
+            icon = "↩️ " if event["type"] == "FINDING_RETRACTED" else "🔁"
+            print(f"  {icon} [{event['type']}] {event['finding_type']} {event['resource']} — {event['date']}")
+        if len(events) > PRINT_LIMIT:
+            print(f"  ... and {len(events) - PRINT_LIMIT} more")
+        print()
+
     print(f"{'='*60}")
     print(f"  Total findings: {len(all_findings)}")
+    if events:
+        print(f"  Restatement events: {len(events)}")
     print(f"  The invoice is an autopsy. This is the vital sign monitor.")
     print(f"{'='*60}")
 
     if args.output:
         with open(args.output, 'w') as f:
-            json.dump({"findings": all_findings, "scan_date": str(date.today())}, f, indent=2)
+            report = {"findings": all_findings, "scan_date": str(opts["calendar"].as_of)}
+            if args.state:
+                report["events"] = events
+            json.dump(report, f, indent=2)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Budget Forecast — Stella Maris Governance
+Projects month-end spend for every budget scope in budget-alerts.json from
+daily costs and evaluates the budget thresholds and the forecast alert in
+the same pass. Three models: run-rate, weekday-adjusted and linear trend.
+Each model is a fixed weighting of a scope's recent daily costs, so the
+weights are built once per run and every scope costs three dot products.
+"""
+
+import os
+import sys
+import json
+import time
+import operator
+import argparse
+import calendar
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from inventory import iter_resources, CountingIterator  # noqa: E402
+from calendar_table import add_calendar_args  # noqa: E402
+
+
+BUDGET_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "budget-alerts.json")
+MODELS = ["run_rate", "weekday", "trend"]
+DEFAULT_MODEL = "weekday"
+LOOKBACK_DAYS = 28
+FORECAST_MIN_DAYS = 10  # Forecasts before day 10 of the month rest on little data
+PRINT_LIMIT = 25
+
+
+def load_budgets(path: str = BUDGET_CONFIG) -> dict:
+    """Budget scope → budget definition."""
+    with open(path) as f:
+        config = json.load(f)
+    return {b["subscription"]: b for b in config.get("budgets", [])}
+
+
+def _scope_value(row: dict, scope_by: str) -> str:
+    if scope_by.startswith("tag:"):
+        return (row.get("tags") or {}).get(scope_by[4:]) or ""
+    return row.get(scope_by) or ""
+
+
+def model_weights(as_of: date, lookback: int) -> tuple:
+    """(first day of the cost window, {model: weights over the window's days}).
+
+    The window runs from the earlier of the month start and the lookback
+    start to the as-of day. A model's projected remaining-month spend is
+    the dot product of its weights with a scope's daily costs:
+      run_rate  month-to-date daily average × remaining days
+      weekday   per-weekday average over the lookback × remaining days of each weekday
+      trend     least-squares line over the lookback, summed over the remaining days
+    """
+    month_start = as_of.replace(day=1)
+    month_days = calendar.monthrange(as_of.year, as_of.month)[1]
+    remaining = month_days - as_of.day
+    lookback_start = as_of - timedelta(days=lookback - 1)
+    start = min(month_start, lookback_start)
+    width = (as_of - start).days + 1
+    offset = (lookback_start - start).days
+
+    run_rate = [0.0] * width
+    elapsed = as_of.day
+    for j in range((month_start - start).days, width):
+        run_rate[j] = remaining / elapsed
+
+    rest = [as_of + timedelta(days=k) for k in range(1, remaining + 1)]
+    remaining_by_weekday = [0] * 7
+    for d in rest:
+        remaining_by_weekday[d.weekday()] += 1
+    window_by_weekday = [0] * 7
+    for j in range(lookback):
+        window_by_weekday[(lookback_start + timedelta(days=j)).weekday()] += 1
+    weekday = [0.0] * width
+    for j in range(lookback):
+        w = (lookback_start + timedelta(days=j)).weekday()
+        weekday[offset + j] = remaining_by_weekday[w] / window_by_weekday[w]
+
+    # OLS over x = 0..L-1: forecast = Σ_k (a + b·x_k) for x_k = L-1+k, linear in the y values
+    trend = [0.0] * width
+    x_mean = (lookback - 1) / 2
+    sxx = sum((x - x_mean) ** 2 for x in range(lookback))
+    future_x = sum(lookback - 1 + k for k in range(1, remaining + 1))
+    slope_weight = (future_x - remaining * x_mean) / sxx if sxx else 0.0
+    for j in range(lookback):
+        trend[offset + j] = remaining / lookback + slope_weight * (j - x_mean)
+
+    return start, {"run_rate": run_rate, "weekday": weekday, "trend": trend}
+
+
+def cost_matrix(rows, scopes: dict, start: date, as_of: date, scope_by: str = "subscription") -> tuple:
+    """One pass over cost rows into a scopes × days matrix (dense daily costs per budget scope).
+
+    Returns (matrix aligned with `scopes`, rows outside the window or scopes).
+    """
+    index = {scope: i for i, scope in enumerate(scopes)}
+    width = (as_of - start).days + 1
+    columns = {str(start + timedelta(days=j)): j for j in range(width)}
+    matrix = [[0.0] * width for _ in scopes]
+    skipped = 0
+    for row in rows:
+        i = index.get(_scope_value(row, scope_by))
+        j = columns.get(row["date"])
+        if i is None or j is None:
+            skipped += 1
+            continue
+        matrix[i][j] += row["cost"]
+    return matrix, skipped
+
+
+def forecast_budgets(budgets: dict, matrix: list, start: date, as_of: date, weights: dict,
+                     model: str = DEFAULT_MODEL) -> list:
+    """Project month-end spend for every scope and evaluate its thresholds in the same pass."""
+    month_from = (as_of.replace(day=1) - start).days
+    confidence = "low" if as_of.day < FORECAST_MIN_DAYS else "normal"
+    mul = operator.mul
+    model_weights_list = [(m, weights[m]) for m in MODELS]
+    results = []
+    for (scope, budget), daily in zip(budgets.items(), matrix):
+        mtd = sum(daily[month_from:])
+        forecasts = {m: round(mtd + max(0.0, sum(map(mul, w, daily))), 2) for m, w in model_weights_list}
+        amount = budget["monthly_budget"]
+        actual_pct = mtd / amount * 100 if amount else 0.0
+        forecast_pct = forecasts[model] / amount * 100 if amount else 0.0
+
+        crossed = [t for t in budget.get("thresholds", []) if actual_pct >= t["percent"]]
+        alerts = []
+        if crossed:
+            top = max(crossed, key=lambda t: t["percent"])
+            alerts.append({"kind": "actual", "percent": top["percent"], "severity": top["severity"],
+                           "recipients": top.get("recipients", [])})
+        forecast_alert = budget.get("forecast_alert")
+        if forecast_alert and forecast_pct >= forecast_alert["percent"]:
+            alerts.append({"kind": "forecast", "percent": forecast_alert["percent"],
+                           "severity": forecast_alert["severity"], "recipients": forecast_alert.get("recipients", [])})
+
+        results.append({
+            "scope": scope,
+            "monthly_budget": amount,
+            "currency": budget.get("currency", "USD"),
+            "month_to_date": round(mtd, 2),
+            "actual_pct": round(actual_pct, 1),
+            "forecasts": forecasts,
+            "model": model,
+            "forecast_pct": round(forecast_pct, 1),
+            "confidence": confidence,
+            "alerts": alerts
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stella Maris Budget Forecast")
+    parser.add_argument("--costs", required=True, help="Daily cost data JSON or NDJSON")
+    parser.add_argument("--budgets", default=BUDGET_CONFIG, help="Budget definitions JSON")
+    parser.add_argument("--scope-by", default="subscription",
+                        help="Row field matching budget scopes: subscription or tag:<Key> (default: subscription)")
+    parser.add_argument("--model", choices=MODELS, default=DEFAULT_MODEL,
+                        help=f"Model the forecast alert is judged on (default: {DEFAULT_MODEL})")
+    parser.add_argument("--lookback", type=int, default=LOOKBACK_DAYS,
+                        help=f"Days of history for the weekday and trend models (default: {LOOKBACK_DAYS})")
+    parser.add_argument("--output", default=None, help="Output forecast JSON")
+    add_calendar_args(parser)
+    args = parser.parse_args()
+    if args.lookback < 7:
+        parser.error("--lookback must be at least 7 days (one of each weekday)")
+
+    budgets = load_budgets(args.budgets)
+    as_of = args.as_of
+    if as_of is None:
+        # Cost data lags the wall clock, so default to the latest day in the data (one extra streaming pass)
+        latest = max((r["date"] for r in iter_resources(args.costs, key="daily_costs", normalize=False)), default=None)
+        as_of = date.fromisoformat(latest) if latest else date.today()
+    rows = CountingIterator(iter_resources(args.costs, key="daily_costs"))
+
+    start, weights = model_weights(as_of, args.lookback)
+    matrix, skipped = cost_matrix(rows, budgets, start, as_of, args.scope_by)
+    started = time.perf_counter()
+    results = forecast_budgets(budgets, matrix, start, as_of, weights, args.model)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    month_days = calendar.monthrange(as_of.year, as_of.month)[1]
+
+    print(f"{'='*60}")
+    print(f"  BUDGET FORECAST")
+    print(f"  Date: {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}")
+    print(f"  As of: {as_of} (day {as_of.day} of {month_days})")
+    print(f"  Data points: {rows.count} ({skipped} outside budget scopes or window)")
+    print(f"  Budget scopes: {len(results)} | Alert model: {args.model} | Forecast time: {elapsed_ms:.0f} ms")
+    print(f"{'='*60}")
+    print()
+
+    if as_of.day < FORECAST_MIN_DAYS:
+        print(f"  ⚠️  Day {as_of.day} of the month — forecasts are low-confidence until day {FORECAST_MIN_DAYS}")
+        print()
+
+    alerting = [r for r in results if r["alerts"]]
+    for r in sorted(results, key=lambda r: r["forecast_pct"], reverse=True)[:PRINT_LIMIT]:
+        icon = "🔴" if any(a["kind"] == "forecast" for a in r["alerts"]) else ("🟡" if r["alerts"] else "✅")
+        print(f"  {icon} {r['scope']}: ${r['month_to_date']:,.2f} of ${r['monthly_budget']:,.2f} ({r['actual_pct']}%)")
+        print(f"      Forecast: " + " | ".join(f"{m} ${v:,.2f}" for m, v in r["forecasts"].items()) +
+              f" → {r['forecast_pct']}% of budget")
+        for a in r["alerts"]:
+            label = "Forecast" if a["kind"] == "forecast" else "Threshold"
+            print(f"      {label} {a['percent']}% [{a['severity']}] → {', '.join(a['recipients'])}")
+    if len(results) > PRINT_LIMIT:
+        print(f"  ... and {len(results) - PRINT_LIMIT} more")
+    print()
+
+    print(f"{'='*60}")
+    print(f"  Scopes alerting: {len(alerting)} | "
+          f"Forecast alerts: {sum(1 for r in alerting if any(a['kind'] == 'forecast' for a in r['alerts']))}")
+    print(f"  The forecast is the alert you get before the invoice.")
+    print(f"{'='*60}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"forecasts": results, "as_of": str(as_of), "scan_date": datetime.now().strftime("%Y-%m-%d")},
+                      f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,42 @@
 """
 Resource-Level Spike Scanner — Stella Maris Governance
 Identifies individual resources with abnormal daily cost increases.
+With --top K, streams the inventory and keeps only the top-K spikes,
+overall and per Owner/Environment, in bounded memory.
 """
 
+import os
+import sys
 import json
+import heapq
 import argparse
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from inventory import iter_resources, CountingIterator  # noqa: E402
+from hierarchy import with_effective_tags  # noqa: E402
+from tagkeys import canonical_key  # noqa: E402
 
-def scan_spikes(resources: list, multiplier: float = 2.0) -> list:
+
+DEFAULT_GROUP_TAGS = ["Owner", "Environment"]
+GROUPS_SHOWN = 10
+
+
+def _spike_finding(r: dict, avg: float, today: float) -> dict:
+    tags = r.get("tags", {})
+    return {
+        "resource": r["name"],
+        "resource_id": r.get("id", ""),
+        "today_cost": round(today, 2),
+        "seven_day_avg": round(avg, 2),
+        "multiplier": round(today / avg, 1),
+        "owner": tags.get("Owner", "UNTAGGED"),
+        "environment": tags.get("Environment", "UNTAGGED"),
+        "severity": "HIGH" if today > avg * 3 else "WARNING"
+    }
+
+
+def scan_spikes(resources, multiplier: float = 2.0) -> list:
     """Find resources where today's cost exceeds multiplier × 7-day average."""
     findings = []
     for r in resources:
@@ -17,53 +45,190 @@ def scan_spikes(resources: list, multiplier: float = 2.0) -> list:
         today = r.get("today_cost", 0)
 
         if avg > 0 and today > avg * multiplier:
-            findings.append({
-                "resource": r["name"],
-                "resource_id": r.get("id", ""),
-                "today_cost": round(today, 2),
-                "seven_day_avg": round(avg, 2),
-                "multiplier": round(today / avg, 1),
-                "owner": r.get("tags", {}).get("Owner", "UNTAGGED"),
-                "environment": r.get("tags", {}).get("Environment", "UNTAGGED"),
-                "severity": "HIGH" if today > avg * 3 else "WARNING"
-            })
+            findings.append(_spike_finding(r, avg, today))
     return sorted(findings, key=lambda x: x["today_cost"], reverse=True)
 
 
+class TopK:
+    """The K largest items seen, by key, in a size-K min-heap.
+
+    Ties rank the earlier item first, matching a stable descending sort.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self._heap = []
+
+    def admits(self, key) -> bool:
+        return len(self._heap) < self.k or key > self._heap[0][0][0]
+
+    def push(self, key, seq: int, item):
+        entry = ((key, -seq), item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[0] > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def items(self) -> list:
+        return [item for _, item in sorted(self._heap, key=lambda e: e[0], reverse=True)]
+
+
+class _GroupStats:
+    __slots__ = ("spikes", "high", "today_cost", "excess_cost", "top")
+
+    def __init__(self, k: int):
+        self.spikes = 0
+        self.high = 0
+        self.today_cost = 0.0
+        self.excess_cost = 0.0
+        self.top = TopK(k)
+
+    def add(self, today: float, avg: float, high: bool):
+        self.spikes += 1
+        self.high += high
+        self.today_cost += today
+        self.excess_cost += today - avg
+
+    def summary(self) -> dict:
+        return {
+            "spikes": self.spikes,
+            "high": self.high,
+            "today_cost": round(self.today_cost, 2),
+            "excess_cost": round(self.excess_cost, 2),
+            "top": self.top.items()
+        }
+
+
+def scan_spikes_top(resources, multiplier: float = 2.0, k: int = 25, group_tags: list = None) -> dict:
+    """Streaming spike scan that keeps only the top-K spikes, overall and per tag value.
+
+    Counts and cost totals accumulate as resources stream past; a finding
+    is only built for a spike that enters some top-K heap. Memory is
+    O(K × groups) regardless of inventory size.
+    """
+    group_tags = DEFAULT_GROUP_TAGS if group_tags is None else group_tags
+    overall = _GroupStats(k)
+    groups = {tag: {} for tag in group_tags}
+    scanned = 0
+
+    for r in resources:
+        scanned += 1
+        avg = r.get("seven_day_avg", 0)
+        today = r.get("today_cost", 0)
+        if not (avg > 0 and today > avg * multiplier):
+            continue
+
+        high = today > avg * 3
+        key = round(today, 2)
+        tags = r.get("tags", {})
+        overall.add(today, avg, high)
+        heaps = [overall.top] if overall.top.admits(key) else []
+        for tag, by_value in groups.items():
+            value = tags.get(tag) or "UNTAGGED"
+            stats = by_value.get(value)
+            if stats is None:
+                stats = by_value[value] = _GroupStats(k)
+            stats.add(today, avg, high)
+            if stats.top.admits(key):
+                heaps.append(stats.top)
+        if heaps:
+            finding = _spike_finding(r, avg, today)
+            for heap in heaps:
+                heap.push(key, scanned, finding)
+
+    result = overall.summary()
+    result["resources_scanned"] = scanned
+    result["groups"] = {
+        tag: dict(sorted(((value, stats.summary()) for value, stats in by_value.items()),
+                         key=lambda kv: kv[1]["today_cost"], reverse=True))
+        for tag, by_value in groups.items()
+    }
+    return result
+
+
+def _print_spike(f_item: dict, indent: str = "  "):
+    icon = "🔴" if f_item["severity"] == "HIGH" else "🟡"
+    print(f"{indent}{icon} {f_item['resource']} [{f_item['owner']}]")
+    print(f"{indent}    Today: ${f_item['today_cost']} | 7-day avg: ${f_item['seven_day_avg']} | {f_item['multiplier']}×")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Stella Maris Resource Spike Scanner")
-    parser.add_argument("--resources", required=True, help="Resource cost data JSON")
+    parser.add_argument("--resources", required=True, help="Resource cost data JSON or NDJSON")
     parser.add_argument("--multiplier", type=float, default=2.0, help="Spike threshold multiplier")
+    parser.add_argument("--top", type=int, default=None, metavar="K",
+                        help="Streaming mode: keep only the top K spikes overall and per group tag value")
+    parser.add_argument("--group-by", nargs="*", default=DEFAULT_GROUP_TAGS, metavar="TAG",
+                        help="Tags to rank spikes within in --top mode (default: Owner Environment)")
+    parser.add_argument("--effective-tags", nargs="?", const="", default=None, metavar="CONTAINERS",
+                        help="Apply tag inheritance first; parents from a CONTAINERS export or the inventory itself")
+    parser.add_argument("--output", default=None, help="Output findings JSON")
     args = parser.parse_args()
+    if args.top is not None and args.top < 1:
+        parser.error("--top must be at least 1")
 
-    with open(args.resources) as f:
-        data = json.load(f)
-    resources = data.get("resources", [])
+    if args.effective_tags is None:
+        resources = CountingIterator(iter_resources(args.resources))
+    else:
+        resources = CountingIterator(with_effective_tags(args.resources, args.effective_tags or None))
 
-    findings = scan_spikes(resources, args.multiplier)
+    if args.top is not None:
+        group_tags = [canonical_key(tag) for tag in args.group_by]
+        result = scan_spikes_top(resources, args.multiplier, args.top, group_tags)
+        findings = result["top"]
+    else:
+        findings = scan_spikes(resources, args.multiplier)
 
     print(f"{'='*60}")
     print(f"  RESOURCE SPIKE SCAN")
     print(f"  Date: {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}")
-    print(f"  Resources scanned: {len(resources)}")
+    print(f"  Resources scanned: {resources.count}")
     print(f"  Threshold: {args.multiplier}× 7-day average")
     print(f"{'='*60}")
     print()
 
-    if findings:
+    if args.top is not None and result["spikes"]:
+        print(f"  ─── Top {len(findings)} of {result['spikes']} spikes ───")
+        for f_item in findings:
+            _print_spike(f_item)
+            print()
+        for tag, by_value in result["groups"].items():
+            print(f"  ─── By {tag} ({len(by_value)} values) ───")
+            for value, stats in list(by_value.items())[:GROUPS_SHOWN]:
+                print(f"  {value}: {stats['spikes']} spikes ({stats['high']} high) | "
+                      f"today ${stats['today_cost']:,.2f} | excess ${stats['excess_cost']:,.2f}")
+                _print_spike(stats["top"][0], indent="    ")
+            if len(by_value) > GROUPS_SHOWN:
+                print(f"  ... and {len(by_value) - GROUPS_SHOWN} more")
+            print()
+    elif findings:
         for f_item in findings:
-            icon = "🔴" if f_item["severity"] == "HIGH" else "🟡"
-            print(f"  {icon} {f_item['resource']} [{f_item['owner']}]")
-            print(f"      Today: ${f_item['today_cost']} | 7-day avg: ${f_item['seven_day_avg']} | {f_item['multiplier']}×")
+            _print_spike(f_item)
             print()
     else:
         print(f"  ✓ No resource spikes detected")
         print()
 
     print(f"{'='*60}")
-    print(f"  Spikes found: {len(findings)}")
+    if args.top is not None:
+        print(f"  Spikes found: {result['spikes']} ({result['high']} high) | "
+              f"today ${result['today_cost']:,.2f} | excess ${result['excess_cost']:,.2f}")
+    else:
+        print(f"  Spikes found: {len(findings)}")
     print(f"{'='*60}")
 
+    if args.output:
+        if args.top is not None:
+            # Same findings schema as a full scan, so alert-dedup.py reads either. It does not resolve
+            # spike incidents from a truncated report: a spike outside the top K has not ended.
+            report = {"findings": findings, "truncated": result["spikes"] > len(findings)}
+            report.update((k, v) for k, v in result.items() if k != "top")
+        else:
+            report = {"findings": findings}
+        report["scan_date"] = datetime.now().strftime("%Y-%m-%d")
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
 
 if __name__ == "__main__":
     main()
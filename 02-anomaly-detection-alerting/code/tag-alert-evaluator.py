@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Tag-Category Alert Evaluator — Stella Maris Governance
+Evaluates the conditions in tag-category-alerts.json against daily cost
+data. Each condition is compiled once into column operations over
+per-tag-value aggregates (daily, weekly, month-to-date, 3-month average),
+and the aggregates and shared subexpressions are computed once per tag
+dimension, so every rule on a dimension evaluates in one batch.
+"""
+
+import os
+import re
+import sys
+import ast
+import json
+import operator
+import argparse
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from inventory import iter_resources, CountingIterator  # noqa: E402
+from tagkeys import canonical_key  # noqa: E402
+from calendar_table import Calendar, add_calendar_args, calendar_from_args  # noqa: E402
+
+
+TAG_ALERTS_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tag-category-alerts.json")
+PRINT_LIMIT = 25
+
+# Per-tag-value aggregates a condition may reference. `<value>_<metric>`
+# (e.g. `production_monthly`) references one tag value's aggregate as a scalar.
+METRICS = {
+    "daily_cost": "Cost on the as-of day",
+    "weekly_cost": "Cost over the 7 days ending on the as-of day",
+    "prior_week_cost": "Cost over the 7 days before that",
+    "week_over_week_change": "Percent change of weekly_cost over prior_week_cost",
+    "monthly_actual": "Month-to-date cost in the as-of month",
+    "monthly": "Alias of monthly_actual",
+    "three_month_avg": "Mean monthly cost over the up to three months before the as-of month that have data",
+    "allocated_budget": "Monthly budget allocated to the tag value (--allocations)"
+}
+_SUFFIXES = sorted(METRICS, key=len, reverse=True)
+_PERCENT = re.compile(r"(\d+(?:\.\d+)?)\s*%")
+
+
+def _nullable(op):
+    return lambda x, y: None if x is None or y is None else op(x, y)
+
+
+def _divide(x, y):
+    return None if x is None or not y else x / y
+
+
+def _compare(op):
+    return lambda x, y: x is not None and y is not None and op(x, y)
+
+
+_BINARY = {
+    ast.Add: _nullable(operator.add), ast.Sub: _nullable(operator.sub),
+    ast.Mult: _nullable(operator.mul), ast.Div: _divide
+}
+_COMPARE = {
+    ast.Gt: _compare(operator.gt), ast.GtE: _compare(operator.ge), ast.Lt: _compare(operator.lt),
+    ast.LtE: _compare(operator.le), ast.Eq: _compare(operator.eq), ast.NotEq: _compare(operator.ne)
+}
+
+
+def _broadcast(op, a, b):
+    """Apply a binary op elementwise; a scalar operand is broadcast against a column."""
+    if isinstance(a, list):
+        if isinstance(b, list):
+            return [op(x, y) for x, y in zip(a, b)]
+        return [op(x, b) for x in a]
+    if isinstance(b, list):
+        return [op(a, y) for y in b]
+    return op(a, b)
+
+
+def resolve_name(name: str) -> tuple:
+    """(tag value or None, metric) for a condition variable. Raises ValueError if unknown."""
+    if name in METRICS:
+        return None, name
+    for metric in _SUFFIXES:
+        if name.endswith("_" + metric) and len(name) > len(metric) + 1:
+            return name[:-len(metric) - 1], metric
+    raise ValueError(f"Unknown variable '{name}' (expected one of {', '.join(METRICS)} or <value>_<metric>)")
+
+
+class Condition:
+    """A tag-category alert condition compiled to column operations.
+
+    Conditions are arithmetic and comparisons over aggregate names and
+    numbers; `N%` is read as N, in the percent units of
+    week_over_week_change. Missing aggregates and division by zero yield
+    null, and a comparison with null is false.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        try:
+            tree = ast.parse(_PERCENT.sub(r"(\1)", text.strip()), mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"Invalid condition '{text}': {e.msg}") from None
+        self.names = []
+        self._eval = self._compile(tree.body)
+
+    def _compile(self, node):
+        key = ast.dump(node)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            value = float(node.value)
+            return lambda env, memo: value
+        if isinstance(node, ast.Name):
+            resolve_name(node.id)
+            if node.id not in self.names:
+                self.names.append(node.id)
+            name = node.id
+            return lambda env, memo: env(name)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            operand = self._compile(node.operand)
+            sign = -1.0 if isinstance(node.op, ast.USub) else 1.0
+            return self._shared(key, lambda env, memo: _broadcast(_BINARY[ast.Mult], operand(env, memo), sign))
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+            op, left, right = _BINARY[type(node.op)], self._compile(node.left), self._compile(node.right)
+            return self._shared(key, lambda env, memo: _broadcast(op, left(env, memo), right(env, memo)))
+        if isinstance(node, ast.Compare):
+            operands = [self._compile(n) for n in [node.left] + node.comparators]
+            ops = [_COMPARE[type(o)] for o in node.ops if type(o) in _COMPARE]
+            if len(ops) != len(node.ops):
+                raise ValueError(f"Unsupported comparison in condition '{self.text}'")
+
+            def compare(env, memo):
+                values = [f(env, memo) for f in operands]
+                result = _broadcast(ops[0], values[0], values[1])
+                for op, a, b in zip(ops[1:], values[1:], values[2:]):
+                    result = _broadcast(operator.and_, result, _broadcast(op, a, b))
+                return result
+            return self._shared(key, compare)
+        if isinstance(node, ast.BoolOp):
+            parts = [self._compile(n) for n in node.values]
+            combine = operator.and_ if isinstance(node.op, ast.And) else operator.or_
+
+            def boolean(env, memo):
+                result = parts[0](env, memo)
+                for part in parts[1:]:
+                    result = _broadcast(combine, result, part(env, memo))
+                return result
+            return self._shared(key, boolean)
+        raise ValueError(f"Unsupported expression '{ast.unparse(node)}' in condition '{self.text}'")
+
+    @staticmethod
+    def _shared(key: str, fn):
+        """Memoize a subexpression per batch, so rules sharing it compute it once."""
+        def shared(env, memo):
+            value = memo.get(key)
+            if value is None:
+                value = memo[key] = fn(env, memo)
+            return value
+        return shared
+
+    def evaluate(self, env, memo: dict):
+        """Column of booleans (or one boolean when every name is a scalar)."""
+        return self._eval(env, memo)
+
+
+def load_rules(path: str = TAG_ALERTS_CONFIG) -> list:
+    """Tag-category alert rules with their conditions compiled."""
+    with open(path) as f:
+        rules = json.load(f).get("tag_alerts", [])
+    for rule in rules:
+        rule["tag"] = canonical_key(rule["tag"])
+        rule["compiled"] = Condition(rule["condition"])
+    return rules
+
+
+def load_allocations(path: str) -> dict:
+    """Tag value → monthly budget.
+
+    Accepts {"budgets": {value: {"monthly": n}}} (Pack 04 budget-vs-actual.json)
+    or a plain {value: n} object.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    entries = data.get("budgets", data)
+    return {k: (v.get("monthly") if isinstance(v, dict) else v)
+            for k, v in entries.items() if not k.startswith("_")}
+
+
+def aggregate_costs(rows, dimensions: list) -> tuple:
+    """One pass over cost rows: per dimension, tag value → {date: cost}. Returns (costs, latest date)."""
+    costs = {dim: {} for dim in dimensions}
+    latest = ""
+    for row in rows:
+        tags = row.get("tags") or {}
+        day = row["date"]
+        if day > latest:
+            latest = day
+        for dim, by_value in costs.items():
+            value = tags.get(dim) or "Untagged"
+            days = by_value.get(value)
+            if days is None:
+                days = by_value[value] = {}
+            days[day] = days.get(day, 0.0) + row["cost"]
+    return costs, latest
+
+
+def _previous_months(as_of: date, n: int) -> list:
+    months = []
+    year, month = as_of.year, as_of.month
+    for _ in range(n):
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        months.append(f"{year:04d}-{month:02d}")
+    return months
+
+
+class AggregateTable:
+    """Per-tag-value aggregate columns for one dimension, each computed once on first use."""
+
+    def __init__(self, by_value: dict, cal: Calendar, allocations: dict = None):
+        self.values = sorted(by_value)
+        self.index = {v.lower(): i for i, v in enumerate(self.values)}
+        self._by_value = by_value
+        self._cal = cal
+        self._allocations = allocations or {}
+        self._columns = {}
+
+    def _buckets(self) -> dict:
+        """Bucket totals per value: day, week, prior week, month-to-date, previous 3 months.
+
+        Also counts, per value, the previous months that have any cost data.
+        """
+        cal = self._cal
+        today = cal.as_of_ordinal
+        month = f"{cal.as_of.year:04d}-{cal.as_of.month:02d}"
+        previous = set(_previous_months(cal.as_of, 3))
+        slots = {}
+        prior_month = {}
+        for days in self._by_value.values():
+            for day in days:
+                if day not in slots:
+                    d = cal.try_day(day)
+                    age = today - d.ordinal if d else -1
+                    hits = (age == 0, 0 <= age < 7, 7 <= age < 14,
+                            0 <= age and d.month == month, d is not None and d.month in previous)
+                    slots[day] = [i for i, hit in enumerate(hits) if hit]
+                    if hits[4]:
+                        prior_month[day] = d.month
+        names = ["daily_cost", "weekly_cost", "prior_week_cost", "monthly_actual", "_three_month_total"]
+        totals = {name: [] for name in names}
+        totals["_three_month_count"] = []
+        for value in self.values:
+            sums = [0.0] * len(names)
+            months = set()
+            for day, cost in self._by_value[value].items():
+                for i in slots[day]:
+                    sums[i] += cost
+                if day in prior_month:
+                    months.add(prior_month[day])
+            for name, total in zip(names, sums):
+                totals[name].append(total)
+            totals["_three_month_count"].append(len(months))
+        return totals
+
+    def column(self, metric: str) -> list:
+        col = self._columns.get(metric)
+        if col is not None:
+            return col
+        if metric in ("daily_cost", "weekly_cost", "prior_week_cost", "monthly_actual"):
+            self._columns.update(self._buckets())
+        elif metric == "monthly":
+            self._columns[metric] = self.column("monthly_actual")
+        elif metric == "three_month_avg":
+            # A value with fewer months of history is averaged over the months it has, not diluted
+            self._columns[metric] = [t / n if n else None
+                                     for t, n in zip(self.column("_three_month_total"), self.column("_three_month_count"))]
+        elif metric in ("_three_month_total", "_three_month_count"):
+            self._columns.update(self._buckets())
+        elif metric == "week_over_week_change":
+            self._columns[metric] = _broadcast(
+                lambda w, p: None if not p else (w - p) / p * 100, self.column("weekly_cost"), self.column("prior_week_cost"))
+        elif metric == "allocated_budget":
+            self._columns[metric] = [self._allocations.get(v) for v in self.values]
+        return self._columns[metric]
+
+    def lookup(self, name: str):
+        """Column for a metric name, or the scalar for a `<value>_<metric>` name (None if absent)."""
+        value, metric = resolve_name(name)
+        if value is None:
+            return self.column(metric)
+        i = self.index.get(value.lower())
+        return None if i is None else self.column(metric)[i]
+
+
+def evaluate_rules(rules: list, costs: dict, cal: Calendar, allocations: dict = None) -> list:
+    """Evaluate every rule in one batch per dimension. Returns findings."""
+    findings = []
+    for dim in dict.fromkeys(rule["tag"] for rule in rules):
+        table = AggregateTable(costs.get(dim, {}), cal, allocations)
+        memo = {}
+        for rule in (r for r in rules if r["tag"] == dim):
+            condition = rule["compiled"]
+            result = condition.evaluate(table.lookup, memo)
+            if isinstance(result, list):
+                if rule.get("value"):
+                    i = table.index.get(str(rule["value"]).lower())
+                    hits = [i] if i is not None and result[i] else []
+                else:
+                    hits = [i for i, hit in enumerate(result) if hit]
+            else:
+                hits = [None] if result else []
+            referenced = [(name, table.lookup(name)) for name in condition.names]
+            for i in hits:
+                metrics = {}
+                for name, v in referenced:
+                    v = v[i] if isinstance(v, list) else v
+                    metrics[name] = round(v, 2) if isinstance(v, float) else v
+                findings.append({
+                    "rule": rule["name"],
+                    "tag": dim,
+                    "value": table.values[i] if i is not None else None,
+                    "date": str(cal.as_of),
+                    "condition": rule["condition"],
+                    "metrics": metrics,
+                    "severity": rule.get("severity", "Warning"),
+                    "recipients": rule.get("recipients", [])
+                })
+    return findings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stella Maris Tag-Category Alert Evaluator")
+    parser.add_argument("--costs", required=True, help="Daily cost data JSON or NDJSON (rows carry tags)")
+    parser.add_argument("--rules", default=TAG_ALERTS_CONFIG, help="Tag-category alert rules JSON")
+    parser.add_argument("--allocations", default=None,
+                        help="Monthly budgets per tag value for allocated_budget (e.g. Pack 04 budget-vs-actual.json)")
+    parser.add_argument("--output", default=None, help="Output findings JSON")
+    add_calendar_args(parser)
+    args = parser.parse_args()
+
+    try:
+        rules = load_rules(args.rules)
+    except ValueError as e:
+        parser.error(str(e))
+    allocations = load_allocations(args.allocations) if args.allocations else {}
+    rows = CountingIterator(iter_resources(args.costs, key="daily_costs"))
+    costs, latest = aggregate_costs(rows, list(dict.fromkeys(rule["tag"] for rule in rules)))
+    # Cost data lags the wall clock, so default to the latest day in the data
+    if args.as_of is None and latest:
+        args.as_of = date.fromisoformat(latest)
+    cal = calendar_from_args(args)
+    findings = evaluate_rules(rules, costs, cal, allocations)
+
+    print(f"{'='*60}")
+    print(f"  TAG-CATEGORY ALERT EVALUATION")
+    print(f"  Date: {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}")
+    print(f"  As of: {cal.as_of}")
+    print(f"  Data points: {rows.count}")
+    print(f"  Rules: {len(rules)} | Tag values: " +
+          ", ".join(f"{dim} {len(by_value)}" for dim, by_value in costs.items()))
+    print(f"{'='*60}")
+    print()
+
+    if findings:
+        for f_item in findings[:PRINT_LIMIT]:
+            icon = "🔴" if f_item["severity"].upper() in ("HIGH", "CRITICAL") else "🟡"
+            target = f"{f_item['tag']}={f_item['value']}" if f_item["value"] is not None else f"{f_item['tag']} (all)"
+            print(f"  {icon} {f_item['rule']} — {target}")
+            print(f"      {f_item['condition']} | " + ", ".join(f"{k}={v}" for k, v in f_item["metrics"].items()))
+            print(f"      Notify: {', '.join(f_item['recipients'])}")
+        if len(findings) > PRINT_LIMIT:
+            print(f"  ... and {len(findings) - PRINT_LIMIT} more")
+    else:
+        print(f"  ✓ No tag-category alerts triggered")
+    print()
+
+    print(f"{'='*60}")
+    print(f"  Alerts triggered: {len(findings)}")
+    print(f"  Tags make anomalies attributable.")
+    print(f"{'='*60}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"findings": findings, "scan_date": str(cal.as_of)}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,69 +6,237 @@ FinOps Pack 03
 Calculates when a reservation pays for itself and models
 the risk if a workload is decommissioned early.
 
+With --simulate, decommission months are also drawn from a lifetime
+distribution. A term's net position depends only on the decommission
+month, so draws are shared across candidates and reduced to a month
+histogram once per distinct ExpiryDate/ReviewDate horizon. Each
+candidate-term then reads its mean, percentiles and probability of
+loss off that histogram rather than re-running the scenarios.
+
+Term evaluations are memoized on (on_demand_monthly, ri_monthly, upfront,
+term_months): large candidate files repeat the same SKU and price many
+times, and each combination's month-by-month curve is built once. The
+caches hold tuples; every candidate gets its own result dicts.
+
 Author: Robert Myers, MBA | Stella Maris Governance
 """
 
+import os
+import sys
 import json
+import math
+import random
 import argparse
+from array import array
 from datetime import datetime
+from functools import lru_cache
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from calendar_table import Calendar, add_calendar_args, calendar_from_args  # noqa: E402
+
+
+LIFETIME_DISTRIBUTIONS = ["exponential", "weibull", "lognormal"]
+DEFAULT_MEAN_LIFETIME = 36   # Months
+DEFAULT_SHAPE = 1.5          # Weibull k / lognormal sigma
+DEFAULT_REVIEW_RISK = 0.25   # Chance a workload is retired at its ReviewDate
+
+
+RISK_FIELDS = ("decommission_month", "savings_to_date", "wasted_commitment", "net_position", "verdict")
+
+
+@lru_cache(maxsize=None)
+def term_curve(on_demand_monthly: float, ri_monthly: float, upfront: float, term_months: int) -> tuple:
+    """(cumulative savings, net position) for decommission at each month 0..term, as array('d').
+
+    Cumulative savings at month m are monthly savings × m less the upfront
+    payment; the net position also charges the commitment left unused.
+    Callers share the cached arrays and must not modify them.
+    """
+    term_months = int(term_months)
+    monthly_savings = on_demand_monthly - ri_monthly
+    savings = array("d", ((monthly_savings * m) - upfront for m in range(term_months + 1)))
+    net = array("d", (savings[m] - ri_monthly * (term_months - m) for m in range(term_months + 1)))
+    return savings, net
+
+
+@lru_cache(maxsize=None)
+def _term_figures(on_demand_monthly: float, ri_monthly: float, upfront: float, term_months: int) -> tuple:
+    """(monthly savings, total savings, break-even month, risk rows) for one term, as immutable values."""
+    monthly_savings = on_demand_monthly - ri_monthly
+    total_commitment = (ri_monthly * term_months) + upfront
+    total_on_demand = on_demand_monthly * term_months
+    total_savings = total_on_demand - total_commitment
+
+    # Break-even month (when cumulative savings exceed upfront cost)
+    if upfront > 0 and monthly_savings > 0:
+        breakeven_month = -(-upfront // monthly_savings)  # Ceiling division
+    elif monthly_savings > 0:
+        breakeven_month = 1  # No upfront = immediate savings
+    else:
+        breakeven_month = None  # No savings — bad deal
+
+    # Risk analysis: if decommissioned at month N
+    savings, net = term_curve(on_demand_monthly, ri_monthly, upfront, term_months)
+    risk_rows = []
+    checkpoints = [3, 6, 9, 12] if term_months == 12 else [6, 12, 18, 24, 30, 36]
+    for month_n in checkpoints:
+        if month_n > term_months:
+            continue
+        wasted_if_decommissioned = ri_monthly * (term_months - month_n)
+
+        risk_rows.append((
+            month_n,
+            round(savings[month_n], 2),
+            round(wasted_if_decommissioned, 2),
+            round(net[month_n], 2),
+            "NET POSITIVE" if net[month_n] > 0 else "NET NEGATIVE"
+        ))
+
+    return round(monthly_savings, 2), round(total_savings, 2), breakeven_month, tuple(risk_rows)
+
+
+def evaluate_term(on_demand_monthly: float, ri_monthly: float, upfront: float, term_months: int) -> dict:
+    """Break-even and checkpoint risk scenarios for one term, as a fresh dict per candidate."""
+    monthly_savings, total_savings, breakeven_month, risk_rows = _term_figures(
+        on_demand_monthly, ri_monthly, upfront, int(term_months))
+    return {
+        "monthly_savings": monthly_savings,
+        "total_savings": total_savings,
+        "breakeven_month": breakeven_month,
+        "risk_scenarios": [dict(zip(RISK_FIELDS, row)) for row in risk_rows]
+    }
 
 
-def calculate_breakeven(candidate: dict) -> dict:
+@lru_cache(maxsize=None)
+def _rounded_curve(on_demand_monthly: float, ri_monthly: float, upfront: float, term_months: int) -> tuple:
+    savings, net = term_curve(on_demand_monthly, ri_monthly, upfront, term_months)
+    return tuple(round(v, 2) for v in savings), tuple(round(v, 2) for v in net)
+
+
+def export_curve(on_demand_monthly: float, ri_monthly: float, upfront: float, term_months: int) -> dict:
+    """JSON view of a term's month-by-month curve."""
+    savings, net = _rounded_curve(on_demand_monthly, ri_monthly, upfront, int(term_months))
+    return {"cumulative_savings": list(savings), "net_position": list(net)}
+
+
+class LifetimeModel:
+    """Simulated decommission months, shared by every candidate in a run.
+
+    Draws `scenarios` lifetimes once (common random numbers). A workload's
+    tags only cut lifetimes short — at ExpiryDate always, at ReviewDate for
+    the draws whose review goes against it — so each distinct pair of tag
+    horizons is a re-bucketing of two base histograms, not a new set of draws.
+    """
+
+    def __init__(self, horizon: int, distribution: str = "exponential", mean_lifetime: float = DEFAULT_MEAN_LIFETIME,
+                 shape: float = DEFAULT_SHAPE, review_risk: float = DEFAULT_REVIEW_RISK, scenarios: int = 10000,
+                 seed: int = None, cal: Calendar = None):
+        self.horizon = horizon
+        self.scenarios = scenarios
+        self.cal = cal or Calendar()
+        rng = random.Random(seed)
+        if distribution == "exponential":
+            draw = lambda: rng.expovariate(1 / mean_lifetime)  # noqa: E731
+        elif distribution == "weibull":
+            scale = mean_lifetime / math.gamma(1 + 1 / shape)
+            draw = lambda: rng.weibullvariate(scale, shape)  # noqa: E731
+        elif distribution == "lognormal":
+            mu = math.log(mean_lifetime) - shape ** 2 / 2
+            draw = lambda: rng.lognormvariate(mu, shape)  # noqa: E731
+        else:
+            raise ValueError(f"Unknown lifetime distribution: {distribution}")
+
+        # Months run before decommission, bucketed at the horizon, split by whether the review retires it
+        self._kept = [0] * (horizon + 1)
+        self._reviewed = [0] * (horizon + 1)
+        for _ in range(scenarios):
+            month = min(int(draw()), horizon)
+            (self._reviewed if rng.random() < review_risk else self._kept)[month] += 1
+        self._histograms = {}
+        self._summaries = {}
+
+    def _tag_month(self, value):
+        day = self.cal.try_day(value) if value else None
+        if day is None:
+            return self.horizon
+        return max(0, min(self.horizon, self.cal.months_until(day)))
+
+    def horizons(self, tags: dict) -> tuple:
+        """(ExpiryDate month, ReviewDate month) cutting a workload's lifetimes short."""
+        expiry = self._tag_month(tags.get("ExpiryDate"))
+        return expiry, min(expiry, self._tag_month(tags.get("ReviewDate")))
+
+    def histogram(self, key: tuple) -> list:
+        """Draws per decommission month (0..horizon) for a workload with these horizons."""
+        expiry, review = key
+        hist = self._histograms.get(key)
+        if hist is None:
+            hist = [0] * (self.horizon + 1)
+            for cap, counts in ((expiry, self._kept), (review, self._reviewed)):
+                for month, n in enumerate(counts):
+                    hist[min(month, cap)] += n
+            self._histograms[key] = hist
+        return hist
+
+    def summarize(self, key: tuple, on_demand_monthly: float, ri_monthly: float, upfront: float,
+                  term_months: int) -> dict:
+        """Net-position distribution for one term over the simulated decommission months.
+
+        The net position rises with the decommission month, so the
+        percentiles are the curve's values at the histogram's percentile months.
+        """
+        term_months = int(term_months)
+        memo_key = (key, on_demand_monthly, ri_monthly, upfront, term_months)
+        summary = self._summaries.get(memo_key)
+        if summary is not None:
+            return dict(summary)
+        hist = self.histogram(key)
+        net = term_curve(on_demand_monthly, ri_monthly, upfront, term_months)[1]
+        counts = hist[:term_months] + [sum(hist[term_months:])]
+        n = self.scenarios
+        mean = sum(c * net[m] for m, c in enumerate(counts)) / n
+        loss = sum(c for m, c in enumerate(counts) if net[m] < 0) / n
+        percentiles = {}
+        targets = [(5, math.ceil(0.05 * n)), (50, math.ceil(0.50 * n))]
+        seen = 0
+        for m, c in enumerate(counts):
+            seen += c
+            while targets and seen >= targets[0][1]:
+                percentiles[targets.pop(0)[0]] = net[m]
+        summary = {
+            "scenarios": n,
+            "mean_net": round(mean, 2),
+            "p5_net": round(percentiles[5], 2),
+            "p50_net": round(percentiles[50], 2),
+            "prob_loss": round(loss, 4),
+            "prob_full_term": round(counts[-1] / n, 4)
+        }
+        self._summaries[memo_key] = tuple(summary.items())
+        return summary
+
+
+def calculate_breakeven(candidate: dict, lifetimes: LifetimeModel = None, curves: bool = False) -> dict:
     """Calculate break-even for 1-year and 3-year RI terms."""
     name = candidate.get("name", "Unknown")
     on_demand_monthly = candidate.get("on_demand_monthly", 0)
+    horizons = lifetimes.horizons(candidate.get("tags") or {}) if lifetimes else None
 
     results = {"resource": name, "on_demand_monthly": on_demand_monthly, "terms": []}
 
     for term in candidate.get("terms", []):
-        term_months = term.get("months", 12)
-        ri_monthly = term.get("ri_monthly", 0)
-        upfront = term.get("upfront", 0)
-        discount_pct = term.get("discount_pct", 0)
-
-        monthly_savings = on_demand_monthly - ri_monthly
-        total_commitment = (ri_monthly * term_months) + upfront
-        total_on_demand = on_demand_monthly * term_months
-        total_savings = total_on_demand - total_commitment
-
-        # Break-even month (when cumulative savings exceed upfront cost)
-        if upfront > 0 and monthly_savings > 0:
-            breakeven_month = -(-upfront // monthly_savings)  # Ceiling division
-        elif monthly_savings > 0:
-            breakeven_month = 1  # No upfront = immediate savings
-        else:
-            breakeven_month = None  # No savings — bad deal
-
-        # Risk analysis: if decommissioned at month N
-        risk_scenarios = []
-        checkpoints = [3, 6, 9, 12] if term_months == 12 else [6, 12, 18, 24, 30, 36]
-        for month_n in checkpoints:
-            if month_n > term_months:
-                continue
-            savings_at_n = (monthly_savings * month_n) - upfront
-            remaining_commitment = ri_monthly * (term_months - month_n)
-            wasted_if_decommissioned = remaining_commitment
-            net = savings_at_n - wasted_if_decommissioned
-
-            risk_scenarios.append({
-                "decommission_month": month_n,
-                "savings_to_date": round(savings_at_n, 2),
-                "wasted_commitment": round(wasted_if_decommissioned, 2),
-                "net_position": round(net, 2),
-                "verdict": "NET POSITIVE" if net > 0 else "NET NEGATIVE"
-            })
-
-        results["terms"].append({
-            "term_months": term_months,
-            "ri_monthly": ri_monthly,
-            "upfront": upfront,
-            "discount_pct": discount_pct,
-            "monthly_savings": round(monthly_savings, 2),
-            "total_savings": round(total_savings, 2),
-            "breakeven_month": breakeven_month,
-            "risk_scenarios": risk_scenarios
-        })
+        key = (on_demand_monthly, term.get("ri_monthly", 0), term.get("upfront", 0), int(term.get("months", 12)))
+        term_result = {
+            "term_months": key[3],
+            "ri_monthly": key[1],
+            "upfront": key[2],
+            "discount_pct": term.get("discount_pct", 0),
+            **evaluate_term(*key)
+        }
+        if horizons is not None:
+            term_result["simulation"] = lifetimes.summarize(horizons, *key)
+        if curves:
+            term_result["curve"] = export_curve(*key)
+        results["terms"].append(term_result)
 
     return results
 
@@ -79,15 +247,40 @@ def main():
     )
     parser.add_argument("--candidates", "-c", required=True, help="Candidates JSON")
     parser.add_argument("--output", "-o", default=None, help="Output JSON")
+    parser.add_argument("--curves", action="store_true",
+                        help="Export each term's month-by-month cumulative savings and net position")
+    parser.add_argument("--simulate", type=int, default=0, metavar="N",
+                        help="Also simulate N decommission scenarios per candidate (e.g. 10000)")
+    parser.add_argument("--lifetime", choices=LIFETIME_DISTRIBUTIONS, default="exponential",
+                        help="Workload lifetime distribution for --simulate (default: exponential)")
+    parser.add_argument("--mean-lifetime", type=float, default=DEFAULT_MEAN_LIFETIME,
+                        help=f"Mean workload lifetime in months (default: {DEFAULT_MEAN_LIFETIME})")
+    parser.add_argument("--shape", type=float, default=DEFAULT_SHAPE,
+                        help=f"Weibull shape or lognormal sigma (default: {DEFAULT_SHAPE})")
+    parser.add_argument("--review-risk", type=float, default=DEFAULT_REVIEW_RISK,
+                        help=f"Probability a workload is retired at its ReviewDate tag (default: {DEFAULT_REVIEW_RISK})")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible simulations")
+    add_calendar_args(parser)
     args = parser.parse_args()
+    if args.simulate < 0 or args.mean_lifetime <= 0 or args.shape <= 0 or not 0 <= args.review_risk <= 1:
+        parser.error("--simulate, --mean-lifetime and --shape must be positive and --review-risk in [0, 1]")
 
     with open(args.candidates) as f:
         data = json.load(f)
     candidates = data.get("candidates", [])
 
+    lifetimes = None
+    if args.simulate:
+        horizon = max((int(t.get("months", 12)) for c in candidates for t in c.get("terms", [])), default=12)
+        lifetimes = LifetimeModel(horizon, args.lifetime, args.mean_lifetime, args.shape, args.review_risk,
+                                  args.simulate, args.seed, calendar_from_args(args))
+
     print(f"{'='*60}")
     print(f"  BREAK-EVEN ANALYSIS")
     print(f"  Date: {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}")
+    if lifetimes:
+        print(f"  Simulation: {args.simulate} scenarios | {args.lifetime} lifetime, "
+              f"mean {args.mean_lifetime} months | review risk {args.review_risk}")
     print(f"{'='*60}")
     print()
 
@@ -95,7 +288,7 @@ def main():
     total_annual_savings = 0
 
     for c in candidates:
-        result = calculate_breakeven(c)
+        result = calculate_breakeven(c, lifetimes, args.curves)
         all_results.append(result)
 
         print(f"  ─── {result['resource']} ───")
@@ -117,6 +310,11 @@ def main():
                 icon = "✅" if rs["verdict"] == "NET POSITIVE" else "❌"
                 print(f"      {icon} Decommission month {rs['decommission_month']}: "
                       f"net ${rs['net_position']} ({rs['verdict']})")
+            sim = t.get("simulation")
+            if sim:
+                icon = "✅" if sim["prob_loss"] < 0.05 else "⚠️" if sim["prob_loss"] < 0.25 else "❌"
+                print(f"    {icon} Simulated: mean ${sim['mean_net']} | P5 ${sim['p5_net']} | P50 ${sim['p50_net']} | "
+                      f"P(loss) {sim['prob_loss'] * 100:.1f}%")
             print()
 
     print(f"{'='*60}")
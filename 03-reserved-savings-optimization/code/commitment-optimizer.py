@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Commitment Portfolio Optimizer — Stella Maris Governance
+FinOps Pack 03
+
+Chooses which reservations to buy, and on which term, to maximize
+expected net savings under a total-commitment cap and per-cost-center
+caps. Expected savings weigh each term's net position across the
+candidate's decommission-risk scenarios (the same net position
+break-even-calculator.py reports per checkpoint).
+
+The solver is the LP greedy for a multiple-choice knapsack: each
+candidate's term options are reduced to their upper convex hull, and
+the hull increments are bought in order of savings per commitment
+dollar while every cap has room. Caps nest (cost centers within the
+total), so the same ordering also gives the LP optimum, which is
+reported as an upper bound on what any purchase set could save.
+
+Author: Robert Myers, MBA | Stella Maris Governance
+"""
+
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from inventory import iter_resources  # noqa: E402
+
+
+UNASSIGNED = "Unassigned"
+PRINT_LIMIT = 25
+
+
+def net_position(on_demand_monthly: float, ri_monthly: float, upfront: float, term_months: int, month: int) -> float:
+    """Net of savings to date and the commitment left unused if decommissioned at `month`."""
+    month = min(month, term_months)
+    return (on_demand_monthly - ri_monthly) * month - upfront - ri_monthly * (term_months - month)
+
+
+def decommission_distribution(candidate: dict, term_months: int, monthly_hazard: float = 0.0) -> list:
+    """[(decommission month, probability)] over the term; the full term takes the remainder.
+
+    Uses the candidate's `decommission_risk` scenarios ([{"month", "probability"}])
+    when present, else a constant monthly decommission hazard.
+    """
+    scenarios = candidate.get("decommission_risk")
+    if scenarios:
+        dist = [(min(int(s["month"]), term_months), float(s["probability"])) for s in scenarios]
+    elif monthly_hazard > 0:
+        survive = 1.0
+        dist = []
+        for month in range(1, term_months + 1):
+            dist.append((month, survive * monthly_hazard))
+            survive *= 1 - monthly_hazard
+    else:
+        dist = []
+    remainder = 1.0 - sum(p for _, p in dist)
+    if remainder < -1e-9:
+        raise ValueError(f"{candidate.get('name', 'Unknown')}: decommission probabilities sum above 1")
+    return dist + [(term_months, max(0.0, remainder))]
+
+
+def candidate_options(candidate: dict, monthly_hazard: float = 0.0) -> list:
+    """Term options with positive expected net savings: [(commitment, expected net, term)]."""
+    on_demand = candidate.get("on_demand_monthly", 0)
+    options = []
+    for term in candidate.get("terms", []):
+        months = term.get("months", 12)
+        ri_monthly = term.get("ri_monthly", 0)
+        upfront = term.get("upfront", 0)
+        expected = sum(p * net_position(on_demand, ri_monthly, upfront, months, m)
+                       for m, p in decommission_distribution(candidate, months, monthly_hazard))
+        commitment = ri_monthly * months + upfront
+        if expected > 0 and commitment > 0:
+            options.append((commitment, expected, term))
+    return options
+
+
+def hull_increments(options: list) -> list:
+    """Upper convex hull of (commitment, expected net) from (0, 0), as increments of falling efficiency.
+
+    Returns [(efficiency, Δcommitment, Δnet, option index)]. An option off
+    the hull is never the better buy at any budget in the LP relaxation.
+    """
+    points = sorted(range(len(options)), key=lambda i: (options[i][0], -options[i][1]))
+    hull = []  # option indexes
+    cost, value = 0.0, 0.0
+    for i in points:
+        c, v = options[i][0], options[i][1]
+        if v <= (options[hull[-1]][1] if hull else 0.0):
+            continue  # Dominated: costs more for no more savings
+        while hull:
+            prev_c, prev_v = (options[hull[-2]][:2] if len(hull) > 1 else (0.0, 0.0))
+            last_c, last_v = options[hull[-1]][:2]
+            if (last_v - prev_v) * (c - prev_c) <= (v - prev_v) * (last_c - prev_c):
+                hull.pop()  # Last point lies on or under the chord — not on the hull
+            else:
+                break
+        hull.append(i)
+    increments = []
+    for i in hull:
+        c, v = options[i][0], options[i][1]
+        increments.append(((v - value) / (c - cost), c - cost, v - value, i))
+        cost, value = c, v
+    return increments
+
+
+def optimize(candidates: list, total_cap: float = None, cost_center_caps: dict = None,
+             default_cost_center_cap: float = None, monthly_hazard: float = 0.0) -> dict:
+    """Choose at most one term per candidate to maximize expected net savings under the caps."""
+    cost_center_caps = cost_center_caps or {}
+    inf = float("inf")
+    remaining_total = inf if total_cap is None else total_cap
+    remaining_cc = {}
+
+    def cc_cap(cc):
+        cap = cost_center_caps.get(cc, default_cost_center_cap)
+        return inf if cap is None else cap
+
+    def cc_room(cc):
+        if cc not in remaining_cc:
+            remaining_cc[cc] = cc_cap(cc)
+        return remaining_cc[cc]
+
+    options, cost_centers, increments = [], [], []
+    excluded = 0
+    for k, c in enumerate(candidates):
+        if c.get("recommendation") == "ON_DEMAND":
+            excluded += 1
+            options.append([])
+            cost_centers.append(None)
+            continue
+        opts = candidate_options(c, monthly_hazard)
+        options.append(opts)
+        cost_centers.append((c.get("tags") or {}).get("CostCenter") or UNASSIGNED)
+        increments.extend((eff, dc, dv, k, i) for eff, dc, dv, i in hull_increments(opts))
+    increments.sort(key=lambda x: x[0], reverse=True)
+
+    chosen = {}        # candidate → option index
+    blocked = set()    # candidates whose next increment did not fit
+    bound = 0.0        # LP optimum: fractional increments fill the last room
+    lp_total = remaining_total
+    lp_cc = {}
+    for eff, dc, dv, k, i in increments:
+        cc = cost_centers[k]
+        # LP relaxation
+        lp_room = min(lp_total, lp_cc.get(cc, cc_cap(cc)))
+        if lp_room > 0:
+            take = min(1.0, lp_room / dc)
+            bound += take * dv
+            lp_total -= take * dc
+            lp_cc[cc] = lp_cc.get(cc, cc_cap(cc)) - take * dc
+        # Integer greedy
+        if k in blocked:
+            continue
+        if dc <= remaining_total + 1e-9 and dc <= cc_room(cc) + 1e-9:
+            chosen[k] = i
+            remaining_total -= dc
+            remaining_cc[cc] -= dc
+        else:
+            blocked.add(k)
+
+    # Fill leftover room: a blocked candidate may still fit a cheaper option than its hull step
+    for k in sorted(blocked, key=lambda k: -max((o[1] for o in options[k]), default=0)):
+        cc = cost_centers[k]
+        current = options[k][chosen[k]] if k in chosen else (0.0, 0.0, None)
+        best = None
+        for i, (c, v, _) in enumerate(options[k]):
+            extra = c - current[0]
+            if v > current[1] and extra <= remaining_total + 1e-9 and extra <= cc_room(cc) + 1e-9:
+                if best is None or v > options[k][best][1]:
+                    best = i
+        if best is not None:
+            extra = options[k][best][0] - current[0]
+            chosen[k] = best
+            remaining_total -= extra
+            remaining_cc[cc] -= extra
+
+    # Greedy's known worst case is one large purchase crowded out by small ones; check that purchase alone
+    greedy_value = sum(options[k][i][1] for k, i in chosen.items())
+    total_room = inf if total_cap is None else total_cap
+    single = max(((options[k][i][1], k, i) for k in range(len(candidates)) for i in range(len(options[k]))
+                  if options[k][i][0] <= min(total_room, cc_cap(cost_centers[k])) + 1e-9), default=None)
+    if single is not None and single[0] > greedy_value:
+        chosen = {single[1]: single[2]}
+
+    purchases = []
+    by_cc = {}
+    for k, i in sorted(chosen.items()):
+        commitment, expected, term = options[k][i]
+        c = candidates[k]
+        cc = cost_centers[k]
+        purchases.append({
+            "resource": c.get("name", "Unknown"),
+            "cost_center": cc,
+            "term_months": term.get("months", 12),
+            "ri_monthly": term.get("ri_monthly", 0),
+            "upfront": term.get("upfront", 0),
+            "commitment": round(commitment, 2),
+            "expected_net_savings": round(expected, 2)
+        })
+        acc = by_cc.setdefault(cc, {"commitment": 0.0, "expected_net_savings": 0.0, "purchases": 0})
+        acc["commitment"] += commitment
+        acc["expected_net_savings"] += expected
+        acc["purchases"] += 1
+    purchases.sort(key=lambda p: p["expected_net_savings"], reverse=True)
+
+    total_savings = sum(p["expected_net_savings"] for p in purchases)
+    for cc, acc in by_cc.items():
+        cap = cost_center_caps.get(cc, default_cost_center_cap)
+        acc.update(commitment=round(acc["commitment"], 2), expected_net_savings=round(acc["expected_net_savings"], 2),
+                   cap=cap)
+    return {
+        "purchases": purchases,
+        "cost_centers": dict(sorted(by_cc.items())),
+        "total_commitment": round(sum(p["commitment"] for p in purchases), 2),
+        "total_cap": total_cap,
+        "expected_net_savings": round(total_savings, 2),
+        "lp_upper_bound": round(bound, 2),
+        "optimality_gap_pct": round((bound - total_savings) / bound * 100, 3) if bound > 0 else 0.0,
+        "candidates": len(candidates),
+        "excluded_on_demand": excluded
+    }
+
+
+def load_caps(path: str) -> dict:
+    """Cost center → commitment cap from {"cost_centers": {cc: cap}} or a plain {cc: cap} object."""
+    with open(path) as f:
+        data = json.load(f)
+    caps = data.get("cost_centers", data)
+    return {cc: float(cap) for cc, cap in caps.items() if not cc.startswith("_")}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Stella Maris Commitment Portfolio Optimizer (FinOps Pack 03)"
+    )
+    parser.add_argument("--candidates", "-c", required=True, help="Candidates JSON (break-even calculator format)")
+    parser.add_argument("--total-cap", type=float, default=None, help="Total commitment cap ($ over all terms)")
+    parser.add_argument("--cost-center-cap", type=float, default=None, help="Commitment cap per cost center ($)")
+    parser.add_argument("--cost-center-caps", default=None, help="JSON of per-cost-center caps (overrides --cost-center-cap)")
+    parser.add_argument("--monthly-hazard", type=float, default=0.0,
+                        help="Monthly decommission probability for candidates without decommission_risk scenarios")
+    parser.add_argument("--output", "-o", default=None, help="Output JSON")
+    args = parser.parse_args()
+    if not 0 <= args.monthly_hazard < 1:
+        parser.error("--monthly-hazard must be in [0, 1)")
+
+    candidates = list(iter_resources(args.candidates, key="candidates"))
+    caps = load_caps(args.cost_center_caps) if args.cost_center_caps else {}
+    try:
+        result = optimize(candidates, args.total_cap, caps, args.cost_center_cap, args.monthly_hazard)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(f"{'='*60}")
+    print(f"  COMMITMENT PORTFOLIO OPTIMIZATION")
+    print(f"  Date: {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}")
+    print(f"  Candidates: {result['candidates']} ({result['excluded_on_demand']} on-demand excluded)")
+    print(f"  Total cap: {'$' + format(args.total_cap, ',.2f') if args.total_cap is not None else 'none'}")
+    print(f"{'='*60}")
+    print()
+
+    for p in result["purchases"][:PRINT_LIMIT]:
+        print(f"  ✅ {p['resource']} [{p['cost_center']}] — {p['term_months']}-month term")
+        print(f"      Commitment: ${p['commitment']:,.2f} | Expected net savings: ${p['expected_net_savings']:,.2f}")
+    if len(result["purchases"]) > PRINT_LIMIT:
+        print(f"  ... and {len(result['purchases']) - PRINT_LIMIT} more")
+    print()
+
+    print(f"  ─── By cost center ───")
+    for cc, acc in result["cost_centers"].items():
+        cap = f" of ${acc['cap']:,.2f}" if acc["cap"] is not None else ""
+        print(f"  {cc}: {acc['purchases']} purchases | ${acc['commitment']:,.2f}{cap} | "
+              f"saves ${acc['expected_net_savings']:,.2f}")
+    print()
+
+    print(f"{'='*60}")
+    print(f"  Purchases: {len(result['purchases'])} | Commitment: ${result['total_commitment']:,.2f}")
+    print(f"  Expected net savings: ${result['expected_net_savings']:,.2f} "
+          f"(LP bound ${result['lp_upper_bound']:,.2f}, gap {result['optimality_gap_pct']}%)")
+    print(f"  Commit where the workload will outlive the term.")
+    print(f"{'='*60}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
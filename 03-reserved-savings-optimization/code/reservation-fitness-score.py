@@ -17,11 +17,18 @@ Score < 40: Remain on-demand
 Author: Robert Myers, MBA | Stella Maris Governance
 """
 
+import os
 import json
 import sys
+import operator
 import argparse
-from datetime import datetime, date
-import statistics
+from bisect import bisect_right
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from inventory import iter_resources  # noqa: E402
+from hierarchy import with_effective_tags  # noqa: E402
+from calendar_table import Calendar, add_calendar_args, calendar_from_args  # noqa: E402
 
 
 # Factor weights
@@ -50,6 +57,58 @@ CRITICALITY_SCORES = {
     "low": 30
 }
 
+# Factor buckets: raw score = scores[bisect_right(bounds, value)]
+CV_BOUNDS, CV_SCORES = [10, 20, 30, 50], [100, 85, 70, 50, 25]  # CV % — lower is more stable
+RUNTIME_BOUNDS, RUNTIME_SCORES = [40, 60, 80, 95], [20, 40, 65, 85, 100]  # Runtime % of month
+MIN_UTILIZATION_DAYS = 7
+PRINT_LIMIT = 25
+
+RECOMMENDATIONS = [
+    ("ON_DEMAND", "Remain on-demand. Commitment risk exceeds discount benefit."),
+    ("SAVINGS_PLAN", "Savings Plan recommended. Workload stability insufficient for RI lock-in."),
+    ("RESERVE", "1-year Reserved Instance recommended. Proceed to break-even analysis.")
+]
+
+
+def _weighted(factor: str) -> dict:
+    """Raw score → weighted score for one factor, so batch scoring skips the multiply and round."""
+    return {raw: round(raw * WEIGHTS[factor]) for raw in range(101)}
+
+
+WEIGHTED = {factor: _weighted(factor) for factor in WEIGHTS}
+
+
+def mean_stdev(values: list) -> tuple:
+    """Mean and sample standard deviation in float arithmetic.
+
+    statistics.mean/stdev convert every float to an exact fraction, which
+    dominates scoring time on large inventories. Deviations are taken from
+    the first value to keep the sum of squares well conditioned.
+    """
+    n = len(values)
+    k = values[0]
+    d = [x - k for x in values]
+    s = sum(d)
+    mean = k + s / n
+    if n < 2:
+        return mean, 0.0
+    var = (sum(map(operator.mul, d, d)) - s * s / n) / (n - 1)
+    return mean, var ** 0.5 if var > 0 else 0.0
+
+
+def _lifecycle_raw(remaining_months: int, term_months: int) -> int:
+    if remaining_months > term_months * 1.5:
+        return 100
+    if remaining_months > term_months:
+        return 80
+    if remaining_months > term_months * 0.75:
+        return 50
+    return 10  # Expiry before RI term ends — bad bet
+
+
+def _recommendation_index(total: int) -> int:
+    return 2 if total >= 70 else 1 if total >= 40 else 0
+
 
 def score_utilization_stability(daily_utilization: list) -> dict:
     """Score based on consistency of utilization over 30 days.
@@ -57,26 +116,21 @@ def score_utilization_stability(daily_utilization: list) -> dict:
     Low variance = high score. A resource that runs at 80% every day
     is a better reservation candidate than one that bounces 20-95%.
     """
-    if not daily_utilization or len(daily_utilization) < 7:
-        return {"score": 0, "reason": "Insufficient data (need 7+ days)"}
+    if not daily_utilization or len(daily_utilization) < MIN_UTILIZATION_DAYS:
+        return {
+            "raw_score": 0,
+            "weighted_score": 0,
+            "max_weighted": round(100 * WEIGHTS["utilization_stability"]),
+            "data_points": len(daily_utilization or []),
+            "reason": f"Insufficient data (need {MIN_UTILIZATION_DAYS}+ days)"
+        }
 
-    avg = statistics.mean(daily_utilization)
-    stdev = statistics.stdev(daily_utilization) if len(daily_utilization) > 1 else 0
+    avg, stdev = mean_stdev(daily_utilization)
 
     # Coefficient of variation — lower is more stable
     cv = (stdev / avg * 100) if avg > 0 else 100
 
-    if cv < 10:
-        raw = 100
-    elif cv < 20:
-        raw = 85
-    elif cv < 30:
-        raw = 70
-    elif cv < 50:
-        raw = 50
-    else:
-        raw = 25
-
+    raw = CV_SCORES[bisect_right(CV_BOUNDS, cv)]
     weighted = round(raw * WEIGHTS["utilization_stability"])
 
     return {
@@ -98,17 +152,7 @@ def score_runtime_hours(hours_per_month: float, total_hours: float = 730) -> dic
     A resource running business hours only (8×22=176) scores ~24.
     """
     pct = min((hours_per_month / total_hours) * 100, 100)
-
-    if pct >= 95:
-        raw = 100
-    elif pct >= 80:
-        raw = 85
-    elif pct >= 60:
-        raw = 65
-    elif pct >= 40:
-        raw = 40
-    else:
-        raw = 20
+    raw = RUNTIME_SCORES[bisect_right(RUNTIME_BOUNDS, pct)]
 
     weighted = round(raw * WEIGHTS["runtime_hours"])
 
@@ -123,28 +167,20 @@ def score_runtime_hours(hours_per_month: float, total_hours: float = 730) -> dic
 
 
 def score_workload_lifecycle(expiry_date: str = None, created_date: str = None,
-                              review_date: str = None, term_months: int = 12) -> dict:
-    """Score based on expected remaining workload lifetime.
+                              review_date: str = None, term_months: int = 12, cal: Calendar = None) -> dict:
+    """Score based on expected remaining workload lifetime, as of `cal.as_of`.
 
     A workload expected to run beyond the RI term scores high.
     A workload with an expiry date before the RI term ends scores low.
     """
-    today = date.today()
+    cal = cal or Calendar()
 
     if expiry_date:
-        try:
-            expiry = date.fromisoformat(expiry_date)
-            remaining_months = (expiry.year - today.year) * 12 + (expiry.month - today.month)
-
-            if remaining_months > term_months * 1.5:
-                raw = 100
-            elif remaining_months > term_months:
-                raw = 80
-            elif remaining_months > term_months * 0.75:
-                raw = 50
-            else:
-                raw = 10  # Expiry before RI term ends — bad bet
-        except ValueError:
+        expiry = cal.try_day(expiry_date)
+        if expiry:
+            remaining_months = cal.months_until(expiry)
+            raw = _lifecycle_raw(remaining_months, term_months)
+        else:
             raw = 60  # Unparseable date
             remaining_months = "unknown"
     else:
@@ -195,7 +231,7 @@ def score_criticality(crit: str) -> dict:
     }
 
 
-def calculate_fitness(workload: dict) -> dict:
+def calculate_fitness(workload: dict, cal: Calendar = None) -> dict:
     """Calculate composite reservation fitness score."""
     tags = workload.get("tags", {})
 
@@ -209,7 +245,8 @@ def calculate_fitness(workload: dict) -> dict:
         "workload_lifecycle": score_workload_lifecycle(
             expiry_date=tags.get("ExpiryDate"),
             created_date=tags.get("CreatedDate"),
-            term_months=workload.get("term_months", 12)
+            term_months=workload.get("term_months", 12),
+            cal=cal
         ),
         "environment": score_environment(
             tags.get("Environment", "unknown")
@@ -221,17 +258,7 @@ def calculate_fitness(workload: dict) -> dict:
 
     total = sum(f["weighted_score"] for f in factors.values())
     max_possible = sum(f["max_weighted"] for f in factors.values())
-
-    # Recommendation
-    if total >= 70:
-        recommendation = "RESERVE"
-        rec_detail = "1-year Reserved Instance recommended. Proceed to break-even analysis."
-    elif total >= 40:
-        recommendation = "SAVINGS_PLAN"
-        rec_detail = "Savings Plan recommended. Workload stability insufficient for RI lock-in."
-    else:
-        recommendation = "ON_DEMAND"
-        rec_detail = "Remain on-demand. Commitment risk exceeds discount benefit."
+    recommendation, rec_detail = RECOMMENDATIONS[_recommendation_index(total)]
 
     return {
         "resource": workload.get("name", "Unknown"),
@@ -247,53 +274,149 @@ def calculate_fitness(workload: dict) -> dict:
     }
 
 
+class FitnessBatch:
+    """Fitness scores for many workloads at once, held as columns.
+
+    Utilization mean, stdev and CV are computed row by row over the
+    utilization matrix with float sums, and the five factors are bucket
+    and dict lookups into precomputed weighted scores. No per-workload
+    dicts or reason strings are built; `result(i)` expands one workload
+    into the full calculate_fitness() shape when it is printed or exported.
+    """
+
+    def __init__(self, workloads: list, cal: Calendar = None):
+        self.workloads = workloads
+        self.cal = cal or Calendar()
+        n = len(workloads)
+        self.scores = [0] * n
+        self.recommendations = [0] * n
+
+        util_w, runtime_w, life_w, env_w, crit_w = (WEIGHTED[f] for f in WEIGHTS)
+        env_raw = {k: env_w[v] for k, v in ENVIRONMENT_SCORES.items()}
+        crit_raw = {k: crit_w[v] for k, v in CRITICALITY_SCORES.items()}
+        util_buckets = [util_w[v] for v in CV_SCORES]
+        runtime_buckets = [runtime_w[v] for v in RUNTIME_SCORES]
+        env_default, crit_default = env_w[40], crit_w[50]
+        life_unset, life_unparseable = life_w[90], life_w[60]
+        cal = self.cal
+
+        for i, wl in enumerate(workloads):
+            tags = wl.get("tags", {})
+
+            util = wl.get("daily_utilization") or []
+            if len(util) < MIN_UTILIZATION_DAYS:
+                total = 0
+            else:
+                avg, stdev = mean_stdev(util)
+                cv = (stdev / avg * 100) if avg > 0 else 100
+                total = util_buckets[bisect_right(CV_BOUNDS, cv)]
+
+            pct = min((wl.get("hours_per_month", 730) / 730) * 100, 100)
+            total += runtime_buckets[bisect_right(RUNTIME_BOUNDS, pct)]
+
+            expiry_date = tags.get("ExpiryDate")
+            if expiry_date:
+                expiry = cal.try_day(expiry_date)
+                if expiry:
+                    total += life_w[_lifecycle_raw(cal.months_until(expiry), wl.get("term_months", 12))]
+                else:
+                    total += life_unparseable
+            else:
+                total += life_unset
+
+            env = tags.get("Environment", "unknown")
+            total += env_raw.get(env.lower(), env_default) if env else env_raw.get("unknown", env_default)
+            crit = tags.get("Criticality", "medium")
+            total += crit_raw.get(crit.lower(), crit_default) if crit else crit_raw["medium"]
+
+            self.scores[i] = total
+            self.recommendations[i] = _recommendation_index(total)
+
+    def __len__(self) -> int:
+        return len(self.workloads)
+
+    def counts(self) -> dict:
+        counts = [0, 0, 0]
+        for r in self.recommendations:
+            counts[r] += 1
+        return {name: counts[i] for i, (name, _) in enumerate(RECOMMENDATIONS)}
+
+    def ranked(self) -> list:
+        """Workload indexes, highest fitness first."""
+        return sorted(range(len(self.scores)), key=self.scores.__getitem__, reverse=True)
+
+    def result(self, i: int) -> dict:
+        """Full scored result with factor reasons for one workload."""
+        return calculate_fitness(self.workloads[i], self.cal)
+
+
+def print_result(result: dict):
+    icon = "🟢" if result["recommendation"] == "RESERVE" else "🟡" if result["recommendation"] == "SAVINGS_PLAN" else "🔴"
+    print(f"  {icon} {result['resource']} [{result['resource_type']}]")
+    print(f"      Fitness Score: {result['fitness_score']}/{result['max_score']}")
+    print(f"      Recommendation: {result['recommendation']}")
+
+    for fname, fdata in result["factors"].items():
+        label = fname.replace("_", " ").title()
+        print(f"        {label}: {fdata['weighted_score']}/{fdata['max_weighted']} — {fdata['reason']}")
+    print()
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Stella Maris Reservation Fitness Score (FinOps Pack 03)"
     )
     parser.add_argument("--workloads", "-w", required=True, help="Workloads JSON file")
     parser.add_argument("--output", "-o", default=None, help="Output results JSON")
+    parser.add_argument("--effective-tags", nargs="?", const="", default=None, metavar="CONTAINERS",
+                        help="Apply tag inheritance first; parents from a CONTAINERS export or the inventory itself")
+    parser.add_argument("--batch", action="store_true",
+                        help=f"Score all workloads as columns; print only the top {PRINT_LIMIT} (large inventories)")
+    add_calendar_args(parser)
     args = parser.parse_args()
+    cal = calendar_from_args(args)
 
-    with open(args.workloads) as f:
-        data = json.load(f)
-    workloads = data.get("workloads", [])
+    if args.effective_tags is None:
+        workloads = list(iter_resources(args.workloads, key="workloads"))
+    else:
+        workloads = list(with_effective_tags(args.workloads, args.effective_tags or None, key="workloads"))
 
     print(f"{'='*60}")
     print(f"  RESERVATION FITNESS SCORING")
     print(f"  Date: {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}")
+    if args.as_of:
+        print(f"  As of: {args.as_of}")
     print(f"  Candidates: {len(workloads)}")
     print(f"{'='*60}")
     print()
 
-    results = []
-    for wl in workloads:
-        result = calculate_fitness(wl)
-        results.append(result)
-
-        icon = "🟢" if result["recommendation"] == "RESERVE" else "🟡" if result["recommendation"] == "SAVINGS_PLAN" else "🔴"
-        print(f"  {icon} {result['resource']} [{result['resource_type']}]")
-        print(f"      Fitness Score: {result['fitness_score']}/{result['max_score']}")
-        print(f"      Recommendation: {result['recommendation']}")
-
-        for fname, fdata in result["factors"].items():
-            label = fname.replace("_", " ").title()
-            print(f"        {label}: {fdata['weighted_score']}/{fdata['max_weighted']} — {fdata['reason']}")
-        print()
-
-    # Summary
-    reserves = [r for r in results if r["recommendation"] == "RESERVE"]
-    savings = [r for r in results if r["recommendation"] == "SAVINGS_PLAN"]
-    ondemand = [r for r in results if r["recommendation"] == "ON_DEMAND"]
+    if args.batch:
+        batch = FitnessBatch(workloads, cal)
+        ranked = batch.ranked()
+        for i in ranked[:PRINT_LIMIT]:
+            print_result(batch.result(i))
+        if len(ranked) > PRINT_LIMIT:
+            print(f"  ... and {len(ranked) - PRINT_LIMIT} more (lower fitness)")
+            print()
+        counts = batch.counts()
+        # Reasons are only built for exported workloads
+        results = [batch.result(i) for i in ranked] if args.output else []
+    else:
+        results = []
+        for wl in workloads:
+            result = calculate_fitness(wl, cal)
+            results.append(result)
+            print_result(result)
+        counts = {name: sum(1 for r in results if r["recommendation"] == name) for name, _ in RECOMMENDATIONS}
 
     print(f"{'='*60}")
-    print(f"  Reserve: {len(reserves)} | Savings Plan: {len(savings)} | On-Demand: {len(ondemand)}")
+    print(f"  Reserve: {counts['RESERVE']} | Savings Plan: {counts['SAVINGS_PLAN']} | On-Demand: {counts['ON_DEMAND']}")
     print(f"  Don't pay rack rate on predictable workloads.")
     print(f"{'='*60}")
 
     if args.output:
         with open(args.output, 'w') as f:
-            json.dump({"results": results, "scan_date": str(date.today())}, f, indent=2)
+            json.dump({"results": results, "scan_date": str(cal.as_of)}, f, indent=2)
         print(f"\n  Results written to {args.output}")
 
 
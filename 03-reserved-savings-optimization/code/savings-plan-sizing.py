@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Savings Plan Sizing — Stella Maris Governance
+FinOps Pack 03
+
+Sizes an hourly savings plan commitment from hourly eligible compute
+spend. A commitment of $c/hour at discount d covers up to c / (1 - d) of
+on-demand spend each hour, so savings at any level depend only on how
+many hours spend exceeds that line. Sorting the hourly totals once and
+taking cumulative sums gives exact savings, coverage and utilization at
+every commitment level by bisection — the whole curve in O(N log N)
+instead of re-simulating the period per level.
+
+Author: Robert Myers, MBA | Stella Maris Governance
+"""
+
+import os
+import sys
+import json
+import argparse
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from inventory import iter_resources, CountingIterator  # noqa: E402
+
+
+DEFAULT_DISCOUNT_PCT = {12: 25.0, 36: 45.0}  # Typical compute savings plan rates; pass the quoted rate when known
+CURVE_POINTS = 20
+HOURS_PER_MONTH = 730
+
+
+def _hour_ordinal(stamp: str, cache: dict) -> int:
+    """Hours since 0001-01-01 for an ISO timestamp; minutes and zones are ignored."""
+    key = stamp[:13]
+    ordinal = cache.get(key)
+    if ordinal is None:
+        day = date.fromisoformat(key[:10])
+        ordinal = cache[key] = day.toordinal() * 24 + (int(key[11:13]) if len(key) == 13 else 0)
+    return ordinal
+
+
+class HourlySpend:
+    """Total eligible on-demand spend per hour, as one array('d') from the first hour seen.
+
+    Accepts hour rows ({"hour", "cost"}) and series rows ({"start", "hourly": [...]},
+    one resource's whole period), which is far smaller than a row per hour.
+    """
+
+    def __init__(self):
+        self.base = None
+        self.totals = array("d")
+        self._cache = {}
+
+    def _reserve(self, first: int, count: int) -> int:
+        """Grow the array to cover hours [first, first + count); return first's index."""
+        if self.base is None:
+            self.base = first
+        if first < self.base:
+            self.totals = array("d", bytes(8 * (self.base - first))) + self.totals
+            self.base = first
+        end = first - self.base + count
+        if end > len(self.totals):
+            self.totals.extend(array("d", bytes(8 * (end - len(self.totals)))))
+        return first - self.base
+
+    def add(self, row: dict):
+        if "hourly" in row:
+            values = row["hourly"]
+            i = self._reserve(_hour_ordinal(row["start"], self._cache), len(values))
+            totals = self.totals
+            for j, v in enumerate(values, i):
+                totals[j] += v
+        else:
+            i = self._reserve(_hour_ordinal(row["hour"], self._cache), 1)
+            self.totals[i] += row["cost"]
+
+    @property
+    def start(self) -> datetime:
+        return datetime.combine(date.fromordinal(self.base // 24), datetime.min.time()) + timedelta(hours=self.base % 24)
+
+
+class CommitmentCurve:
+    """Exact savings plan economics at any hourly commitment over one period of hourly spend."""
+
+    def __init__(self, totals: array, discount_pct: float):
+        self.rate = 1 - discount_pct / 100          # Commitment dollars per on-demand dollar covered
+        self.hours = len(totals)
+        self.sorted = array("d", sorted(totals))
+        self.prefix = array("d", accumulate(self.sorted, initial=0.0))
+        self.on_demand = self.prefix[-1]
+
+    def _covered(self, level: float) -> float:
+        """On-demand spend covered over the period when each hour covers up to `level`."""
+        n = bisect_right(self.sorted, level)
+        return self.prefix[n] + level * (self.hours - n)
+
+    def at(self, commitment: float) -> dict:
+        """Savings, coverage and utilization for an hourly commitment of `commitment` dollars."""
+        level = commitment / self.rate
+        covered = self._covered(level)
+        cost = commitment * self.hours + (self.on_demand - covered)
+        return {
+            "hourly_commitment": round(commitment, 4),
+            "savings": round(self.on_demand - cost, 2),
+            "savings_pct": round((self.on_demand - cost) / self.on_demand * 100, 2) if self.on_demand else 0.0,
+            "coverage_pct": round(covered / self.on_demand * 100, 2) if self.on_demand else 0.0,
+            "utilization_pct": round(covered / (level * self.hours) * 100, 2) if level > 0 else 100.0
+        }
+
+    def optimum(self) -> dict:
+        """The savings-maximizing commitment.
+
+        Savings are piecewise linear in the covered level with breakpoints at
+        the hourly totals, so the optimum is one of them: one pass over the
+        sorted totals and prefix sums scores every breakpoint.
+        """
+        totals, prefix, n, rate = self.sorted, self.prefix, self.hours, self.rate
+        best_level, best_savings = 0.0, 0.0
+        for j in range(n):
+            level = totals[j]
+            savings = prefix[j + 1] + level * (n - j - 1) - rate * level * n
+            if savings > best_savings:
+                best_level, best_savings = level, savings
+        return self.at(best_level * rate)
+
+    def curve(self, points: int = CURVE_POINTS) -> list:
+        """Evenly spaced commitment levels from zero to the peak hour's full coverage."""
+        if not self.hours or points < 1:
+            return []
+        top = self.sorted[-1] * self.rate
+        return [self.at(top * k / points) for k in range(points + 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Stella Maris Savings Plan Sizing (FinOps Pack 03)"
+    )
+    parser.add_argument("--usage", "-u", required=True,
+                        help="Hourly eligible spend JSON or NDJSON ({\"hourly_usage\": [...]})")
+    parser.add_argument("--term", type=int, choices=sorted(DEFAULT_DISCOUNT_PCT), default=12,
+                        help="Commitment term in months (default: 12)")
+    parser.add_argument("--discount-pct", type=float, default=None,
+                        help="Savings plan discount vs on-demand (default: 25 for 12 months, 45 for 36)")
+    parser.add_argument("--curve-points", type=int, default=CURVE_POINTS,
+                        help=f"Commitment levels in the exported curve (default: {CURVE_POINTS})")
+    parser.add_argument("--output", "-o", default=None, help="Output JSON")
+    args = parser.parse_args()
+    discount = args.discount_pct if args.discount_pct is not None else DEFAULT_DISCOUNT_PCT[args.term]
+    if not 0 < discount < 100:
+        parser.error("--discount-pct must be between 0 and 100")
+
+    rows = CountingIterator(iter_resources(args.usage, key="hourly_usage", normalize=False))
+    spend = HourlySpend()
+    for row in rows:
+        spend.add(row)
+    curve = CommitmentCurve(spend.totals, discount)
+    best = curve.optimum()
+    period_scale = HOURS_PER_MONTH * 12 / curve.hours if curve.hours else 0.0
+
+    print(f"{'='*60}")
+    print(f"  SAVINGS PLAN SIZING")
+    print(f"  Date: {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}")
+    print(f"  Usage rows: {rows.count} | Hours: {curve.hours}"
+          + (f" from {spend.start:%Y-%m-%d %H:00}" if curve.hours else ""))
+    print(f"  Term: {args.term} months | Discount: {discount}%")
+    print(f"  Eligible on-demand spend: ${curve.on_demand:,.2f}")
+    print(f"{'='*60}")
+    print()
+
+    print(f"  {'Commit $/h':>11} {'Savings':>14} {'Savings %':>10} {'Coverage':>9} {'Utilization':>12}")
+    for point in sorted(curve.curve(args.curve_points) + [best], key=lambda p: p["hourly_commitment"]):
+        marker = " ◀ optimal" if point is best else ""
+        print(f"  {point['hourly_commitment']:>11,.2f} {'$' + format(point['savings'], ',.2f'):>14} {point['savings_pct']:>9}% "
+              f"{point['coverage_pct']:>8}% {point['utilization_pct']:>11}%{marker}")
+    print()
+
+    print(f"{'='*60}")
+    print(f"  ✅ Optimal commitment: ${best['hourly_commitment']:,.2f}/hour "
+          f"(${best['hourly_commitment'] * HOURS_PER_MONTH:,.2f}/month)")
+    print(f"  Savings: ${best['savings']:,.2f} over the period ({best['savings_pct']}%) | "
+          f"~${best['savings'] * period_scale:,.2f}/year")
+    print(f"  Coverage: {best['coverage_pct']}% | Utilization: {best['utilization_pct']}%")
+    print(f"  Commit to the floor, not the average.")
+    print(f"{'='*60}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                "term_months": args.term,
+                "discount_pct": discount,
+                "hours": curve.hours,
+                "period_start": spend.start.isoformat() if curve.hours else None,
+                "on_demand_spend": round(curve.on_demand, 2),
+                "optimal": best,
+                "curve": curve.curve(args.curve_points),
+                "scan_date": datetime.now().strftime("%Y-%m-%d")
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
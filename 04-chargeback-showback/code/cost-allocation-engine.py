@@ -13,11 +13,17 @@ Zero leakage: every dollar in = every dollar out.
 Author: Robert Myers, MBA | Stella Maris Governance
 """
 
+import os
+import sys
 import json
 import argparse
 from datetime import datetime
 from collections import defaultdict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from inventory import iter_resources  # noqa: E402
+from hierarchy import with_effective_tags  # noqa: E402
+
 
 def allocate_direct(resources: list) -> dict:
     """Layer 1: Attribute costs to tagged entities."""
@@ -160,16 +166,19 @@ def main():
     parser.add_argument("--shared", "-s", required=True, help="Shared resources JSON")
     parser.add_argument("--rules", required=True, help="Shared cost rules JSON")
     parser.add_argument("--output", "-o", default=None, help="Output allocation JSON")
+    parser.add_argument("--effective-tags", nargs="?", const="", default=None, metavar="CONTAINERS",
+                        help="Apply tag inheritance first; parents from a CONTAINERS export or the inventory itself")
     args = parser.parse_args()
 
-    with open(args.resources) as f:
-        res_data = json.load(f)
     with open(args.shared) as f:
         shared_data = json.load(f)
     with open(args.rules) as f:
         rules_data = json.load(f)
 
-    resources = res_data.get("resources", [])
+    if args.effective_tags is None:
+        resources = list(iter_resources(args.resources))
+    else:
+        resources = list(with_effective_tags(args.resources, args.effective_tags or None))
     shared_resources = shared_data.get("shared_resources", [])
     rules = rules_data.get("rules", [])
 
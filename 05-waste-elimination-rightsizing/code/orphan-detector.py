@@ -10,12 +10,18 @@ aged snapshots, empty resource groups.
 Author: Robert Myers, MBA | Stella Maris Governance
 """
 
+import os
+import sys
 import json
 import argparse
 from datetime import datetime, date
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from inventory import iter_resources, CountingIterator  # noqa: E402
+from hierarchy import with_effective_tags  # noqa: E402
 
-def detect_orphans(resources: list) -> list:
+
+def detect_orphans(resources) -> list:
     """Find orphaned resources across all types."""
     orphans = []
     today = date.today()
@@ -75,19 +81,22 @@ def main():
     parser = argparse.ArgumentParser(
         description="Stella Maris Orphan Detector (FinOps Pack 05)"
     )
-    parser.add_argument("--resources", "-r", required=True, help="Resources JSON")
+    parser.add_argument("--resources", "-r", required=True, help="Resources JSON or NDJSON")
     parser.add_argument("--output", "-o", default=None, help="Output JSON")
+    parser.add_argument("--effective-tags", nargs="?", const="", default=None, metavar="CONTAINERS",
+                        help="Apply tag inheritance first; parents from a CONTAINERS export or the inventory itself")
     args = parser.parse_args()
 
-    with open(args.resources) as f:
-        data = json.load(f)
-
-    orphans = detect_orphans(data.get("resources", []))
+    if args.effective_tags is None:
+        resources = CountingIterator(iter_resources(args.resources))
+    else:
+        resources = CountingIterator(with_effective_tags(args.resources, args.effective_tags or None))
+    orphans = detect_orphans(resources)
 
     print(f"{'='*60}")
     print(f"  ORPHAN RESOURCE DETECTION")
     print(f"  Date: {datetime.now().strftime('%Y-%m-%d %H:%M UTC')}")
-    print(f"  Resources scanned: {len(data.get('resources', []))}")
+    print(f"  Resources scanned: {resources.count}")
     print(f"  Orphans found: {len(orphans)}")
     print(f"{'='*60}")
     print()
@@ -9,10 +9,16 @@ and recommends target SKU. Sizes for sustained peak, not average.
 Author: Robert Myers, MBA | Stella Maris Governance
 """
 
+import os
+import sys
 import json
 import argparse
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from inventory import iter_resources  # noqa: E402
+from hierarchy import with_effective_tags  # noqa: E402
+
 
 # Azure VM SKU reference (simplified)
 VM_SKUS = {
@@ -86,14 +92,18 @@ def main():
     parser = argparse.ArgumentParser(
         description="Stella Maris Right-Sizing Analyzer (FinOps Pack 05)"
     )
-    parser.add_argument("--resources", "-r", required=True, help="VM resources JSON")
+    parser.add_argument("--resources", "-r", required=True, help="VM resources JSON or NDJSON")
     parser.add_argument("--output", "-o", default=None, help="Output JSON")
+    parser.add_argument("--effective-tags", nargs="?", const="", default=None, metavar="CONTAINERS",
+                        help="Apply tag inheritance first; parents from a CONTAINERS export or the inventory itself")
     args = parser.parse_args()
 
-    with open(args.resources) as f:
-        data = json.load(f)
+    if args.effective_tags is None:
+        resources = iter_resources(args.resources)
+    else:
+        resources = with_effective_tags(args.resources, args.effective_tags or None)
 
-    vms = [r for r in data.get("resources", [])
+    vms = [r for r in resources
            if r.get("type") == "Microsoft.Compute/virtualMachines"]
 
     print(f"{'='*60}")
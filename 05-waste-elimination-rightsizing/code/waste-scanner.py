@@ -14,11 +14,18 @@ Scans 6 categories of cloud waste:
 Author: Robert Myers, MBA | Stella Maris Governance
 """
 
+import os
+import sys
 import json
 import argparse
-from datetime import datetime, date, timedelta
+from datetime import datetime
 from collections import defaultdict
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from inventory import iter_resources  # noqa: E402
+from hierarchy import with_effective_tags  # noqa: E402
+from calendar_table import Calendar, add_calendar_args, calendar_from_args  # noqa: E402
+
 
 # Configurable thresholds
 THRESHOLDS = {
@@ -31,224 +38,248 @@ THRESHOLDS = {
 }
 
 
-def scan_idle(resources: list, thresholds: dict) -> list:
-    """Category 1: Find resources with near-zero utilization."""
-    findings = []
-    for r in resources:
-        metrics = r.get("metrics", {})
-        avg_cpu = metrics.get("avg_cpu_pct", 100)
-        avg_days = metrics.get("low_util_days", 0)
-        connections = metrics.get("network_connections_30d", -1)
+# Orphan parent-field checks by resource type
+ORPHAN_TYPES = {
+    "Microsoft.Compute/disks": {"parent_field": "attached_vm", "label": "Unattached disk"},
+    "Microsoft.Network/publicIPAddresses": {"parent_field": "attached_nic", "label": "Unattached public IP"},
+    "Microsoft.Network/networkInterfaces": {"parent_field": "attached_vm", "label": "Unattached NIC"},
+    "Microsoft.Network/networkSecurityGroups": {"parent_field": "attached_nic_count", "label": "Unattached NSG"},
+    "Microsoft.Compute/snapshots": {"parent_field": "age_days", "label": "Aged snapshot"}
+}
+
 
-        if avg_cpu < thresholds.get("idle_cpu_pct", 5) and avg_days >= thresholds.get("idle_days", 14):
+def _numbered(prefix: str, findings: list) -> list:
+    """Assign sequential finding IDs within a category."""
+    return [{"finding_id": f"{prefix}-{i:03d}", **f} for i, f in enumerate(findings, 1)]
+
+
+def check_idle(r: dict, thresholds: dict) -> list:
+    """Category 1 check for a single resource."""
+    metrics = r.get("metrics", {})
+    avg_cpu = metrics.get("avg_cpu_pct", 100)
+    avg_days = metrics.get("low_util_days", 0)
+    connections = metrics.get("network_connections_30d", -1)
+
+    if avg_cpu < thresholds.get("idle_cpu_pct", 5) and avg_days >= thresholds.get("idle_days", 14):
+        return [{
+            "category": "idle",
+            "resource": r.get("name", "Unknown"),
+            "resource_id": r.get("id", ""),
+            "resource_type": r.get("type", ""),
+            "avg_cpu": avg_cpu,
+            "idle_days": avg_days,
+            "connections_30d": connections,
+            "monthly_cost": r.get("monthly_cost", 0),
+            "tags": r.get("tags", {}),
+            "recommended_disposition": "decommission" if connections == 0 else "investigate",
+            "reason": f"CPU avg {avg_cpu}% for {avg_days} days"
+                      + (f", 0 network connections" if connections == 0 else "")
+        }]
+    return []
+
+
+def check_rightsizing(r: dict, thresholds: dict) -> list:
+    """Category 2 check for a single resource."""
+    metrics = r.get("metrics", {})
+    p95_cpu = metrics.get("p95_cpu_pct", 100)
+    p95_mem = metrics.get("p95_memory_pct", 100)
+    avg_cpu = metrics.get("avg_cpu_pct", 100)
+    current_sku = r.get("sku", "")
+    recommended_sku = r.get("recommended_sku", "")
+
+    threshold = thresholds.get("overprovisioned_p95_pct", 40)
+
+    if p95_cpu < threshold and recommended_sku and recommended_sku != current_sku:
+        savings = r.get("monthly_cost", 0) - r.get("recommended_cost", r.get("monthly_cost", 0))
+        env = r.get("tags", {}).get("Environment", "unknown")
+
+        return [{
+            "category": "rightsizing",
+            "resource": r.get("name", "Unknown"),
+            "resource_id": r.get("id", ""),
+            "resource_type": r.get("type", ""),
+            "current_sku": current_sku,
+            "recommended_sku": recommended_sku,
+            "p95_cpu": p95_cpu,
+            "p95_memory": p95_mem,
+            "avg_cpu": avg_cpu,
+            "monthly_cost": r.get("monthly_cost", 0),
+            "recommended_cost": r.get("recommended_cost", 0),
+            "monthly_savings": round(savings, 2),
+            "recommended_disposition": "rightsize" if env != "production" else "defer",
+            "reason": f"P95 CPU {p95_cpu}%, current {current_sku} → {recommended_sku}"
+                      + (f" (PRODUCTION — defer)" if env == "production" else "")
+        }]
+    return []
+
+
+def check_orphan(r: dict, thresholds: dict) -> list:
+    """Category 3 check for a single resource."""
+    rtype = r.get("type", "")
+    if rtype not in ORPHAN_TYPES:
+        return []
+
+    config = ORPHAN_TYPES[rtype]
+    parent_value = r.get(config["parent_field"])
+
+    is_orphan = False
+    if rtype == "Microsoft.Compute/snapshots":
+        age = r.get("age_days", 0)
+        if age > thresholds.get("orphan_snapshot_days", 90):
+            is_orphan = True
+    elif rtype == "Microsoft.Network/networkSecurityGroups":
+        if parent_value == 0:
+            is_orphan = True
+    elif not parent_value:
+        is_orphan = True
+
+    if is_orphan:
+        return [{
+            "category": "orphan",
+            "resource": r.get("name", "Unknown"),
+            "resource_id": r.get("id", ""),
+            "resource_type": rtype,
+            "orphan_type": config["label"],
+            "monthly_cost": r.get("monthly_cost", 0),
+            "created_date": r.get("created_date", "unknown"),
+            "tags": r.get("tags", {}),
+            "recommended_disposition": "decommission",
+            "reason": config["label"] + (" — " + f"{r.get('age_days', 0)} days old" if rtype == "Microsoft.Compute/snapshots" else "")
+        }]
+    return []
+
+
+def check_schedule(r: dict, thresholds: dict) -> list:
+    """Category 4 check for a single resource."""
+    target_envs = thresholds.get("schedule_env", ["development", "test", "sandbox"])
+    env = r.get("tags", {}).get("Environment", "").lower()
+    if env not in target_envs:
+        return []
+
+    rtype = r.get("type", "")
+    if rtype not in ["Microsoft.Compute/virtualMachines", "Microsoft.Web/serverfarms",
+                     "Microsoft.Sql/servers/databases"]:
+        return []
+
+    hours_running = r.get("metrics", {}).get("hours_per_month", 730)
+    if hours_running > 400:  # More than business hours
+        business_hours = 220  # 8am-6pm, Mon-Fri
+        waste_hours = hours_running - business_hours
+        waste_pct = round((waste_hours / hours_running) * 100)
+        potential_savings = round(r.get("monthly_cost", 0) * (waste_pct / 100), 2)
+
+        return [{
+            "category": "schedule",
+            "resource": r.get("name", "Unknown"),
+            "resource_id": r.get("id", ""),
+            "resource_type": rtype,
+            "environment": env,
+            "hours_running": hours_running,
+            "recommended_hours": business_hours,
+            "waste_hours": waste_hours,
+            "waste_pct": waste_pct,
+            "monthly_cost": r.get("monthly_cost", 0),
+            "potential_savings": potential_savings,
+            "recommended_disposition": "schedule",
+            "reason": f"{env} resource running {hours_running}hrs/month, recommend {business_hours}hrs"
+        }]
+    return []
+
+
+def check_aged(r: dict, thresholds: dict, cal: Calendar = None) -> list:
+    """Category 5 check for a single resource, judged as of `cal.as_of`."""
+    cal = cal or Calendar()
+    findings = []
+    tags = r.get("tags", {})
+
+    # Check ExpiryDate
+    expiry = tags.get("ExpiryDate", "")
+    if expiry:
+        exp_day = cal.try_day(expiry)
+        if exp_day and exp_day.ordinal < cal.as_of_ordinal:
+            days_past = cal.days_ago(exp_day)
             findings.append({
-                "finding_id": f"WASTE-IDLE-{len(findings)+1:03d}",
-                "category": "idle",
+                "category": "aged",
+                "subcategory": "expired",
                 "resource": r.get("name", "Unknown"),
                 "resource_id": r.get("id", ""),
-                "resource_type": r.get("type", ""),
-                "avg_cpu": avg_cpu,
-                "idle_days": avg_days,
-                "connections_30d": connections,
+                "expiry_date": expiry,
+                "days_past_expiry": days_past,
                 "monthly_cost": r.get("monthly_cost", 0),
-                "tags": r.get("tags", {}),
-                "recommended_disposition": "decommission" if connections == 0 else "investigate",
-                "reason": f"CPU avg {avg_cpu}% for {avg_days} days"
-                          + (f", 0 network connections" if connections == 0 else "")
+                "recommended_disposition": "decommission",
+                "reason": f"ExpiryDate {expiry} — {days_past} days past"
             })
-    return findings
-
-
-def scan_rightsizing(resources: list, thresholds: dict) -> list:
-    """Category 2: Find over-provisioned resources."""
-    findings = []
-    for r in resources:
-        metrics = r.get("metrics", {})
-        p95_cpu = metrics.get("p95_cpu_pct", 100)
-        p95_mem = metrics.get("p95_memory_pct", 100)
-        avg_cpu = metrics.get("avg_cpu_pct", 100)
-        current_sku = r.get("sku", "")
-        recommended_sku = r.get("recommended_sku", "")
-
-        threshold = thresholds.get("overprovisioned_p95_pct", 40)
-
-        if p95_cpu < threshold and recommended_sku and recommended_sku != current_sku:
-            savings = r.get("monthly_cost", 0) - r.get("recommended_cost", r.get("monthly_cost", 0))
-            env = r.get("tags", {}).get("Environment", "unknown")
 
+    # Check ReviewDate
+    review = tags.get("ReviewDate", "")
+    if review:
+        rev_day = cal.try_day(review)
+        if rev_day and rev_day.ordinal < cal.as_of_ordinal:
+            days_overdue = cal.days_ago(rev_day)
             findings.append({
-                "finding_id": f"WASTE-RSIZE-{len(findings)+1:03d}",
-                "category": "rightsizing",
+                "category": "aged",
+                "subcategory": "review_overdue",
                 "resource": r.get("name", "Unknown"),
                 "resource_id": r.get("id", ""),
-                "resource_type": r.get("type", ""),
-                "current_sku": current_sku,
-                "recommended_sku": recommended_sku,
-                "p95_cpu": p95_cpu,
-                "p95_memory": p95_mem,
-                "avg_cpu": avg_cpu,
+                "review_date": review,
+                "days_overdue": days_overdue,
                 "monthly_cost": r.get("monthly_cost", 0),
-                "recommended_cost": r.get("recommended_cost", 0),
-                "monthly_savings": round(savings, 2),
-                "recommended_disposition": "rightsize" if env != "production" else "defer",
-                "reason": f"P95 CPU {p95_cpu}%, current {current_sku} → {recommended_sku}"
-                          + (f" (PRODUCTION — defer)" if env == "production" else "")
+                "recommended_disposition": "review",
+                "reason": f"ReviewDate {review} — {days_overdue} days overdue"
             })
+
     return findings
 
 
-def scan_orphans(resources: list, thresholds: dict) -> list:
-    """Category 3: Find resources without parents."""
-    findings = []
-    orphan_types = {
-        "Microsoft.Compute/disks": {"parent_field": "attached_vm", "label": "Unattached disk"},
-        "Microsoft.Network/publicIPAddresses": {"parent_field": "attached_nic", "label": "Unattached public IP"},
-        "Microsoft.Network/networkInterfaces": {"parent_field": "attached_vm", "label": "Unattached NIC"},
-        "Microsoft.Network/networkSecurityGroups": {"parent_field": "attached_nic_count", "label": "Unattached NSG"},
-        "Microsoft.Compute/snapshots": {"parent_field": "age_days", "label": "Aged snapshot"}
-    }
+def scan_idle(resources, thresholds: dict) -> list:
+    """Category 1: Find resources with near-zero utilization."""
+    return _numbered("WASTE-IDLE", [f for r in resources for f in check_idle(r, thresholds)])
 
-    for r in resources:
-        rtype = r.get("type", "")
-        if rtype not in orphan_types:
-            continue
-
-        config = orphan_types[rtype]
-        parent_value = r.get(config["parent_field"])
-
-        is_orphan = False
-        if rtype == "Microsoft.Compute/snapshots":
-            age = r.get("age_days", 0)
-            if age > thresholds.get("orphan_snapshot_days", 90):
-                is_orphan = True
-        elif rtype == "Microsoft.Network/networkSecurityGroups":
-            if parent_value == 0:
-                is_orphan = True
-        elif not parent_value:
-            is_orphan = True
 
-        if is_orphan:
-            findings.append({
-                "finding_id": f"WASTE-ORPHAN-{len(findings)+1:03d}",
-                "category": "orphan",
-                "resource": r.get("name", "Unknown"),
-                "resource_id": r.get("id", ""),
-                "resource_type": rtype,
-                "orphan_type": config["label"],
-                "monthly_cost": r.get("monthly_cost", 0),
-                "created_date": r.get("created_date", "unknown"),
-                "tags": r.get("tags", {}),
-                "recommended_disposition": "decommission",
-                "reason": config["label"] + (" — " + f"{r.get('age_days', 0)} days old" if rtype == "Microsoft.Compute/snapshots" else "")
-            })
-    return findings
+def scan_rightsizing(resources, thresholds: dict) -> list:
+    """Category 2: Find over-provisioned resources."""
+    return _numbered("WASTE-RSIZE", [f for r in resources for f in check_rightsizing(r, thresholds)])
 
 
-def scan_schedule(resources: list, thresholds: dict) -> list:
-    """Category 4: Find resources running 24/7 that shouldn't be."""
-    findings = []
-    target_envs = thresholds.get("schedule_env", ["development", "test", "sandbox"])
+def scan_orphans(resources, thresholds: dict) -> list:
+    """Category 3: Find resources without parents."""
+    return _numbered("WASTE-ORPHAN", [f for r in resources for f in check_orphan(r, thresholds)])
 
-    for r in resources:
-        env = r.get("tags", {}).get("Environment", "").lower()
-        if env not in target_envs:
-            continue
-
-        rtype = r.get("type", "")
-        if rtype not in ["Microsoft.Compute/virtualMachines", "Microsoft.Web/serverfarms",
-                         "Microsoft.Sql/servers/databases"]:
-            continue
-
-        hours_running = r.get("metrics", {}).get("hours_per_month", 730)
-        if hours_running > 400:  # More than business hours
-            business_hours = 220  # 8am-6pm, Mon-Fri
-            waste_hours = hours_running - business_hours
-            waste_pct = round((waste_hours / hours_running) * 100)
-            potential_savings = round(r.get("monthly_cost", 0) * (waste_pct / 100), 2)
 
-            findings.append({
-                "finding_id": f"WASTE-SCHED-{len(findings)+1:03d}",
-                "category": "schedule",
-                "resource": r.get("name", "Unknown"),
-                "resource_id": r.get("id", ""),
-                "resource_type": rtype,
-                "environment": env,
-                "hours_running": hours_running,
-                "recommended_hours": business_hours,
-                "waste_hours": waste_hours,
-                "waste_pct": waste_pct,
-                "monthly_cost": r.get("monthly_cost", 0),
-                "potential_savings": potential_savings,
-                "recommended_disposition": "schedule",
-                "reason": f"{env} resource running {hours_running}hrs/month, recommend {business_hours}hrs"
-            })
-    return findings
+def scan_schedule(resources, thresholds: dict) -> list:
+    """Category 4: Find resources running 24/7 that shouldn't be."""
+    return _numbered("WASTE-SCHED", [f for r in resources for f in check_schedule(r, thresholds)])
 
 
-def scan_aged(resources: list, thresholds: dict) -> list:
+def scan_aged(resources, thresholds: dict, cal: Calendar = None) -> list:
     """Category 5: Find resources past expiry or review date."""
-    findings = []
-    today = date.today()
-
-    for r in resources:
-        tags = r.get("tags", {})
-
-        # Check ExpiryDate
-        expiry = tags.get("ExpiryDate", "")
-        if expiry:
-            try:
-                exp_date = date.fromisoformat(expiry)
-                if exp_date < today:
-                    days_past = (today - exp_date).days
-                    findings.append({
-                        "finding_id": f"WASTE-AGED-{len(findings)+1:03d}",
-                        "category": "aged",
-                        "subcategory": "expired",
-                        "resource": r.get("name", "Unknown"),
-                        "resource_id": r.get("id", ""),
-                        "expiry_date": expiry,
-                        "days_past_expiry": days_past,
-                        "monthly_cost": r.get("monthly_cost", 0),
-                        "recommended_disposition": "decommission",
-                        "reason": f"ExpiryDate {expiry} — {days_past} days past"
-                    })
-            except ValueError:
-                pass
-
-        # Check ReviewDate
-        review = tags.get("ReviewDate", "")
-        if review:
-            try:
-                rev_date = date.fromisoformat(review)
-                if rev_date < today:
-                    days_overdue = (today - rev_date).days
-                    findings.append({
-                        "finding_id": f"WASTE-AGED-{len(findings)+1:03d}",
-                        "category": "aged",
-                        "subcategory": "review_overdue",
-                        "resource": r.get("name", "Unknown"),
-                        "resource_id": r.get("id", ""),
-                        "review_date": review,
-                        "days_overdue": days_overdue,
-                        "monthly_cost": r.get("monthly_cost", 0),
-                        "recommended_disposition": "review",
-                        "reason": f"ReviewDate {review} — {days_overdue} days overdue"
-                    })
-            except ValueError:
-                pass
+    cal = cal or Calendar()
+    return _numbered("WASTE-AGED", [f for r in resources for f in check_aged(r, thresholds, cal)])
 
-    return findings
 
+def run_full_scan(resources, thresholds: dict = None, cal: Calendar = None) -> dict:
+    """Run all scan categories in a single pass over the inventory.
 
-def run_full_scan(resources: list, thresholds: dict = None) -> dict:
-    """Run all 6 scan categories."""
+    `resources` may be any iterable, including a streaming reader.
+    """
     t = thresholds or THRESHOLDS
+    cal = cal or Calendar()
 
-    idle = scan_idle(resources, t)
-    rightsizing = scan_rightsizing(resources, t)
-    orphans = scan_orphans(resources, t)
-    schedule = scan_schedule(resources, t)
-    aged = scan_aged(resources, t)
+    idle, rightsizing, orphans, schedule, aged = [], [], [], [], []
+    scanned = 0
+    for r in resources:
+        scanned += 1
+        idle.extend(check_idle(r, t))
+        rightsizing.extend(check_rightsizing(r, t))
+        orphans.extend(check_orphan(r, t))
+        schedule.extend(check_schedule(r, t))
+        aged.extend(check_aged(r, t, cal))
+
+    idle = _numbered("WASTE-IDLE", idle)
+    rightsizing = _numbered("WASTE-RSIZE", rightsizing)
+    orphans = _numbered("WASTE-ORPHAN", orphans)
+    schedule = _numbered("WASTE-SCHED", schedule)
+    aged = _numbered("WASTE-AGED", aged)
 
     all_findings = idle + rightsizing + orphans + schedule + aged
 
@@ -258,7 +289,8 @@ def run_full_scan(resources: list, thresholds: dict = None) -> dict:
 
     return {
         "scan_date": datetime.now().strftime("%Y-%m-%d %H:%M UTC"),
-        "resources_scanned": len(resources),
+        "as_of": str(cal.as_of),
+        "resources_scanned": scanned,
         "total_findings": len(all_findings),
         "by_category": {
             "idle": {"count": len(idle), "monthly_cost": sum(f["monthly_cost"] for f in idle)},
@@ -281,25 +313,31 @@ def main():
     parser = argparse.ArgumentParser(
         description="Stella Maris Waste Scanner (FinOps Pack 05)"
     )
-    parser.add_argument("--resources", "-r", required=True, help="Resources JSON")
+    parser.add_argument("--resources", "-r", required=True, help="Resources JSON or NDJSON")
     parser.add_argument("--output", "-o", default=None, help="Output findings JSON")
     parser.add_argument("--thresholds", "-t", default=None, help="Custom thresholds JSON")
+    parser.add_argument("--effective-tags", nargs="?", const="", default=None, metavar="CONTAINERS",
+                        help="Apply tag inheritance first; parents from a CONTAINERS export or the inventory itself")
+    add_calendar_args(parser)
     args = parser.parse_args()
 
-    with open(args.resources) as f:
-        data = json.load(f)
-    resources = data.get("resources", [])
+    if args.effective_tags is None:
+        resources = iter_resources(args.resources)
+    else:
+        resources = with_effective_tags(args.resources, args.effective_tags or None)
 
     thresholds = THRESHOLDS
     if args.thresholds:
         with open(args.thresholds) as f:
             thresholds = json.load(f)
 
-    results = run_full_scan(resources, thresholds)
+    results = run_full_scan(resources, thresholds, calendar_from_args(args))
 
     print(f"{'='*60}")
     print(f"  WASTE SCAN RESULTS")
     print(f"  Date: {results['scan_date']}")
+    if args.as_of:
+        print(f"  As of: {results['as_of']}")
     print(f"  Resources scanned: {results['resources_scanned']}")
     print(f"  Findings: {results['total_findings']}")
     print(f"{'='*60}")
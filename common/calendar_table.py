@@ -0,0 +1,108 @@
+"""
+Calendar Table — Stella Maris Governance
+Shared by all FinOps packs.
+
+Date-keyed scans see the same few hundred date strings millions of times.
+A Calendar parses each distinct string once and keeps the fields scans
+key on: day ordinal, weekday, ISO week, month and holiday name. It also
+carries the run's as-of date, so a backfill over a historical snapshot
+judges "today" as the snapshot date instead of the wall clock.
+"""
+
+import json
+from datetime import date, timedelta
+
+
+class Day:
+    """One parsed calendar day."""
+
+    __slots__ = ("date", "ordinal", "weekday", "iso_year", "iso_week", "month", "holiday")
+
+    def __init__(self, d: date, holiday: str = ""):
+        iso = d.isocalendar()
+        self.date = d
+        self.ordinal = d.toordinal()
+        self.weekday = d.weekday()
+        self.iso_year = iso[0]
+        self.iso_week = iso[1]
+        self.month = f"{d.year:04d}-{d.month:02d}"
+        self.holiday = holiday
+
+    @property
+    def is_weekend(self) -> bool:
+        return self.weekday >= 5
+
+    @property
+    def is_business_day(self) -> bool:
+        return self.weekday < 5 and not self.holiday
+
+
+class Calendar:
+    """Parse-once date table plus the as-of date and holiday calendar for a run."""
+
+    def __init__(self, as_of: date = None, holidays: dict = None):
+        self.as_of = as_of or date.today()
+        self.as_of_ordinal = self.as_of.toordinal()
+        self.holidays = dict(holidays or {})
+        self._days = {}
+
+    def day(self, value: str) -> Day:
+        """Parsed day for an ISO date string. Raises ValueError if unparseable."""
+        d = self._days.get(value)
+        if d is None:
+            d = self.try_day(value)
+            if d is None:
+                raise ValueError(f"Invalid isoformat date: {value!r}")
+        return d
+
+    def try_day(self, value: str):
+        """Parsed day, or None for an empty or unparseable string (misses are cached too)."""
+        if value in self._days:
+            return self._days[value]
+        try:
+            parsed = date.fromisoformat(value)
+        except (TypeError, ValueError):
+            d = None
+        else:
+            d = Day(parsed, self.holidays.get(parsed.isoformat(), ""))
+        self._days[value] = d
+        return d
+
+    def days_ago(self, day: Day) -> int:
+        """Days from `day` to the as-of date (positive when `day` is in the past)."""
+        return self.as_of_ordinal - day.ordinal
+
+    def months_until(self, day: Day) -> int:
+        """Calendar months from the as-of month to `day`'s month."""
+        return (day.date.year - self.as_of.year) * 12 + (day.date.month - self.as_of.month)
+
+    def cutoff(self, days: int) -> int:
+        """Ordinal of the day `days` before the as-of date."""
+        return (self.as_of - timedelta(days=days)).toordinal()
+
+
+def load_holidays(path: str) -> dict:
+    """Map ISO date → holiday name from a holiday calendar JSON.
+
+    Accepts {"holidays": [{"date": ..., "name": ...}, ...]} or a plain
+    {"YYYY-MM-DD": "name"} object.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    entries = data.get("holidays", data) if isinstance(data, dict) else data
+    if isinstance(entries, dict):
+        entries = [{"date": k, "name": v} for k, v in entries.items() if not k.startswith("_")]
+    return {date.fromisoformat(e["date"]).isoformat(): e.get("name") or "Holiday" for e in entries}
+
+
+def add_calendar_args(parser, holidays: bool = False):
+    """Add --as-of (and optionally --holidays) to a script's argument parser."""
+    parser.add_argument("--as-of", type=date.fromisoformat, default=None, metavar="YYYY-MM-DD",
+                        help="Judge dates as of this day instead of today (reproducible backfills)")
+    if holidays:
+        parser.add_argument("--holidays", default=None, help="Holiday calendar JSON (holidays count as non-working days)")
+
+
+def calendar_from_args(args) -> Calendar:
+    holidays_path = getattr(args, "holidays", None)
+    return Calendar(args.as_of, load_holidays(holidays_path) if holidays_path else None)
@@ -0,0 +1,158 @@
+"""
+Resource Hierarchy — Stella Maris Governance
+Shared by all FinOps packs.
+
+Computes effective tags: the tags a resource carries once Azure Policy
+tag inheritance (Pack 01 `tag-policy-inherit.json`) has run. Parents are
+resolved from the resource ID (subscription → resource group → resource),
+and each resource group's inheritable tags are merged once and cached,
+so a full inventory costs one linear pass with no per-resource parent scans.
+"""
+
+import os
+import re
+import json
+
+from inventory import iter_resources
+
+
+INHERIT_POLICY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                              "01-cost-governance-tagging", "code", "tag-policy-inherit.json")
+
+RESOURCE_GROUP_TYPE = "microsoft.resources/resourcegroups"
+SUBSCRIPTION_TYPE = "microsoft.resources/subscriptions"
+
+_INHERIT_VALUE = re.compile(r"^\[(?P<scope>resourceGroup|subscription)\(\)\.tags\['(?P<tag>[^']+)'\]\]$",
+                            re.IGNORECASE)
+_TAG_FIELD = re.compile(r"^tags\['(?P<tag>[^']+)'\]$", re.IGNORECASE)
+
+
+def parse_resource_id(resource_id: str) -> tuple:
+    """(subscription, resource group) from an Azure resource ID, lower-cased.
+
+    Either element is "" when the ID does not reach that level.
+    """
+    parts = resource_id.lower().split("/")
+    sub = rg = ""
+    for i in range(len(parts) - 1):
+        if parts[i] == "subscriptions" and not sub:
+            sub = parts[i + 1]
+        elif parts[i] == "resourcegroups" and not rg:
+            rg = parts[i + 1]
+            break
+    return sub, rg
+
+
+def inherited_tags_from_policy(path: str = INHERIT_POLICY) -> dict:
+    """Map tag key → source scope ("resourceGroup" or "subscription") from a modify policy."""
+    with open(path) as f:
+        definition = json.load(f)
+    props = definition.get("properties", definition)
+    operations = props["policyRule"]["then"].get("details", {}).get("operations", [])
+
+    inherited = {}
+    for op in operations:
+        field = _TAG_FIELD.match(op.get("field", ""))
+        value = _INHERIT_VALUE.match(str(op.get("value", "")))
+        if field and value:
+            inherited[field.group("tag")] = value.group("scope")
+    return inherited
+
+
+class HierarchyIndex:
+    """Subscription and resource group tags, keyed by the IDs parsed from child resources."""
+
+    def __init__(self, inherited: dict = None):
+        self.inherited = inherited_tags_from_policy() if inherited is None else dict(inherited)
+        self._sub_tags = {}
+        self._rg_tags = {}
+        self._cache = {}
+
+    @staticmethod
+    def is_container(record: dict) -> bool:
+        return record.get("type", "").lower() in (RESOURCE_GROUP_TYPE, SUBSCRIPTION_TYPE)
+
+    def add_container(self, record: dict):
+        """Register a resource group or subscription record. Other records are ignored."""
+        rtype = record.get("type", "").lower()
+        tags = record.get("tags") or {}
+        if rtype == SUBSCRIPTION_TYPE:
+            sub = (record.get("subscriptionId") or parse_resource_id(record.get("id", ""))[0]).lower()
+            self._sub_tags[sub] = tags
+        elif rtype == RESOURCE_GROUP_TYPE:
+            sub, rg = parse_resource_id(record.get("id", ""))
+            sub = (record.get("subscriptionId") or sub).lower()
+            self._rg_tags[(sub, rg or record.get("name", "").lower())] = tags
+        else:
+            return
+        self._cache.clear()
+
+    @classmethod
+    def from_containers(cls, records, inherited: dict = None) -> "HierarchyIndex":
+        index = cls(inherited)
+        for record in records:
+            if cls.is_container(record):
+                index.add_container(record)
+        return index
+
+    def _parent_tags(self, sub: str, rg: str) -> dict:
+        """Inheritable tags for a (subscription, resource group), merged once and cached."""
+        key = (sub, rg)
+        cached = self._cache.get(key)
+        if cached is None:
+            sources = {
+                "resourceGroup": {k.lower(): v for k, v in self._rg_tags.get(key, {}).items()},
+                "subscription": {k.lower(): v for k, v in self._sub_tags.get(sub, {}).items()}
+            }
+            cached = {}
+            for tag, scope in self.inherited.items():
+                value = sources[scope].get(tag.lower())
+                if value:
+                    cached[tag] = value
+            self._cache[key] = cached
+        return cached
+
+    def effective_tags(self, resource: dict) -> tuple:
+        """(effective tags, inherited keys). The resource's own tags always win."""
+        own = resource.get("tags") or {}
+        if self.is_container(resource):
+            return own, []
+        sub, rg = parse_resource_id(resource.get("id", ""))
+        parent = self._parent_tags(sub, rg)
+        if not parent:
+            return own, []
+
+        present = {k.lower() for k, v in own.items() if v}
+        missing = [k for k in parent if k.lower() not in present]
+        if not missing:
+            return own, []
+        effective = {k: v for k, v in own.items() if v or k not in missing}
+        for k in missing:
+            effective[k] = parent[k]
+        return effective, missing
+
+    def apply(self, resources):
+        """Yield resources with `tags` replaced by effective tags.
+
+        Resources that gained tags also carry `inherited_tags` listing them.
+        """
+        for r in resources:
+            tags, inherited = self.effective_tags(r)
+            if inherited:
+                r = dict(r, tags=tags, inherited_tags=inherited)
+            yield r
+
+
+def with_effective_tags(resources_path: str, containers_path: str = None, key: str = "resources"):
+    """Stream an inventory with inherited tags applied.
+
+    Parents come from `containers_path` (a Resource Graph `resourcecontainers`
+    export) or, when omitted, from the resource group and subscription
+    records in the inventory itself.
+    """
+    if containers_path:
+        containers = iter_resources(containers_path)
+    else:
+        containers = iter_resources(resources_path, key=key)
+    index = HierarchyIndex.from_containers(containers)
+    return index.apply(iter_resources(resources_path, key=key))
@@ -0,0 +1,198 @@
+"""
+Inventory Reader — Stella Maris Governance
+Shared by all FinOps packs.
+
+Streams resources one at a time from a Resource Graph export so that
+scans run in bounded memory regardless of inventory size. Accepts:
+  - {"resources": [...]}  (the shape every pack has always consumed)
+  - [...]                 (a bare JSON array)
+  - NDJSON / JSON Lines   (one resource object per line)
+
+Tags are normalized as each resource is read (see tagkeys.py): keys take
+their canonical casing and repeated strings are interned.
+"""
+
+import re
+import json
+
+from tagkeys import normalize_resource
+
+
+_CHUNK_SIZE = 1 << 16
+_SNIFF_LIMIT = 1 << 20
+_WHITESPACE = " \t\r\n"
+_decoder = json.JSONDecoder()
+_DELIMITER = re.compile(r"[ \t\r\n]*([,\]])[ \t\r\n]*")
+
+
+class _StreamDecoder:
+    """Incremental JSON tokenizer over a text file.
+
+    Holds only the unconsumed tail of the file plus one value being decoded.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        chunk = self.f.read(_CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, without consuming it ("" at EOF)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, ch: str):
+        found = self.peek()
+        if found != ch:
+            raise ValueError(f"Malformed inventory JSON: expected '{ch}', found '{found or 'EOF'}'")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the very end of the buffer may continue in the next chunk
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def array(self):
+        """Yield the elements of the array starting at the current position."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        scan = _decoder.scan_once
+        while True:
+            # Fast path: value and its delimiter both lie inside the buffer
+            try:
+                obj, end = scan(self.buf, self.pos)
+                delim = _DELIMITER.match(self.buf, end)
+            except (StopIteration, json.JSONDecodeError):
+                delim = None
+            if delim is None or delim.end() == len(self.buf):
+                obj = self.value()
+                ch = self.peek()
+                self.pos += 1
+                if ch == ",":
+                    self.peek()
+            else:
+                ch = delim.group(1)
+                self.pos = delim.end()
+            yield obj
+            if ch == "]":
+                return
+            if ch != ",":
+                raise ValueError(f"Malformed inventory JSON: expected ',' or ']', found '{ch or 'EOF'}'")
+
+
+def _is_ndjson(path: str, f, key: str = "resources") -> bool:
+    """NDJSON if named so, or if the first line alone is a complete resource object."""
+    if path.endswith((".ndjson", ".jsonl")):
+        return True
+    first_line = f.readline(_SNIFF_LIMIT)
+    f.seek(0)
+    if not first_line.endswith("\n"):
+        return False
+    try:
+        first = json.loads(first_line)
+    except json.JSONDecodeError:
+        return False
+    return isinstance(first, dict) and not isinstance(first.get(key), list)
+
+
+def iter_resources(path: str, key: str = "resources", normalize: bool = True,
+                   required: bool = False, meta: dict = None):
+    """Yield resources one at a time from a JSON or NDJSON inventory export.
+
+    With `normalize`, each resource's tag keys are canonicalized (Azure tag
+    keys are case-insensitive) and tag values interned. With `required`, a
+    JSON object without a `key` array raises KeyError once it has been read.
+    A `meta` dict receives the object's other top-level members that are
+    not arrays (report summaries and flags) as the file streams past.
+    """
+    for item in _iter_raw(path, key, required, meta):
+        yield normalize_resource(item) if normalize and isinstance(item, dict) else item
+
+
+def _iter_raw(path: str, key: str, required: bool = False, meta: dict = None):
+    with open(path, encoding="utf-8") as f:
+        if _is_ndjson(path, f, key):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+            return
+
+        stream = _StreamDecoder(f)
+        ch = stream.peek()
+        if ch == "[":
+            yield from stream.array()
+            return
+
+        stream.expect("{")
+        found = False
+        while True:
+            ch = stream.peek()
+            if ch == "}" or ch == "":
+                break
+            if ch == ",":
+                stream.pos += 1
+                continue
+            name = stream.value()
+            stream.expect(":")
+            if stream.peek() == "[":
+                if name == key:
+                    found = True
+                    yield from stream.array()
+                else:
+                    # Skip other arrays element by element; decoding one as a whole value retries per chunk
+                    for _ in stream.array():
+                        pass
+            else:
+                value = stream.value()
+                if meta is not None:
+                    meta[name] = value
+        if required and not found:
+            raise KeyError(f"{path} has no '{key}' array")
+
+
+class CountingIterator:
+    """Pass-through iterator that counts items as they stream past.
+
+    Lets a scan report "Resources scanned" without materializing the list.
+    """
+
+    def __init__(self, iterable):
+        self._it = iter(iterable)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = next(self._it)
+        self.count += 1
+        return item
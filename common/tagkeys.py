@@ -0,0 +1,80 @@
+"""
+Tag Keys — Stella Maris Governance
+Shared by all FinOps packs.
+
+Azure treats tag keys as case-insensitive: `costcenter`, `COSTCENTER` and
+`CostCenter` are the same tag. Every pack looks tags up by their taxonomy
+spelling (`tags.get("CostCenter")`), so tags are canonicalized once, at
+load time, by the inventory reader. Keys and string values are interned
+so millions of repeated strings ("production", "CC-1001") share storage.
+"""
+
+import sys
+
+
+# Pack 01 taxonomy spellings — these win over whatever casing a resource uses
+TAXONOMY_KEYS = [
+    "Owner", "Environment", "CostCenter", "Project",
+    "Criticality", "DataClassification", "CreatedDate", "ReviewDate", "ExpiryDate", "ManagedBy"
+]
+
+
+class TagNormalizer:
+    """Maps any casing of a tag key to one canonical, interned spelling.
+
+    Taxonomy keys use their taxonomy spelling. Other keys use the first
+    spelling seen. Raw spellings are cached, so the common case is one dict
+    lookup per key.
+    """
+
+    def __init__(self, canonical_keys: list = None):
+        self._by_lower = {k.lower(): sys.intern(k) for k in (canonical_keys or TAXONOMY_KEYS)}
+        self._by_raw = dict((k, k) for k in self._by_lower.values())
+
+    def key(self, raw: str) -> str:
+        canonical = self._by_raw.get(raw)
+        if canonical is None:
+            lower = raw.lower()
+            canonical = self._by_lower.get(lower)
+            if canonical is None:
+                canonical = self._by_lower[lower] = sys.intern(raw)
+            self._by_raw[raw] = canonical
+        return canonical
+
+    def tags(self, tags: dict) -> dict:
+        """Canonical-key copy of a tag dict with interned string values.
+
+        When two casings of one key are both present, the first non-empty value wins.
+        """
+        out = {}
+        for raw, value in tags.items():
+            key = self.key(raw)
+            if isinstance(value, str):
+                value = sys.intern(value)
+            if key not in out or (value and not out[key]):
+                out[key] = value
+        return out
+
+
+_default = TagNormalizer()
+
+
+def canonical_key(raw: str) -> str:
+    """Canonical spelling of a tag key (taxonomy spelling where one exists)."""
+    return _default.key(raw)
+
+
+def normalize_tags(tags: dict) -> dict:
+    """Canonicalize keys and intern values of one tag dict."""
+    return _default.tags(tags)
+
+
+def normalize_resource(resource: dict) -> dict:
+    """Normalize a resource's tags in place and intern its type. Returns the resource."""
+    tags = resource.get("tags")
+    if isinstance(tags, dict):
+        resource["tags"] = _default.tags(tags)
+    rtype = resource.get("type")
+    if isinstance(rtype, str):
+        resource["type"] = sys.intern(rtype)
+    return resource